@@ -1,10 +1,19 @@
-import bisect
+import hashlib
+import io
 import math
 import os
+from collections import OrderedDict
 
 import numpy as np
 from scipy import interpolate
 
+from ansys_optical_automation.post_process.dpf_cache import cached_load
+from ansys_optical_automation.post_process.dpf_interpolation import BilinearWeights
+from ansys_optical_automation.post_process.dpf_interpolation import (
+    bilinear_interpolation,
+)
+from ansys_optical_automation.post_process.dpf_interpolation import round_like_python
+
 # =========================================
 # Speos BSDF Help files
 # https://ansyshelp.ansys.com/account/secured?returnurl=/Views/Secured/corp/v222/en/Optis_UG_LAB/Optis/UG_Lab/structure_of_anisotropic_bsdf_files_81025.html
@@ -13,6 +22,89 @@ from scipy import interpolate
 # =========================================
 
 
+class RemapPlanCache:
+    """
+    class keeping the interpolation weights of the angular remapping of BSDF blocks
+
+    A remapping only depends on the incidence, the conversion direction and the input and output grids, so every
+    other block with the same incidence and grids, e.g. another wavelength or sample rotation, is only a gather and
+    a multiply-add. The least recently used plans are removed above max_bytes.
+    """
+
+    def __init__(self, max_bytes=268435456):
+        """
+        That functions initializes an object of the class.
+
+        Parameters
+        ----------
+        max_bytes : integer, optional
+            maximum memory used by the cached plans, default is 256 MiB
+        """
+        self.max_bytes = max_bytes
+        self.plans = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def grid_hash(*lines):
+        """
+        That function returns a hash of grid lines
+
+        Parameters
+        ----------
+        lines : list
+            lists of angles
+
+        Returns
+        -------
+        hash : string
+            hexadecimal digest of the angle values
+        """
+        digest = hashlib.sha1()
+        for line in lines:
+            line = np.asarray(line, dtype=float)
+            digest.update(str(line.shape).encode())
+            digest.update(line.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key, build_plan):
+        """
+        That function returns the cached plan of a key or builds and caches it
+
+        Parameters
+        ----------
+        key : tuple
+            (incidence, direction, input grid hash, output grid hash)
+        build_plan : function
+            function without argument returning the BilinearWeights of the remapping
+
+        Returns
+        -------
+        plan : BilinearWeights
+            interpolation weights of the remapping
+        """
+        if key in self.plans:
+            self.plans.move_to_end(key)
+            self.hits += 1
+            return self.plans[key]
+        self.misses += 1
+        plan = build_plan()
+        self.plans[key] = plan
+        self.nbytes += plan.nbytes
+        while self.nbytes > self.max_bytes and len(self.plans) > 1:
+            _, removed = self.plans.popitem(last=False)
+            self.nbytes -= removed.nbytes
+        return plan
+
+    def clear(self):
+        """
+        That function removes all cached plans
+        """
+        self.plans.clear()
+        self.nbytes = 0
+
+
 class BsdfStructure:
     """
     class of BSDF data contains method to host bsdf data
@@ -74,7 +166,7 @@ class BsdfStructure:
         self.bsdfdata_phi = {"transmission_reflection", "wavelength", "sample_rotation", "angleofincidence"}
         self.bsdfdata = {"transmission_reflection", "wavelength", "sample_rotation", "angleofincidence", "theta", "phi"}
 
-    def import_data(self, bool_log=True):
+    def import_data(self, bool_log=True, cache=None):
         """
         Read the filename of the object (filename_input) and imports the data into the class
 
@@ -83,26 +175,17 @@ class BsdfStructure:
         bool_log : boolean
             0 no report
             1 report values
+        cache : ArrayCache, optional
+            cache of the imported data, reloaded memory mapped while the file is unchanged. Default is None.
         """
         input_file_extension = os.path.splitext(self.filename_input)[1].lower()[0:]
         if not (input_file_extension in [".bsdf", ".brdf", ".anisotropicbsdf"]):
             msg = "Nonsupported file selected"
             raise TypeError(msg)
-        if input_file_extension == ".bsdf":
-            self.zemax_or_speos = "zemax"
-            self.read_zemax_bsdf(bool_log)
-            self.converter_coordinate_system_bsdf(1, bool_log)
-            self.normalize_bsdf_data(bool_log)
-
-        if input_file_extension == ".brdf":
-            self.zemax_or_speos = "speos"
-            self.read_speos_brdf(bool_log)
-            # self.phi_theta_output()
-
-        if input_file_extension == ".anisotropicbsdf":
-            self.zemax_or_speos = "speos"
-            self.read_speos_anisotropicbsdf(bool_log)
-            self.calculate_tis_data(bool_log)
+        content, cached = cached_load(cache, self.filename_input, "bsdf", lambda: self.__read_data(bool_log))
+        if cached:
+            for attribute, value in content.items():
+                setattr(self, attribute, value)
 
         # Restriction: we don't convert BTDF between Speos and Zemax
         # The index of refraction is not taken into account
@@ -123,6 +206,43 @@ class BsdfStructure:
                             )
                             input(msg)
 
+    def __read_data(self, bool_log):
+        """
+        Read and convert the data of the input file depending on its extension
+
+        Parameters
+        ----------
+        bool_log : boolean
+            0 no report
+            1 report values
+
+        Returns
+        -------
+        dict
+            imported attributes
+        """
+        input_file_extension = os.path.splitext(self.filename_input)[1].lower()[0:]
+        if input_file_extension == ".bsdf":
+            self.zemax_or_speos = "zemax"
+            self.read_zemax_bsdf(bool_log)
+            self.converter_coordinate_system_bsdf(1, bool_log)
+            self.normalize_bsdf_data(bool_log)
+
+        if input_file_extension == ".brdf":
+            self.zemax_or_speos = "speos"
+            self.read_speos_brdf(bool_log)
+            # self.phi_theta_output()
+
+        if input_file_extension == ".anisotropicbsdf":
+            self.zemax_or_speos = "speos"
+            self.read_speos_anisotropicbsdf(bool_log)
+            self.calculate_tis_data(bool_log)
+        return {
+            attribute: value
+            for attribute, value in vars(self).items()
+            if attribute not in ("filename_input", "output_choice")
+        }
+
     def read_speos_brdf(self, bool_log):
         """
         That function reads a Speos brdf file
@@ -219,49 +339,11 @@ class BsdfStructure:
         # for the incident angle N°1 and the wavelength N°1 of the incident angle N°1.
 
         nb_reflection_transmission = len(scatterType)
-        # tisData = np.zeros((nb_reflection_transmission * nbAngleIncidence, nbWavelength))
-        tisdata_temp_list = []
-        scatterRadial_temp_list = []
-        scatterAzimuth_temp_list = []
-        bsdfData_temp_list = []
-
-        for i in range(nb_reflection_transmission * nbAngleIncidence):
-            for j in range(nbWavelength):
-                tisdata_temp_list.append(float(bfile.readline()))
-                nbthetaphiLine = bfile.readline()
-                nbthetaphi = nbthetaphiLine[:-1].split()
-                nbScatterRadial = int(nbthetaphi[0])
-                nbScatterAzimuth = int(nbthetaphi[1])
-                # nbScatterRadial_list.append(nbScatterRadial)
-                # nbScatterAzimuth_list.append(nbScatterAzimuth)
-
-                scatterAzimuthLine = bfile.readline()
-                scatterAzimuthLineString = (scatterAzimuthLine[:-1].strip()).split("\t")
-                scatterAzimuth = [float(i) for i in scatterAzimuthLineString]
-                scatterAzimuth_temp_list.append(scatterAzimuth)
-
-                bsdfDataBlock = np.zeros((nbScatterRadial, nbScatterAzimuth))
-                # scatterRadial = np.zeros(nbScatterRadial)
-                scatterRadial = []
-
-                for k in range(nbScatterRadial):
-                    dataLine = bfile.readline()
-                    data = dataLine.split()
-                    # scatterRadial[k] = float(data[0])
-                    scatterRadial.append(float(data[0]))
-                    bsdfDataBlock[k] = data[1:]
-
-                # If transmission data
-                if scatterRadial[0] >= 90:
-                    # change line theta from 90--> 180 to 0-->90
-                    temp = scatterRadial
-                    temp_180 = [180 - temp[index_temp] for index_temp in range(len(temp))]
-                    scatterRadial = temp_180[::-1]
-                    # swap the radial / theta of the bsdf_block
-                    bsdfDataBlock = swap_rows(bsdfDataBlock)
-
-                scatterRadial_temp_list.append(scatterRadial)
-                bsdfData_temp_list.append(bsdfDataBlock)
+        # The blocks are parsed at once, every block of the file is a view on the same array
+        tisdata_temp, scatterRadial_temp_list, scatterAzimuth_temp_list, bsdfData_temp_list = parse_speos_bsdf_blocks(
+            bfile.read(), nb_reflection_transmission * nbAngleIncidence * nbWavelength, True
+        )
+        tisdata_temp_list = tisdata_temp.tolist()
 
         # Need to reorder
         # BRDF: RT --> incidence --> wavelength
@@ -526,43 +608,11 @@ class BsdfStructure:
         if bool_log == 1:
             print("Reading BSDF content.....")
 
-        # tisData = np.zeros((nb_reflection_transmission * nbAngleIncidence, nbWavelength))
-        scatterRadial_temp_list = []
-        scatterAzimuth_temp_list = []
-        bsdfData_temp_list = []
-
-        # reflection
-        for index_block in range(len(angleIncidence_list)):
-            nbthetaphiLine = bfile.readline()
-            nbthetaphi = nbthetaphiLine[:-1].split()
-            nbScatterRadial = int(nbthetaphi[0])
-            nbScatterAzimuth = int(nbthetaphi[1])
-
-            scatterAzimuthLine = bfile.readline()
-            scatterAzimuthLineString = (scatterAzimuthLine[:-1].strip()).split()
-            scatterAzimuth = [float(i) for i in scatterAzimuthLineString]
-            scatterAzimuth_temp_list.append(scatterAzimuth)
-
-            bsdfDataBlock = np.zeros((nbScatterRadial, nbScatterAzimuth))
-            scatterRadial = []
-
-            for k in range(nbScatterRadial):
-                dataLine = bfile.readline()
-                data = dataLine.split()
-                scatterRadial.append(float(data[0]))
-                bsdfDataBlock[k] = data[1:]
-
-            # If transmission data
-            if scatterRadial[0] >= 90:
-                # change line theta from 90--> 180 to 0-->90
-                temp = scatterRadial
-                temp_180 = [180 - temp[index_temp] for index_temp in range(len(temp))]
-                scatterRadial = temp_180[::-1]
-                # swap the radial / theta of the bsdf_block
-                bsdfDataBlock = swap_rows(bsdfDataBlock)
-
-            scatterRadial_temp_list.append(scatterRadial)
-            bsdfData_temp_list.append(bsdfDataBlock)
+        # The blocks are parsed at once, every block of the file is a view on the same array
+        _, scatterRadial_temp_list, scatterAzimuth_temp_list, bsdfData_temp_list = parse_speos_bsdf_blocks(
+            bfile.read(), len(angleIncidence_list), False
+        )
+        bfile.close()
 
         # Need to reorder
         # BRDF: RT --> incidence --> wavelength
@@ -767,14 +817,16 @@ class BsdfStructure:
         dataLine = bfile.readline()
         while dataLine[0:9] != "DataBegin":
             dataLine = bfile.readline()
-        # Initialization of a bsdfData list
-        # Initialization of a vector tisData to save the TIS at each sample rotation and angle of incidence
+        # The blocks are parsed at once and stored in a (sample rotation, incidence, phi, theta) array
+        tisData, bsdfData = parse_zemax_bsdf_blocks(
+            bfile.read(), nbSampleRotation, nbAngleIncidence, nbScatterAzimuth, nbScatterRadial
+        )
+        bfile.close()
 
         bsdfData_list = []
         theta_list = []
         phi_list = []
         wavelength_list = []
-        # tisData = np.zeros((nbSampleRotation, nbAngleIncidence))
         tisData_list = []
         scattertype_list = []
         scattertype_data_list = []
@@ -785,19 +837,12 @@ class BsdfStructure:
 
         for index_samplerotation in range(nbSampleRotation):
             for index_incidence in range(nbAngleIncidence):
-                # Reading TIS (Total Integrated Scatter) value
-                tisLine = bfile.readline()
-                # tisData[index_samplerotation][index_incidence] = float(tisLine[4:-1])
-                tisData_list.append(float(tisLine[4:-1]))
+                tisData_list.append(float(tisData[index_samplerotation, index_incidence]))
                 wavelength_list.append(0.55)
                 sampleRotation_list.append(sampleRotation[index_samplerotation])
                 angleIncidence_list.append(angleIncidence[index_incidence])
                 scattertype_data_list.append(scatterType)
-                bsdfData_block = np.zeros((nbScatterAzimuth, nbScatterRadial))
-                for index_phi in range(nbScatterAzimuth):
-                    dataLine = bfile.readline()
-                    bsdfData_block[index_phi] = dataLine.split()
-                bsdfData_list.append(bsdfData_block.transpose())
+                bsdfData_list.append(bsdfData[index_samplerotation, index_incidence].transpose())
                 theta_list.append(scatterRadial)
                 phi_list.append(scatterAzimuth)
 
@@ -818,7 +863,7 @@ class BsdfStructure:
         self.bsdfdata_phi = phi_list
         self.bsdfdata = bsdfData_list
 
-    def converter_coordinate_system_bsdf(self, bool_normal_1, bool_log):
+    def converter_coordinate_system_bsdf(self, bool_normal_1, bool_log, plan_cache=None):
         """
         That function converts the coordinate system of the bsdf data
         On import, the data is converted to the local surface coordinate system
@@ -833,6 +878,9 @@ class BsdfStructure:
         bool_log : boolean
             0 no report
             1 report values
+        plan_cache : RemapPlanCache, optional
+            cache of the remapping weights per incidence and grids, e.g. to share it between several conversions,
+            default is a new cache used by this conversion only
 
         Returns
         -------
@@ -841,55 +889,53 @@ class BsdfStructure:
         """
 
         print("Converting data...\n")
+        if plan_cache is None:
+            plan_cache = RemapPlanCache()
 
         line_theta_output_list, line_phi_output_list = phi_theta_output(
             self.bsdfdata_theta, self.bsdfdata_phi, self.zemax_or_speos
         )
         line_theta_output = line_theta_output_list[0]
         line_phi_output = line_phi_output_list[0]
-
-        # nb_wavelength = len(self.wavelength)
-        # nb_samplerotation = len(self.samplerotation)
-        # nb_angleofincidence = len(self.incidence)
-        # nb_reflection_transmission = len(self.scattertype)
-        # bsdf_output = self.bsdf
-
-        # index_block = 0
+        output_hash = plan_cache.grid_hash(line_theta_output, line_phi_output)
+        if bool_normal_1 == 1:
+            direction = "normal_to_specular"
+            # Added the case where symmetry == PlaneSymmetrical
+            if self.symmetry == "PlaneSymmetrical":
+                direction = "normal_to_specular_plane_symmetrical"
+        else:
+            direction = "specular_to_normal"
+        input_hashes = {}
 
         for index_block in range(len(self.bsdfdata_incidence)):
             current_angleofincidence = self.bsdfdata_incidence[index_block]
             if len(self.bsdfdata_theta) == 1:
-                line_theta_input = self.bsdfdata_theta[0]
-                line_phi_input = self.bsdfdata_phi[0]
+                index_grid = 0
             else:
-                line_theta_input = self.bsdfdata_theta[index_block]
-                line_phi_input = self.bsdfdata_phi[index_block]
-            bsdfData_output_block = np.zeros((len(line_theta_output), len(line_phi_output)))
-
-            for index_theta in range(len(line_theta_output)):
-                currentTheta = line_theta_output[index_theta]
-                for index_phi in range(len(line_phi_output)):
-                    currentPhi = line_phi_output[index_phi]
-
-                    if bool_normal_1 == 1:
-                        # Convert the angles to the "specular" definition
-                        newTheta, newPhi = convert_normal_to_specular_using_cartesian(
-                            currentTheta, currentPhi, current_angleofincidence
-                        )
-                        # Added the case where symmetry == PlaneSymmetrical
-                        if self.symmetry == "PlaneSymmetrical" and newPhi > 180:
-                            newPhi = 360 - newPhi
-                    else:
-                        # Convert the angles to the "normal" definition
-                        newTheta, newPhi = convert_specular_to_normal_using_cartesian(
-                            currentTheta, currentPhi, current_angleofincidence
-                        )
-
-                    bsdfData_output_block[index_theta][index_phi] = compute_new_value_matrix(
-                        self.bsdfdata[index_block], line_theta_input, line_phi_input, newTheta, newPhi
+                index_grid = index_block
+            line_theta_input = self.bsdfdata_theta[index_grid]
+            line_phi_input = self.bsdfdata_phi[index_grid]
+            if index_grid not in input_hashes:
+                input_hashes[index_grid] = plan_cache.grid_hash(line_theta_input, line_phi_input)
+
+            def build_plan():
+                theta_output, phi_output = np.meshgrid(line_theta_output, line_phi_output, indexing="ij")
+                if bool_normal_1 == 1:
+                    # Convert the angles to the "specular" definition
+                    newTheta, newPhi = convert_normal_to_specular_using_cartesian_array(
+                        theta_output, phi_output, current_angleofincidence
                     )
-            self.bsdfdata[index_block] = bsdfData_output_block
-            index_block = index_block + 1
+                    if direction == "normal_to_specular_plane_symmetrical":
+                        newPhi = np.where(newPhi > 180, 360 - newPhi, newPhi)
+                else:
+                    # Convert the angles to the "normal" definition
+                    newTheta, newPhi = convert_specular_to_normal_using_cartesian_array(
+                        theta_output, phi_output, current_angleofincidence
+                    )
+                return BilinearWeights(line_theta_input, line_phi_input, newTheta, newPhi)
+
+            key = (float(current_angleofincidence), direction, input_hashes[index_grid], output_hash)
+            self.bsdfdata[index_block] = plan_cache.get(key, build_plan).apply(self.bsdfdata[index_block])
 
         self.bsdfdata_theta = line_theta_output_list
         self.bsdfdata_phi = line_phi_output_list
@@ -1638,6 +1684,239 @@ def convert_specular_to_normal_using_cartesian(theta_i, phi_i, angle_inc):
     return (theta_o, phi_o)
 
 
+def parse_speos_bsdf_blocks(text, nb_blocks, bool_tis):
+    """
+    That function parses the data section of a Speos brdf or anisotropicbsdf file following the header
+    Every block gives its number of theta and phi values, the phi values and one line per theta starting with the theta
+    value, the numbers of all the blocks are converted at once and the blocks are views on them
+
+    Parameters
+    ----------
+    text : string
+        content of the file after the header
+    nb_blocks : integer
+        number of BSDF blocks
+    bool_tis : boolean
+        True if every block starts with its TIS value (brdf format)
+
+    Returns
+    -------
+    tis_data : array
+        TIS values of the blocks, in percent, zeros if bool_tis is False
+    theta_list : list
+        theta values per block, transmission blocks are changed to 180 - theta in increasing order
+    phi_list : list
+        phi values per block
+    bsdf_list : list
+        BSDF values of shape (theta, phi) per block, in the order of theta_list
+    """
+
+    end = text.find("End of file")
+    if end >= 0:
+        text = text[:end]
+    values = np.fromstring(text, sep=" ")
+    tis_data = np.zeros(nb_blocks)
+    theta_list = []
+    phi_list = []
+    bsdf_list = []
+    position = 0
+    for index_block in range(nb_blocks):
+        if bool_tis:
+            if position >= values.size:
+                msg = "Wrong data: " + str(index_block) + " BSDF blocks found instead of " + str(nb_blocks)
+                raise TypeError(msg)
+            tis_data[index_block] = values[position]
+            position += 1
+        if position + 2 > values.size:
+            msg = "Wrong data: " + str(index_block) + " BSDF blocks found instead of " + str(nb_blocks)
+            raise TypeError(msg)
+        nb_theta = int(values[position])
+        nb_phi = int(values[position + 1])
+        position += 2
+        block_end = position + nb_phi + nb_theta * (nb_phi + 1)
+        if block_end > values.size:
+            msg = "Wrong data for BSDF block " + str(index_block) + ": " + str(nb_theta) + " x " + str(nb_phi)
+            msg += " values expected"
+            raise TypeError(msg)
+        phi = values[position : position + nb_phi]
+        table = values[position + nb_phi : block_end].reshape(nb_theta, nb_phi + 1)
+        position = block_end
+        theta = table[:, 0]
+        bsdf = table[:, 1:]
+        # If transmission data change theta from 90 --> 180 to 0 --> 90 and reverse the rows without copy
+        if theta[0] >= 90:
+            theta = 180 - theta[::-1]
+            bsdf = bsdf[::-1]
+        theta_list.append(theta)
+        phi_list.append(phi)
+        bsdf_list.append(bsdf)
+    return tis_data, theta_list, phi_list, bsdf_list
+
+
+def parse_zemax_bsdf_blocks(text, nb_sample_rotation, nb_incidence, nb_azimuth, nb_radial):
+    """
+    That function parses the data section of a Zemax bsdf file following the DataBegin line
+    Every block starts with a TIS line followed by one line of radial values per azimuth,
+    the numbers of all the blocks are converted at once
+
+    Parameters
+    ----------
+    text : string
+        content of the file after the DataBegin line
+    nb_sample_rotation : integer
+        number of sample rotations
+    nb_incidence : integer
+        number of angles of incidence
+    nb_azimuth : integer
+        number of scatter azimuth values
+    nb_radial : integer
+        number of scatter radial values
+
+    Returns
+    -------
+    tis_data : array
+        TIS values of shape (sample rotation, incidence)
+    bsdf_data : array
+        BSDF values of shape (sample rotation, incidence, azimuth, radial)
+    """
+
+    nb_blocks = nb_sample_rotation * nb_incidence
+    end = text.find("DataEnd")
+    if end >= 0:
+        text = text[:end]
+    tis_data = []
+    position = text.find("TIS")
+    while position >= 0 and len(tis_data) < nb_blocks:
+        line_start = text.rfind("\n", 0, position) + 1
+        line_end = text.find("\n", position)
+        if text[line_start:position].strip() == "":
+            tis_data.append(float(text[position : line_end if line_end >= 0 else len(text)].split()[1]))
+        position = text.find("TIS", position + 3)
+    if len(tis_data) != nb_blocks:
+        msg = "Wrong data: " + str(len(tis_data)) + " TIS values for " + str(nb_blocks) + " BSDF blocks"
+        raise TypeError(msg)
+    # TIS lines are skipped as comments so all the blocks are converted by a single call
+    bsdf_data = np.loadtxt(io.StringIO(text), comments="TIS", ndmin=2)
+    if bsdf_data.shape[0] < nb_blocks * nb_azimuth or bsdf_data.shape[1] != nb_radial:
+        msg = "Wrong data for BSDF blocks: " + str(bsdf_data.shape[0]) + " rows of " + str(bsdf_data.shape[1])
+        msg += " values instead of " + str(nb_blocks * nb_azimuth) + " rows of " + str(nb_radial) + " values"
+        raise TypeError(msg)
+    tis_data = np.array(tis_data)
+    bsdf_data = bsdf_data[: nb_blocks * nb_azimuth]
+    return (
+        tis_data.reshape(nb_sample_rotation, nb_incidence),
+        bsdf_data.reshape(nb_sample_rotation, nb_incidence, nb_azimuth, nb_radial),
+    )
+
+
+def convert_normal_to_specular_using_cartesian_array(theta_i, phi_i, angle_inc):
+    """
+    That function converts arrays of angles from normal to specular reference using cartesian coordinates
+    It gives the same result as convert_normal_to_specular_using_cartesian for every pair of angles
+
+    Parameters
+    ----------
+    theta_i : array
+        Scattered polar angles in the normal reference
+    phi_i : array
+        Scattered azimuthal angles in the normal reference, same shape as theta_i
+    angle_inc : float
+        Angle of incidence
+
+    Returns
+    -------
+    theta_o : array
+        Scattered polar angles in the specular reference
+    phi_o : array
+        Scattered azimuthal angles in the specular reference
+    """
+
+    # spherical coordinates in normal reference
+    theta_i = np.asarray(theta_i, dtype=float) * (math.pi / 180)
+    phi_i = np.asarray(phi_i, dtype=float) * (math.pi / 180)
+    # Conversion to cartesian coordinates
+    x_i = np.sin(theta_i) * np.cos(phi_i)
+    y_i = np.sin(theta_i) * np.sin(phi_i)
+    z_i = np.cos(theta_i)
+    # Conversion to new specular cartesian coordinates
+    x_o = x_i * math.cos(angle_inc * math.pi / 180) - z_i * math.sin(angle_inc * math.pi / 180)
+    y_o = y_i
+    z_o = x_i * math.sin(angle_inc * math.pi / 180) + z_i * math.cos(angle_inc * math.pi / 180)
+    # Normalization
+    norm = np.sqrt(x_o * x_o + y_o * y_o + z_o * z_o)
+    x_o = x_o * (1 / norm)
+    y_o = y_o * (1 / norm)
+    z_o = z_o * (1 / norm)
+    # Conversion to new spherical coordinates
+    theta_o = np.arccos(np.clip(z_o, -1, 1)) * (180 / math.pi)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        phi_o = np.arctan(y_o / x_o) * (180 / math.pi)
+    phi_o = np.where(x_o < 0, 180 + phi_o, phi_o)
+    phi_o = np.where((x_o > 0) & (y_o < 0), 360 + phi_o, phi_o)
+    phi_o = np.where(x_o == 0, np.where(y_o > 0, 90, np.where(y_o < 0, 270, 0)), phi_o)
+
+    # added lines to change phi ref
+    phi_o = np.where(phi_o < 180, phi_o + 180, phi_o - 180)
+
+    return (theta_o, phi_o)
+
+
+def convert_specular_to_normal_using_cartesian_array(theta_i, phi_i, angle_inc):
+    """
+    That function converts arrays of angles from specular to normal reference using cartesian coordinates
+    It gives the same result as convert_specular_to_normal_using_cartesian for every pair of angles,
+    including the rounding of the intermediate and returned values
+
+    Parameters
+    ----------
+    theta_i : array
+        Scattered polar angles in the specular reference
+    phi_i : array
+        Scattered azimuthal angles in the specular reference, same shape as theta_i
+    angle_inc : float
+        Angle of incidence
+
+    Returns
+    -------
+    theta_o : array
+        Scattered polar angles in the normal reference
+    phi_o : array
+        Scattered azimuthal angles in the normal reference
+
+    """
+
+    # spherical coordinates in normal reference
+    theta_i = np.asarray(theta_i, dtype=float) * (math.pi / 180)
+    phi_i = np.asarray(phi_i, dtype=float) * (math.pi / 180)
+    # Conversion to cartesian coordinates
+    x_i = np.sin(theta_i) * np.cos(phi_i)
+    y_i = np.sin(theta_i) * np.sin(phi_i)
+    z_i = np.cos(theta_i)
+    # Conversion to new normal cartesian coordinates
+    x_o = -x_i * math.cos(angle_inc * math.pi / 180) + z_i * math.sin(angle_inc * math.pi / 180)
+    y_o = y_i
+    z_o = x_i * math.sin(angle_inc * math.pi / 180) + z_i * math.cos(angle_inc * math.pi / 180)
+    # Normalization
+    norm = np.sqrt(x_o * x_o + y_o * y_o + z_o * z_o)
+    x_o = x_o * (1 / norm)
+    y_o = y_o * (1 / norm)
+    z_o = z_o * (1 / norm)
+    # Conversion to new spherical coordinates
+    theta_o = np.arccos(np.clip(z_o, -1, 1)) * (180 / math.pi)
+
+    phi_o = np.abs(np.arctan2(y_o, x_o) * (180 / math.pi))
+    phi_o = np.where(round_like_python(y_o, 3) > 0, 360 - phi_o, phi_o)
+    # close to the normal the azimuth is kept, y_o == 0 implies round(y_o, 0) == 0
+    phi_axis = np.where(y_o > 0, 270, np.where(y_o < 0, 90, phi_i * (180 / math.pi)))
+    phi_o = np.where(round_like_python(x_o, 2) == 0, phi_axis, phi_o)
+
+    theta_o = round_like_python(theta_o, 2)
+    phi_o = round_like_python(phi_o, 2)
+
+    return (theta_o, phi_o)
+
+
 def compute_new_value_matrix(matrix_z, line_x, line_y, new_x, new_y):
     """
     That function takes (x,y) as an argument and returns a new interpolated value from a matrix[x,y]
@@ -1658,45 +1937,10 @@ def compute_new_value_matrix(matrix_z, line_x, line_y, new_x, new_y):
     Returns
     -------
     newValue: float
-        newValue = Z(new_x,new_y)
+        newValue = Z(new_x,new_y), 0 beyond the last x or y, see dpf_interpolation.axis_weights
     """
 
-    index_x = bisect.bisect_left(line_x, new_x)
-    if index_x == 0:
-        indexInf_x = index_x
-        indexSup_x = index_x
-        coeff_x = 0
-    elif index_x <= (len(line_x) - 1):
-        # Sandrine: added +1
-        indexInf_x = index_x - 1
-        indexSup_x = index_x
-        x_Inf = line_x[indexInf_x]
-        x_Sup = line_x[indexSup_x]
-        coeff_x = (new_x - x_Inf) / (x_Sup - x_Inf)
-    else:
-        newValue = 0
-        return newValue
-
-    index_y = bisect.bisect_left(line_y, new_y)
-    if index_y == 0:
-        indexInf_y = index_y
-        indexSup_y = index_y
-        coeff_y = 0
-    elif index_y <= (len(line_y) - 1):
-        indexInf_y = index_y - 1
-        indexSup_y = index_y
-        y_Inf = line_y[indexInf_y]
-        y_Sup = line_y[indexSup_y]
-        coeff_y = (new_y - y_Inf) / (y_Sup - y_Inf)
-    else:
-        newValue = 0
-        return newValue
-
-    # Linear interpolation
-    value_Inf_x = matrix_z[indexInf_x][indexInf_y] * (1 - coeff_y) + matrix_z[indexInf_x][indexSup_y] * coeff_y
-    value_Sup_x = matrix_z[indexSup_x][indexInf_y] * (1 - coeff_y) + matrix_z[indexSup_x][indexSup_y] * coeff_y
-    newValue = value_Inf_x * (1 - coeff_x) + value_Sup_x * coeff_x
-    return newValue
+    return float(bilinear_interpolation(matrix_z, line_x, line_y, new_x, new_y))
 
 
 def swap_columns(arr):
@@ -0,0 +1,252 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ansys_optical_automation.interop_process.rayfile_converter import RayfileConverter
+from ansys_optical_automation.post_process.dpf_rayfile import DpfRayfile
+from ansys_optical_automation.post_process.dpf_rayfile import sniff_rayfile_format
+from ansys_optical_automation.post_process.dpf_rayfile_writer import speos_header_format
+from ansys_optical_automation.post_process.dpf_rayfile_writer import speos_ray_dtype
+from ansys_optical_automation.post_process.dpf_rayfile_writer import zemax_header_format
+from ansys_optical_automation.post_process.dpf_rayfile_writer import (
+    zemax_spectral_ray_dtype,
+)
+
+
+def list_rayfiles(source):
+    """
+    list the rayfiles to convert
+
+    Parameters
+    ----------
+    source : str
+        folder containing rayfiles or glob pattern, e.g. ``r"C:\\temp\\*.ray"``
+
+    Returns
+    -------
+    list
+        sorted list of rayfile paths
+
+    """
+    if os.path.isdir(source):
+        file_paths = [os.path.join(source, file_name) for file_name in os.listdir(source)]
+    else:
+        file_paths = glob.glob(source)
+    return sorted(
+        file_path
+        for file_path in file_paths
+        if os.path.isfile(file_path) and os.path.splitext(file_path)[1].lower() in DpfRayfile.conversion_extension
+    )
+
+
+def converted_path(file_path, export_folder_dir=None):
+    """
+    return the path of the converted rayfile like DpfRayfile.export_file, without reading a possibly broken rayfile
+
+    Parameters
+    ----------
+    file_path : str
+        path to the rayfile to convert
+    export_folder_dir : str, optional
+        folder of the converted file, default is the folder of the input file
+
+    Returns
+    -------
+    str
+        path of the converted file
+
+    """
+    file_name = os.path.basename(file_path).split(".")[0]
+    extension = DpfRayfile.conversion_extension[os.path.splitext(file_path)[1].lower()]
+    return os.path.join(export_folder_dir or os.path.dirname(file_path), file_name + extension)
+
+
+def is_up_to_date(file_path, output_path):
+    """
+    check if a converted rayfile is newer than its source and complete
+
+    The size of the output must match the rays of the source, so rayfiles with rays without flux, which are not
+    converted, are converted again on every run.
+
+    Parameters
+    ----------
+    file_path : str
+        path to the source rayfile
+    output_path : str
+        path to the converted rayfile
+
+    Returns
+    -------
+    bool
+        True if the output exists, is not older than the source, holds all source rays and has a header with power
+
+    """
+    if not os.path.isfile(output_path) or os.path.getmtime(output_path) < os.path.getmtime(file_path):
+        return False
+    if os.path.splitext(output_path)[1].lower() == ".ray":
+        header_size, record_size = speos_header_format.size, speos_ray_dtype.itemsize
+    else:
+        header_size, record_size = zemax_header_format.size, zemax_spectral_ray_dtype.itemsize
+    try:
+        expected_size = header_size + DpfRayfile(file_path, header_only=True).rays_number * record_size
+        if os.path.getsize(output_path) != expected_size:
+            return False
+        # the header is written last, a zero power header is left by an interrupted conversion
+        return DpfRayfile(output_path, header_only=True).radiometric_power > 0
+    except (ValueError, TypeError):
+        return False
+
+
+def convert_rayfile(file_path, export_folder_dir=None, chunk_size=1000000, force=False):
+    """
+    convert one rayfile between speos and zemax format with constant memory
+
+    Parameters
+    ----------
+    file_path : str
+        path to the rayfile to convert
+    export_folder_dir : str, optional
+        folder of the converted file, default is the folder of the input file
+    chunk_size : int, optional
+        number of rays converted at once, default value is 1000000
+    force : bool, optional
+        convert even if the converted file is up to date, default value is False
+
+    Returns
+    -------
+    dict
+        conversion summary with the keys file, output, skipped, rays, error, seconds, rays_per_second, mb_per_second
+
+    """
+    converter = RayfileConverter(file_path, header_only=True)
+    output_path = converter.export_file(export_folder_dir, convert=True, overwrite=True)
+    result = {"file": file_path, "output": output_path, "skipped": False, "rays": converter.rays_number, "error": None}
+    if not force and is_up_to_date(file_path, output_path):
+        result.update({"skipped": True, "seconds": 0.0, "rays_per_second": 0.0, "mb_per_second": 0.0})
+        return result
+    start = time.perf_counter()
+    if sniff_rayfile_format(file_path) == "speos":
+        converter.speos_to_zemax(chunk_size, export_folder_dir, overwrite=True)
+    else:
+        converter.zemax_to_speos(chunk_size, export_folder_dir, overwrite=True)
+    seconds = max(time.perf_counter() - start, 1e-9)
+    result["rays"] = converter.validation_report.rays_number
+    result["seconds"] = seconds
+    result["rays_per_second"] = result["rays"] / seconds
+    result["mb_per_second"] = os.path.getsize(file_path) / 1e6 / seconds
+    return result
+
+
+def convert_rayfiles(source, export_folder_dir=None, workers=None, chunk_size=1000000, force=False):
+    """
+    convert all rayfiles of a folder or glob pattern in parallel processes
+
+    Rayfiles that are the converted file of another listed rayfile, e.g. written by a previous run in the same folder,
+    are not converted back.
+
+    Parameters
+    ----------
+    source : str
+        folder containing rayfiles or glob pattern
+    export_folder_dir : str, optional
+        folder of the converted files, default is the folder of each input file
+    workers : int, optional
+        number of worker processes, default is the number of processors
+    chunk_size : int, optional
+        number of rays converted at once per file, default value is 1000000
+    force : bool, optional
+        convert even if the converted file is up to date, default value is False
+
+    Returns
+    -------
+    list
+        conversion summary per file, see convert_rayfile. Files which cannot be converted, e.g. with invalid rays,
+        are reported with their error message and do not stop the other conversions.
+
+    """
+    file_paths = list_rayfiles(source)
+    if export_folder_dir is not None and not os.path.isdir(export_folder_dir):
+        os.makedirs(export_folder_dir)
+    input_paths = {}
+    target_paths = {}
+    for file_path in file_paths:
+        output_path = converted_path(file_path, export_folder_dir)
+        input_paths[os.path.normcase(os.path.abspath(file_path))] = file_path
+        target_paths[file_path] = os.path.normcase(os.path.abspath(output_path))
+    # converted files of a previous run are listed with their sources, they are not converted back
+    previous_outputs = set()
+    for file_path in file_paths:
+        target = input_paths.get(target_paths[file_path])
+        if file_path in previous_outputs or target is None or target in previous_outputs:
+            continue
+        # a .ray and a .sdf converted into each other: the newer one is the output of the older one
+        mutual = input_paths.get(target_paths[target]) == file_path
+        if mutual and os.path.getmtime(target) < os.path.getmtime(file_path):
+            previous_outputs.add(file_path)
+        else:
+            previous_outputs.add(target)
+    file_paths = [file_path for file_path in file_paths if file_path not in previous_outputs]
+    output_paths = set()
+    for file_path in file_paths:
+        output_path = target_paths[file_path]
+        if output_path in output_paths:
+            msg = (
+                "Converting " + file_path + " would overwrite " + output_path + ", please define another export folder"
+            )
+            raise ValueError(msg)
+        output_paths.add(output_path)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(convert_rayfile, file_path, export_folder_dir, chunk_size, force)
+            for file_path in file_paths
+        ]
+        for file_path, future in zip(file_paths, futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                # an invalid or unreadable rayfile must not stop the conversion of the other files
+                result = {"file": file_path, "output": None, "skipped": False, "rays": 0, "error": str(error)}
+            if result["error"] is not None:
+                print("Failed to convert " + result["file"] + ": " + result["error"])
+            elif result["skipped"]:
+                print("Skipped " + result["file"] + ": " + result["output"] + " is up to date")
+            else:
+                print(
+                    "Converted "
+                    + result["file"]
+                    + " to "
+                    + result["output"]
+                    + ": "
+                    + str(result["rays"])
+                    + " rays in "
+                    + "{:.2f}".format(result["seconds"])
+                    + " s ("
+                    + "{:.0f}".format(result["rays_per_second"])
+                    + " rays/s, "
+                    + "{:.1f}".format(result["mb_per_second"])
+                    + " MB/s)"
+                )
+            results.append(result)
+    return results
+
+
+def main():
+    """Command line entry point to convert a batch of rayfiles between speos and zemax"""
+    parser = argparse.ArgumentParser(description="Convert Speos .ray files to Zemax .sdf and Zemax .sdf/.dat to .ray")
+    parser.add_argument("source", help="folder containing rayfiles or glob pattern")
+    parser.add_argument("-o", "--output", default=None, help="folder of the converted files")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-c", "--chunk-size", type=int, default=1000000, help="number of rays converted at once")
+    parser.add_argument("-f", "--force", action="store_true", help="convert files that are up to date")
+    args = parser.parse_args()
+    results = convert_rayfiles(args.source, args.output, args.workers, args.chunk_size, args.force)
+    if any(result["error"] is not None for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
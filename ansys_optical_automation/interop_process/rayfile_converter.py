@@ -1,6 +1,14 @@
-import struct
+import os
 
 from ansys_optical_automation.post_process.dpf_rayfile import DpfRayfile
+from ansys_optical_automation.post_process.dpf_rayfile_writer import pack_speos_header
+from ansys_optical_automation.post_process.dpf_rayfile_writer import pack_zemax_header
+from ansys_optical_automation.post_process.dpf_rayfile_writer import speos_header_format
+from ansys_optical_automation.post_process.dpf_rayfile_writer import speos_ray_dtype
+from ansys_optical_automation.post_process.dpf_rayfile_writer import zemax_header_format
+from ansys_optical_automation.post_process.dpf_rayfile_writer import (
+    zemax_spectral_ray_dtype,
+)
 
 
 class RayfileConverter(DpfRayfile):
@@ -8,114 +16,209 @@ class RayfileConverter(DpfRayfile):
     This class contains the methods to convert rayfile between speos and zemax
     """
 
-    def __init__(self, file_path):
-        DpfRayfile.__init__(self, file_path)
+    def __init__(self, file_path, mmap=False, strict=True, header_only=False, cache=None, workers=1):
+        """
+        Parameters
+        ----------
+        file_path : str
+            path to the rayfile to convert
+        mmap : bool, optional
+            memory map the ray body read-only instead of reading it, default value is False
+        strict : bool, optional
+            raise an error on invalid rays instead of removing them, default value is True
+        header_only : bool, optional
+            only read the header on load, the rays are loaded on first access. Default value is False.
+        cache : ArrayCache, optional
+            cache of the validated rays, reloaded memory mapped while the rayfile is unchanged. Default is None.
+        workers : int, optional
+            number of threads reading and validating the ray body, default value is 1.
+        """
+        DpfRayfile.__init__(
+            self, file_path, mmap=mmap, strict=strict, header_only=header_only, cache=cache, workers=workers
+        )
 
-    def __export_to_zemax(self):
+    def __zemax_header(self, rays_number):
         """
-        this method convert the rayfile into zemax format
+        this method packs the header of the converted zemax spectral rayfile
+
+        Parameters
+        ----------
+        rays_number : int
+            number of rays written after the header
 
         Returns
         -------
-        None
+        bytes
 
         """
-        outfile = self.export_file(convert=True)
-        zemax_spectrum_file = open(outfile, "wb")
-        zemax_spectrum_file.write(struct.pack("<I", 1010))  # Identifier
-        zemax_spectrum_file.write(struct.pack("<I", self.rays_number))  # NbrRays
-
-        description = "Converted from SPEOS .ray file."
-        # if len(description) > 100:
-        #    description = description[:100]
-        # else:
-        #    description = description.ljust(100)
-        description = description.ljust(100)
-        zemax_spectrum_file.write(description.encode("ascii"))  # Description
-        zemax_spectrum_file.write(struct.pack("f", self.radiometric_power))  # SourceFlux = radiometric flux in SPOES
-        zemax_spectrum_file.write(struct.pack("f", self.radiometric_power))  # RaySetFlux = radiometric flux in SPOES
-        zemax_spectrum_file.write(struct.pack("f", 0))  # Wavelength
-        zemax_spectrum_file.write(struct.pack("f", 0))  # InclinationBeg
-        zemax_spectrum_file.write(struct.pack("f", 0))  # InclinationEnd
-        zemax_spectrum_file.write(struct.pack("f", 0))  # AzimuthBeg
-        zemax_spectrum_file.write(struct.pack("f", 0))  # AzimuthEnd
-        zemax_spectrum_file.write(struct.pack("<I", 4))  # DimensionUnits: M=0, IN=1, CM=2, FT=3, MM=4
-        zemax_spectrum_file.write(struct.pack("f", 0))  # LocX
-        zemax_spectrum_file.write(struct.pack("f", 0))  # LocY
-        zemax_spectrum_file.write(struct.pack("f", 0))  # LocZ
-        zemax_spectrum_file.write(struct.pack("f", 0))  # RotX
-        zemax_spectrum_file.write(struct.pack("f", 0))  # RotY
-        zemax_spectrum_file.write(struct.pack("f", 0))  # RotZ
-        zemax_spectrum_file.write(struct.pack("f", 0))  # ScaleX
-        zemax_spectrum_file.write(struct.pack("f", 0))  # ScaleY
-        zemax_spectrum_file.write(struct.pack("f", 0))  # ScaleZ
-        zemax_spectrum_file.write(struct.pack("f", 0))  # unused1 (float)
-        zemax_spectrum_file.write(struct.pack("f", 0))  # unused2 (float)
-        zemax_spectrum_file.write(struct.pack("f", 0))  # unused3 (float)
-        zemax_spectrum_file.write(struct.pack("f", 0))  # unused4 (float)
-        zemax_spectrum_file.write(
-            struct.pack("<I", 2)
-        )  # ray_format_type is color since the SPEOS ray file always contains wavelength
-        zemax_spectrum_file.write(struct.pack("<I", 0))  # flux_type is Watts
-        zemax_spectrum_file.write(struct.pack("<I", 0))  # reversed1 (int)
-        zemax_spectrum_file.write(struct.pack("<I", 0))  # reversed2 (int)
-        for ray in self.rays:
-            zemax_spectrum_file.write(struct.pack("f", ray.coordinate_x))  # x
-            zemax_spectrum_file.write(struct.pack("f", ray.coordinate_y))  # y
-            zemax_spectrum_file.write(struct.pack("f", ray.coordinate_z))  # z
-            zemax_spectrum_file.write(struct.pack("f", ray.radiation_l))  # l
-            zemax_spectrum_file.write(struct.pack("f", ray.radiation_m))  # m
-            zemax_spectrum_file.write(struct.pack("f", ray.radiation_n))  # n
-            zemax_spectrum_file.write(struct.pack("f", ray.energy))  # flux (Watts)
-            zemax_spectrum_file.write(struct.pack("f", ray.wavelength))  # wavelength
-        zemax_spectrum_file.close()
-
-    def __export_to_speos(self):
+        return pack_zemax_header(rays_number, self.radiometric_power, self.radiometric_power)
+
+    def __speos_header(self, rays_number):
         """
-        this method convert the rayfile into speos format
+        this method packs the header of the converted speos rayfile
+
+        Parameters
+        ----------
+        rays_number : int
+            number of rays written after the header, not stored in the speos format
 
         Returns
         -------
-        None
+        bytes
 
         """
-        outfile = self.export_file(convert=True)
-        speos_ray_file = open(outfile, "wb")
-        speos_ray_file.write(struct.pack("f", self.radiometric_power))
-        speos_ray_file.write(struct.pack("f", 2.0))
-        speos_ray_file.write(struct.pack("f", 2.0))
-        speos_ray_file.write(struct.pack("f", 2.0))
-        speos_ray_file.write(struct.pack("f", 2.0))
-        speos_ray_file.write(struct.pack("f", 2.0))
-        speos_ray_file.write(struct.pack("f", self.photometric_power))
-        for ray in self.rays:
-            speos_ray_file.write(struct.pack("f", ray.coordinate_x))
-            speos_ray_file.write(struct.pack("f", ray.coordinate_y))
-            speos_ray_file.write(struct.pack("f", ray.coordinate_z))
-            speos_ray_file.write(struct.pack("f", ray.radiation_l))
-            speos_ray_file.write(struct.pack("f", ray.radiation_m))
-            speos_ray_file.write(struct.pack("f", ray.radiation_n))
-            speos_ray_file.write(struct.pack("f", ray.wavelength * 1000))
-            speos_ray_file.write(struct.pack("f", ray.energy))
-        speos_ray_file.close()
-
-    def speos_to_zemax(self):
-        """this method will read the speos rayfile content and convert it to zemax format
+        return pack_speos_header(self.radiometric_power, self.photometric_power)
+
+    def __export(self, pack_header, dtype, wavelength_factor, export_folder_dir, overwrite, matrix):
+        """
+        this method writes the loaded rays with a single header write and bulk body writes
+
+        Parameters
+        ----------
+        pack_header : function
+            header packer of the output format
+        dtype : numpy.dtype
+            record layout of the output format
+        wavelength_factor : float
+            factor applied to the wavelength in micrometer
+        export_folder_dir : str
+            folder of the converted file, None for the folder of the input file
+        overwrite : bool
+            overwrite an existing converted file instead of adding a suffix
+        matrix : array_like
+            4x4 transformation matrix applied to the written rays, None to keep them unchanged
+
+        Returns
+        -------
+        str
+            path of the converted file
+
+        """
+        outfile = self.export_file(export_folder_dir, convert=True, overwrite=overwrite)
+        with open(outfile, "wb") as export_file:
+            export_file.write(pack_header(self.rays_number))
+            rays = self.rays if matrix is None else self.rays.copy().transform(matrix)
+            rays.tofile(export_file, dtype, wavelength_factor)
+        return outfile
+
+    def __stream_export(
+        self, chunk_size, pack_header, header_size, dtype, wavelength_factor, export_folder_dir, overwrite, matrix
+    ):
+        """
+        this method converts the rayfile chunk by chunk without loading all rays
+
+        The header is written with the final ray count and the photometric power accumulated while streaming
+        once all chunks are written.
+
+        Parameters
+        ----------
+        chunk_size : int
+            number of rays converted at once
+        pack_header : function
+            header packer of the output format
+        header_size : int
+            size of the header in bytes, skipped until the header is written
+        dtype : numpy.dtype
+            record layout of the output format
+        wavelength_factor : float
+            factor applied to the wavelength in micrometer
+        export_folder_dir : str
+            folder of the converted file, None for the folder of the input file
+        overwrite : bool
+            overwrite an existing converted file instead of adding a suffix
+        matrix : array_like
+            4x4 transformation matrix applied to the written rays, None to keep them unchanged
 
         Returns
         -------
-        None
+        str
+            path of the converted file
 
         """
+        outfile = self.export_file(export_folder_dir, convert=True, overwrite=overwrite)
+        try:
+            with open(outfile, "wb") as export_file:
+                export_file.seek(header_size)
+                rays_number = 0
+                for chunk in self.read_chunks(chunk_size):
+                    if matrix is not None:
+                        chunk.transform(matrix)
+                    chunk.to_records(dtype, wavelength_factor).tofile(export_file)
+                    rays_number += len(chunk)
+                export_file.seek(0)
+                export_file.write(pack_header(rays_number))
+        except Exception:
+            # an invalid chunk stops the conversion, the truncated body without header must not look converted
+            os.remove(outfile)
+            raise
+        return outfile
+
+    def speos_to_zemax(self, chunk_size=None, export_folder_dir=None, overwrite=False, matrix=None):
+        """this method will read the speos rayfile content and convert it to zemax format
 
-        self.__export_to_zemax()
+        Parameters
+        ----------
+        chunk_size : int, optional
+            if defined, the rays are streamed from the input file chunk_size rays at a time so the memory
+            stays bounded, open the converter with header_only=True to also skip loading the rays. Default is None.
+        export_folder_dir : str, optional
+            folder of the converted file, default is the folder of the input file
+        overwrite : bool, optional
+            overwrite an existing converted file instead of adding a _1, _2 ... suffix, default value is False
+        matrix : array_like, optional
+            4x4 transformation matrix applied to the rays while converting, e.g. to place them in vehicle
+            coordinates, see RayBundle.transform. The loaded rays are not modified. Default is None.
 
-    def zemax_to_speos(self):
+        Returns
+        -------
+        str
+            path of the converted file
+
+        """
+        if chunk_size is None:
+            return self.__export(self.__zemax_header, zemax_spectral_ray_dtype, 1, export_folder_dir, overwrite, matrix)
+        return self.__stream_export(
+            chunk_size,
+            self.__zemax_header,
+            zemax_header_format.size,
+            zemax_spectral_ray_dtype,
+            1,
+            export_folder_dir,
+            overwrite,
+            matrix,
+        )
+
+    def zemax_to_speos(self, chunk_size=None, export_folder_dir=None, overwrite=False, matrix=None):
         """this method convert the zemax rayfile into speos format
 
+        Parameters
+        ----------
+        chunk_size : int, optional
+            if defined, the rays are streamed from the input file chunk_size rays at a time so the memory
+            stays bounded, open the converter with header_only=True to also skip loading the rays. Default is None.
+        export_folder_dir : str, optional
+            folder of the converted file, default is the folder of the input file
+        overwrite : bool, optional
+            overwrite an existing converted file instead of adding a _1, _2 ... suffix, default value is False
+        matrix : array_like, optional
+            4x4 transformation matrix applied to the rays while converting, e.g. to place them in vehicle
+            coordinates, see RayBundle.transform. The loaded rays are not modified. Default is None.
+
         Returns
         -------
-        None
+        str
+            path of the converted file
 
         """
-        self.__export_to_speos()
+        if chunk_size is None:
+            return self.__export(self.__speos_header, speos_ray_dtype, 1000, export_folder_dir, overwrite, matrix)
+        return self.__stream_export(
+            chunk_size,
+            self.__speos_header,
+            speos_header_format.size,
+            speos_ray_dtype,
+            1000,
+            export_folder_dir,
+            overwrite,
+            matrix,
+        )
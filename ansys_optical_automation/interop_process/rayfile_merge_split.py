@@ -0,0 +1,310 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ansys_optical_automation.post_process.dpf_ray_bundle import RayBundle
+from ansys_optical_automation.post_process.dpf_ray_bundle import ray_dtype
+from ansys_optical_automation.post_process.dpf_rayfile import DpfRayfile
+from ansys_optical_automation.post_process.dpf_rayfile_index import spatial_keys
+from ansys_optical_automation.post_process.dpf_rayfile_writer import RayfileWriter
+
+
+def scan_rayfile(file_path, chunk_size=1000000):
+    """
+    compute the total ray energy and the bounding box of the ray start positions of a rayfile chunk by chunk
+
+    Parameters
+    ----------
+    file_path : str
+        path to the rayfile
+    chunk_size : int, optional
+        number of rays read at once, default value is 1000000
+
+    Returns
+    -------
+    dict
+        "energy", "minimum" and "maximum" of the rays stored in the file
+
+    """
+    rayfile = DpfRayfile(file_path, mmap=True)
+    rays = rayfile.rays
+    energy = 0.0
+    minimum = np.full(3, np.inf)
+    maximum = np.full(3, -np.inf)
+    for start in range(0, len(rays), chunk_size):
+        chunk = rays[start : start + chunk_size]
+        energy += float(np.sum(chunk.energy, dtype=np.float64))
+        positions = np.column_stack((chunk.x, chunk.y, chunk.z))
+        minimum = np.fmin(minimum, np.nanmin(positions, axis=0))
+        maximum = np.fmax(maximum, np.nanmax(positions, axis=0))
+    rayfile.close()
+    return {"energy": energy, "minimum": minimum, "maximum": maximum}
+
+
+def merge_rayfiles(file_paths, output_path, weights=None, chunk_size=1000000):
+    """
+    merge rayfiles, e.g. one per LED die, into a single source
+
+    The rays are streamed chunk by chunk from every input to the output. Ray energies are rescaled to watts so the
+    power of every input is preserved relative to the others.
+
+    Parameters
+    ----------
+    file_paths : list of str
+        speos .ray or zemax .sdf/.dat rayfiles to merge
+    output_path : str
+        path of the merged rayfile, the extension .ray, .sdf or .dat defines the format
+    weights : list of float, optional
+        factor applied to the power of each input, default keeps the power of all inputs
+    chunk_size : int, optional
+        number of rays read at once, default value is 1000000
+
+    Returns
+    -------
+    str
+        path of the merged rayfile
+
+    """
+    if weights is None:
+        weights = [1.0] * len(file_paths)
+    if len(weights) != len(file_paths):
+        msg = "One weight per input rayfile is needed"
+        raise ValueError(msg)
+    input_paths = [os.path.normcase(os.path.abspath(path)) for path in file_paths]
+    if os.path.normcase(os.path.abspath(output_path)) in input_paths:
+        msg = "Merged rayfile " + output_path + " would overwrite one of the input rayfiles"
+        raise ValueError(msg)
+    output = RayfileWriter(output_path, description="Merged from " + str(len(file_paths)) + " rayfiles.")
+    radiometric_power = 0.0
+    photometric_power = 0.0
+    try:
+        for file_path, weight in zip(file_paths, weights):
+            energy = scan_rayfile(file_path, chunk_size)["energy"]
+            rayfile = DpfRayfile(file_path, header_only=True)
+            power_scale = weight * rayfile.radiometric_power / energy if energy > 0 else 0.0
+            for chunk in rayfile.read_chunks(chunk_size):
+                chunk.records["energy"] *= power_scale
+                output.write(chunk)
+            radiometric_power += weight * rayfile.radiometric_power
+            photometric_power += weight * rayfile.photometric_power
+    finally:
+        output.close()
+    output.write_header(radiometric_power, photometric_power)
+    return output_path
+
+
+def split_rayfile(
+    file_path, rays_per_file=None, tiles=None, export_folder_dir=None, extension=None, chunk_size=1000000
+):
+    """
+    split a rayfile into shards of a given number of rays or into spatial tiles of the ray start positions
+
+    The rays are streamed chunk by chunk from the input to the shards and at most one shard is open at once. Every
+    shard gets the share of the radiometric and photometric power carried by its rays, zemax shards keep the power of
+    the whole file as source flux.
+
+    Parameters
+    ----------
+    file_path : str
+        speos .ray or zemax .sdf/.dat rayfile to split
+    rays_per_file : int, optional
+        maximum number of rays per shard
+    tiles : tuple of int, optional
+        number of tiles along x, y and optionally z over the bounding box of the ray start positions
+    export_folder_dir : str, optional
+        folder of the shards, default is the folder of the input file
+    extension : str, optional
+        ".ray", ".sdf" or ".dat" format of the shards, default is the format of the input file
+    chunk_size : int, optional
+        number of rays read at once, default value is 1000000
+
+    Returns
+    -------
+    list of str
+        paths of the shards, empty tiles are not written
+
+    """
+    if (rays_per_file is None) == (tiles is None):
+        msg = "Define either rays_per_file or tiles"
+        raise ValueError(msg)
+    if rays_per_file is not None and rays_per_file <= 0:
+        msg = "rays_per_file must be a positive integer"
+        raise ValueError(msg)
+    base_name, input_extension = os.path.splitext(os.path.basename(file_path))
+    extension = (extension or input_extension).lower()
+    export_folder_dir = export_folder_dir or os.path.dirname(os.path.abspath(file_path))
+    rayfile = DpfRayfile(file_path, header_only=True)
+    shards = {}
+
+    def shard(key):
+        if key not in shards:
+            shard_name = base_name + "_" + "_".join(str(index) for index in key) + extension
+            shards[key] = RayfileWriter(os.path.join(export_folder_dir, shard_name), "Split from " + base_name)
+        else:
+            shards[key].open()
+        return shards[key]
+
+    try:
+        if rays_per_file is not None:
+            written = 0
+            for chunk in rayfile.read_chunks(chunk_size):
+                start = 0
+                while start < len(chunk):
+                    count = min(len(chunk) - start, rays_per_file - written % rays_per_file)
+                    shard((written // rays_per_file,)).write(chunk[start : start + count])
+                    if (written + count) % rays_per_file == 0:
+                        shards[(written // rays_per_file,)].close()
+                    start += count
+                    written += count
+        else:
+            tiles = np.asarray(tiles, dtype=np.int64)
+            bounds = scan_rayfile(file_path, chunk_size)
+            minimum = bounds["minimum"][: len(tiles)]
+            tile_size = (bounds["maximum"][: len(tiles)] - minimum) / tiles
+            tile_size[tile_size == 0] = 1
+            for chunk in rayfile.read_chunks(chunk_size):
+                positions = np.column_stack((chunk.x, chunk.y, chunk.z))[:, : len(tiles)]
+                coordinates = np.clip(np.floor((positions - minimum) / tile_size).astype(np.int64), 0, tiles - 1)
+                tile_ids = np.ravel_multi_index(coordinates.T, tiles)
+                order = np.argsort(tile_ids, kind="stable")
+                sorted_ids = tile_ids[order]
+                starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+                ends = np.r_[starts[1:], len(order)]
+                # every tile is only open while its rays of the chunk are appended, whatever the number of tiles
+                for start, end in zip(starts, ends):
+                    key = np.unravel_index(sorted_ids[start], tiles)
+                    writer = shard(tuple(int(index) for index in key))
+                    writer.write(chunk[order[start:end]])
+                    writer.close()
+    finally:
+        for writer in shards.values():
+            writer.close()
+    energy = sum(writer.energy for writer in shards.values())
+    luminous_flux = sum(writer.luminous_flux for writer in shards.values())
+    for writer in shards.values():
+        if luminous_flux > 0:
+            photometric_power = rayfile.photometric_power * writer.luminous_flux / luminous_flux
+        else:
+            photometric_power = rayfile.photometric_power * writer.energy / energy if energy > 0 else 0.0
+        writer.write_header(
+            rayfile.radiometric_power * writer.energy / energy if energy > 0 else 0.0,
+            photometric_power,
+            source_flux=rayfile.radiometric_power,
+        )
+    return [shards[key].file_path for key in sorted(shards)]
+
+
+def merge_sorted_runs(run_paths, chunk_size):
+    """
+    merge runs of rays sorted by key chunk by chunk
+
+    Every step reads the next chunk_size keys of every run and emits all rays up to the smallest last key read, so
+    at most one chunk per run is in memory. The runs stay memory mapped until the generator is exhausted or closed.
+
+    Parameters
+    ----------
+    run_paths : list of tuple
+        (keys path, records path) of every run, keys are uint64 .npy files and records ray_dtype .npy files
+    chunk_size : int
+        number of rays read per run at once
+
+    Returns
+    -------
+    generator of RayBundle
+        rays in key order, equal keys keep the order of the runs
+
+    """
+    keys = [np.load(keys_path, mmap_mode="r") for keys_path, _ in run_paths]
+    records = [np.load(records_path, mmap_mode="r") for _, records_path in run_paths]
+    positions = [0] * len(run_paths)
+    while True:
+        active = [run for run in range(len(keys)) if positions[run] < len(keys[run])]
+        if not active:
+            return
+        blocks = {run: keys[run][positions[run] : positions[run] + chunk_size] for run in active}
+        # runs with keys left after their block bound the keys which can be emitted
+        bounds = [blocks[run][-1] for run in active if positions[run] + len(blocks[run]) < len(keys[run])]
+        bound = min(bounds) if bounds else None
+        merged_keys = []
+        merged_records = []
+        for run in active:
+            count = len(blocks[run]) if bound is None else int(np.searchsorted(blocks[run], bound, side="right"))
+            merged_keys.append(blocks[run][:count])
+            merged_records.append(records[run][positions[run] : positions[run] + count])
+            positions[run] += count
+        merged_keys = np.concatenate(merged_keys)
+        order = np.argsort(merged_keys, kind="stable")
+        yield RayBundle(np.concatenate(merged_records)[order])
+
+
+def sort_rayfile(
+    file_path,
+    output_path,
+    curve="hilbert",
+    directions=False,
+    bits=None,
+    chunk_size=1000000,
+    temporary_dir=None,
+):
+    """
+    write a rayfile with its rays ordered along a space filling curve of their start position
+
+    Rays close in space are then close in the file, so box queries, binning and decimation read contiguous memory
+    and tiles become ranges of rays. Every chunk is sorted and saved as a run, the runs are then merged chunk by
+    chunk, so rayfiles bigger than the memory can be sorted.
+
+    Parameters
+    ----------
+    file_path : str
+        speos .ray or zemax .sdf/.dat rayfile to sort
+    output_path : str
+        path of the sorted rayfile, the extension .ray, .sdf or .dat defines the format
+    curve : str, optional
+        "hilbert" or "morton", default value is "hilbert"
+    directions : bool, optional
+        also order by direction, rays with the same position cell are then grouped by direction. Default is False.
+    bits : int, optional
+        number of bits per axis of the curve, default uses 21 bits for positions and 10 with directions
+    chunk_size : int, optional
+        number of rays sorted in memory at once, default value is 1000000
+    temporary_dir : str, optional
+        folder of the sorted runs, default is a temporary folder next to the output file
+
+    Returns
+    -------
+    str
+        path of the sorted rayfile
+
+    """
+    if os.path.normcase(os.path.abspath(output_path)) == os.path.normcase(os.path.abspath(file_path)):
+        msg = "Sorted rayfile " + output_path + " would overwrite the input rayfile"
+        raise ValueError(msg)
+    bounds = scan_rayfile(file_path, chunk_size)
+    rayfile = DpfRayfile(file_path, header_only=True)
+    run_dir = tempfile.mkdtemp(
+        prefix="raysort", dir=temporary_dir or os.path.dirname(os.path.abspath(output_path)) or None
+    )
+    output = RayfileWriter(output_path, description="Sorted along a " + curve + " curve.")
+    merged_runs = None
+    try:
+        run_paths = []
+        for chunk in rayfile.read_chunks(chunk_size):
+            keys = spatial_keys(chunk, bounds["minimum"], bounds["maximum"], curve, directions, bits)
+            order = np.argsort(keys, kind="stable")
+            run_path = os.path.join(run_dir, str(len(run_paths)))
+            np.save(run_path + "_keys.npy", keys[order])
+            np.save(run_path + "_rays.npy", chunk.to_records(ray_dtype)[order])
+            run_paths.append((run_path + "_keys.npy", run_path + "_rays.npy"))
+        merged_runs = merge_sorted_runs(run_paths, chunk_size)
+        for chunk in merged_runs:
+            output.write(chunk)
+    finally:
+        output.close()
+        if merged_runs is not None:
+            # unmap the runs, a mapped file can not be deleted on windows
+            merged_runs.close()
+        shutil.rmtree(run_dir)
+    output.write_header(rayfile.radiometric_power, rayfile.photometric_power, source_flux=rayfile.radiometric_power)
+    return output_path
@@ -0,0 +1,379 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+cache_format_version = 1
+
+
+def content_hash(file_path, block_size=1048576):
+    """
+    compute a content hash of a file from its size and its first and last blocks
+
+    Only two blocks are read so the hash stays cheap for rayfiles of several gigabytes, together with the file
+    modification time it detects files replaced by another content.
+
+    Parameters
+    ----------
+    file_path : str
+        path to the file
+    block_size : int, optional
+        number of bytes hashed at the start and at the end of the file, default value is 1048576
+
+    Returns
+    -------
+    str
+        hexadecimal sha1 digest
+
+    """
+    digest = hashlib.sha1()
+    size = os.path.getsize(file_path)
+    digest.update(str(size).encode())
+    with open(file_path, "rb") as file:
+        digest.update(file.read(block_size))
+        if size > 2 * block_size:
+            file.seek(size - block_size)
+        digest.update(file.read(block_size))
+    return digest.hexdigest()
+
+
+class ArrayCache:
+    """
+    this class stores decoded arrays of source files as uncompressed .npy files to reload them with a memory map
+
+    Every entry is a folder holding one .npy file per array and an entry.json file with the source key and the
+    non array values. An entry is only used if the source path, size, modification time and content hash match.
+    Cache folders are kept below max_bytes by removing the least recently used entries.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=2147483648):
+        """
+        Parameters
+        ----------
+        cache_dir : str, optional
+            folder of the cache entries, default is a .npcache folder next to every source file
+        max_bytes : int, optional
+            maximum size of a cache folder in bytes, default value is 2 GiB
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def folder(self, file_path):
+        """
+        return the cache folder used for a source file
+
+        Parameters
+        ----------
+        file_path : str
+            path to the source file
+
+        Returns
+        -------
+        str
+
+        """
+        if self.cache_dir is not None:
+            return self.cache_dir
+        return os.path.join(os.path.dirname(os.path.abspath(file_path)), ".npcache")
+
+    def entry_dir(self, file_path, kind):
+        """
+        return the folder of the cache entry of a source file
+
+        Parameters
+        ----------
+        file_path : str
+            path to the source file
+        kind : str
+            name of the decoded content, e.g. "rayfile"
+
+        Returns
+        -------
+        str
+
+        """
+        path = os.path.normcase(os.path.abspath(file_path))
+        path_hash = hashlib.sha1(path.encode()).hexdigest()[:12]
+        return os.path.join(self.folder(file_path), os.path.basename(file_path) + "." + kind + "." + path_hash)
+
+    @staticmethod
+    def key(file_path):
+        """
+        return the key identifying the current content of a source file
+
+        Parameters
+        ----------
+        file_path : str
+            path to the source file
+
+        Returns
+        -------
+        dict
+
+        """
+        stat = os.stat(file_path)
+        return {
+            "version": cache_format_version,
+            "path": os.path.normcase(os.path.abspath(file_path)),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": content_hash(file_path),
+        }
+
+    def load(self, file_path, kind):
+        """
+        load the cached content of a source file, arrays are memory mapped copy-on-write
+
+        Parameters
+        ----------
+        file_path : str
+            path to the source file
+        kind : str
+            name of the decoded content
+
+        Returns
+        -------
+        object
+            cached content, None if there is no valid entry
+
+        """
+        entry_dir = self.entry_dir(file_path, kind)
+        entry_file = os.path.join(entry_dir, "entry.json")
+        if not os.path.isfile(entry_file):
+            return None
+        try:
+            with open(entry_file, "r") as file:
+                entry = json.load(file)
+            if entry["key"] != self.key(file_path):
+                return None
+            content = self.__decode(entry["content"], entry_dir)
+        except (OSError, ValueError, KeyError):
+            return None
+        # the modification time of entry.json records the last use for the eviction
+        os.utime(entry_file)
+        return content
+
+    def store(self, file_path, kind, content):
+        """
+        store the decoded content of a source file and evict the least recently used entries
+
+        Parameters
+        ----------
+        file_path : str
+            path to the source file
+        kind : str
+            name of the decoded content
+        content : object
+            nested dict, list and tuple of numpy arrays, numbers, strings and None
+
+        Returns
+        -------
+        None
+
+        """
+        entry_dir = self.entry_dir(file_path, kind)
+        temporary_dir = entry_dir + ".tmp" + str(os.getpid())
+        shutil.rmtree(temporary_dir, ignore_errors=True)
+        os.makedirs(temporary_dir)
+        try:
+            entry = {"key": self.key(file_path), "content": self.__encode(content, temporary_dir, [0])}
+            with open(os.path.join(temporary_dir, "entry.json"), "w") as file:
+                json.dump(entry, file)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(temporary_dir, entry_dir)
+        except (OSError, TypeError):
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+            raise
+        self.evict(self.folder(file_path), keep=entry_dir)
+
+    def evict(self, folder, keep=None):
+        """
+        remove the least recently used entries until the folder is smaller than max_bytes
+
+        Parameters
+        ----------
+        folder : str
+            cache folder
+        keep : str, optional
+            entry folder never removed, e.g. the entry just stored
+
+        Returns
+        -------
+        None
+
+        """
+        entries = []
+        for name in os.listdir(folder):
+            entry_dir = os.path.join(folder, name)
+            entry_file = os.path.join(entry_dir, "entry.json")
+            if not os.path.isfile(entry_file):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            entries.append((os.path.getmtime(entry_file), size, entry_dir))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry_dir != keep:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+
+    def clear(self, file_path=None):
+        """
+        remove the cache folder of a source file, or the cache directory
+
+        Parameters
+        ----------
+        file_path : str, optional
+            source file whose cache folder is removed, required if no cache_dir is defined
+
+        Returns
+        -------
+        None
+
+        """
+        shutil.rmtree(self.folder(file_path) if file_path is not None else self.cache_dir, ignore_errors=True)
+
+    def __encode(self, value, entry_dir, counter):
+        """
+        convert content into json values, arrays are saved as .npy files
+
+        Parameters
+        ----------
+        value : object
+            content to encode
+        entry_dir : str
+            folder of the .npy files
+        counter : list
+            single item list holding the number of .npy files written
+
+        Returns
+        -------
+        object
+            json compatible value
+
+        """
+        if isinstance(value, np.ndarray):
+            return {"__array__": self.__save(value, entry_dir, counter)}
+        if isinstance(value, (list, tuple)):
+            shapes = {(item.shape, item.dtype) for item in value if isinstance(item, np.ndarray)}
+            if value and len(shapes) == 1 and all(isinstance(item, np.ndarray) for item in value):
+                # lists of arrays of the same shape, e.g. one bsdf block per incidence, are stacked in one file
+                return {"__arrays__": self.__save(np.stack(value), entry_dir, counter)}
+            items = [self.__encode(item, entry_dir, counter) for item in value]
+            return items if isinstance(value, list) else {"__tuple__": items}
+        if isinstance(value, dict):
+            return {"__dict__": [[key, self.__encode(item, entry_dir, counter)] for key, item in value.items()]}
+        if isinstance(value, np.generic):
+            return value.item()
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        msg = "Type " + type(value).__name__ + " cannot be cached"
+        raise TypeError(msg)
+
+    @staticmethod
+    def __save(array, entry_dir, counter):
+        """
+        save an array as .npy file
+
+        Parameters
+        ----------
+        array : numpy.ndarray
+            array to save
+        entry_dir : str
+            folder of the .npy files
+        counter : list
+            single item list holding the number of .npy files written
+
+        Returns
+        -------
+        str
+            name of the .npy file
+
+        """
+        name = str(counter[0]) + ".npy"
+        counter[0] += 1
+        np.save(os.path.join(entry_dir, name), np.ascontiguousarray(array), allow_pickle=False)
+        return name
+
+    def __decode(self, value, entry_dir):
+        """
+        convert json values back into content, arrays are memory mapped
+
+        Parameters
+        ----------
+        value : object
+            json value
+        entry_dir : str
+            folder of the .npy files
+
+        Returns
+        -------
+        object
+            decoded content
+
+        """
+        if isinstance(value, list):
+            return [self.__decode(item, entry_dir) for item in value]
+        if isinstance(value, dict):
+            if "__array__" in value:
+                return self.__open(os.path.join(entry_dir, value["__array__"]))
+            if "__arrays__" in value:
+                return list(self.__open(os.path.join(entry_dir, value["__arrays__"])))
+            if "__tuple__" in value:
+                return tuple(self.__decode(item, entry_dir) for item in value["__tuple__"])
+            return {key: self.__decode(item, entry_dir) for key, item in value["__dict__"]}
+        return value
+
+    @staticmethod
+    def __open(npy_path):
+        """
+        memory map a .npy file copy-on-write, so the loaded arrays can be modified without changing the cache
+
+        Parameters
+        ----------
+        npy_path : str
+            path to the .npy file
+
+        Returns
+        -------
+        numpy.ndarray
+
+        """
+        array = np.load(npy_path, mmap_mode="c", allow_pickle=False)
+        if array.size == 0:
+            return np.array(array)
+        return array
+
+
+def cached_load(cache, file_path, kind, loader):
+    """
+    return the cached content of a source file or decode it with loader and cache it
+
+    Parameters
+    ----------
+    cache : ArrayCache
+        cache to use, None to always call loader
+    file_path : str
+        path to the source file
+    kind : str
+        name of the decoded content
+    loader : function
+        function without argument returning the decoded content
+
+    Returns
+    -------
+    tuple
+        (content, True if it was loaded from the cache)
+
+    """
+    if cache is None:
+        return loader(), False
+    content = cache.load(file_path, kind)
+    if content is not None:
+        return content, True
+    content = loader()
+    cache.store(file_path, kind, content)
+    return content, False
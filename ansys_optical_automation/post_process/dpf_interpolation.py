@@ -0,0 +1,156 @@
+import numpy as np
+
+
+def axis_weights(line, new_values):
+    """
+    locate values on a sorted grid axis for a linear interpolation
+
+    The edge rules are the ones of the BSDF conversions: values up to the first grid value use the first grid value,
+    values beyond the last grid value are outside of the grid.
+
+    Parameters
+    ----------
+    line : array_like
+        sorted grid values
+    new_values : array_like
+        values to locate
+
+    Returns
+    -------
+    tuple
+        (lower index, upper index, coefficient of the upper value, mask of the values inside the grid)
+
+    """
+    line = np.asarray(line, dtype=float)
+    new_values = np.asarray(new_values, dtype=float)
+    index = np.searchsorted(line, new_values, side="left")
+    inside = index < len(line)
+    after_first = index > 0
+    upper = np.where(after_first, np.minimum(index, len(line) - 1), 0)
+    lower = np.where(after_first, upper - 1, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coefficient = np.where(after_first, (new_values - line[lower]) / (line[upper] - line[lower]), 0.0)
+    return lower, upper, coefficient, inside
+
+
+class BilinearWeights:
+    """
+    this class holds the neighbours and coefficients of query points on a rectilinear grid
+
+    The same weights interpolate any matrix defined on the grid, e.g. every wavelength of a BSDF at one incidence.
+    """
+
+    def __init__(self, line_x, line_y, new_x, new_y):
+        """
+        Parameters
+        ----------
+        line_x, line_y : array_like
+            sorted grid values along the first and second axis of the matrices
+        new_x, new_y : array_like
+            query points, arrays of the same shape
+        """
+        self.shape = np.broadcast(np.asarray(new_x), np.asarray(new_y)).shape
+        self.lower_x, self.upper_x, self.coefficient_x, inside_x = axis_weights(line_x, new_x)
+        self.lower_y, self.upper_y, self.coefficient_y, inside_y = axis_weights(line_y, new_y)
+        self.inside = inside_x & inside_y
+
+    @property
+    def nbytes(self) -> int:
+        """
+        return the memory used by the weights
+        Returns:
+            number of bytes
+        -------
+
+        """
+        return sum(
+            array.nbytes
+            for array in (
+                self.lower_x,
+                self.upper_x,
+                self.coefficient_x,
+                self.lower_y,
+                self.upper_y,
+                self.coefficient_y,
+                self.inside,
+            )
+        )
+
+    def apply(self, matrix_z):
+        """
+        interpolate a matrix at the query points
+
+        Parameters
+        ----------
+        matrix_z : array_like
+            values on the grid, the last two axes follow line_x and line_y, leading axes are interpolated at once
+
+        Returns
+        -------
+        numpy.ndarray
+            values at the query points, 0 outside of the grid, shape leading axes + query shape
+
+        """
+        matrix_z = np.asarray(matrix_z, dtype=float)
+        coefficient_x = self.coefficient_x
+        coefficient_y = self.coefficient_y
+        value_lower_x = (
+            matrix_z[..., self.lower_x, self.lower_y] * (1 - coefficient_y)
+            + matrix_z[..., self.lower_x, self.upper_y] * coefficient_y
+        )
+        value_upper_x = (
+            matrix_z[..., self.upper_x, self.lower_y] * (1 - coefficient_y)
+            + matrix_z[..., self.upper_x, self.upper_y] * coefficient_y
+        )
+        return np.where(self.inside, value_lower_x * (1 - coefficient_x) + value_upper_x * coefficient_x, 0.0)
+
+
+def bilinear_interpolation(matrix_z, line_x, line_y, new_x, new_y):
+    """
+    interpolate a matrix defined on a rectilinear grid at arrays of query points
+
+    Parameters
+    ----------
+    matrix_z : array_like
+        values on the grid, the last two axes follow line_x and line_y, leading axes are interpolated at once
+    line_x, line_y : array_like
+        sorted grid values
+    new_x, new_y : array_like
+        query points, arrays of the same shape
+
+    Returns
+    -------
+    numpy.ndarray
+        values at the query points, see axis_weights for the edge rules
+
+    """
+    return BilinearWeights(line_x, line_y, new_x, new_y).apply(matrix_z)
+
+
+def round_like_python(values, decimals):
+    """
+    round an array like the built-in round, e.g. wavelengths in micrometer to the nanometer with 3 decimals
+
+    numpy.round scales the values before rounding, so it can differ from round for values within rounding error of a
+    half, these few values are rounded by round.
+
+    Parameters
+    ----------
+    values : array_like
+        values to round
+    decimals : int
+        number of decimals
+
+    Returns
+    -------
+    numpy.ndarray
+        float64 rounded values
+
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, decimals)
+    scaled = values * 10.0**decimals
+    ties = np.flatnonzero(np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6)
+    if ties.size:
+        rounded.flat[ties] = [round(value, decimals) for value in values.flat[ties].tolist()]
+    return rounded
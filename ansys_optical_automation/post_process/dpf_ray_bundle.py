@@ -0,0 +1,972 @@
+import numpy as np
+
+from ansys_optical_automation.post_process.dpf_interpolation import round_like_python
+from ansys_optical_automation.post_process.dpf_rayfile_index import RayGridIndex
+from ansys_optical_automation.post_process.dpf_rayfile_index import RayWavelengthIndex
+
+Photopic_Conversion_wavelength = [
+    380,
+    390,
+    400,
+    410,
+    420,
+    430,
+    440,
+    450,
+    460,
+    470,
+    480,
+    490,
+    500,
+    507,
+    510,
+    520,
+    530,
+    540,
+    550,
+    555,
+    560,
+    570,
+    580,
+    590,
+    600,
+    610,
+    620,
+    630,
+    640,
+    650,
+    660,
+    670,
+    680,
+    690,
+    700,
+    710,
+    720,
+    730,
+    740,
+    750,
+    760,
+    770,
+]
+Photopic_Conversion_value = [
+    0.027,
+    0.082,
+    0.27,
+    0.826,
+    2.732,
+    7.923,
+    15.709,
+    25.954,
+    40.98,
+    62.139,
+    94.951,
+    142.078,
+    220.609,
+    303.464,
+    303.464,
+    484.93,
+    588.746,
+    651.582,
+    679.551,
+    683,
+    679.585,
+    650.216,
+    594.21,
+    517.031,
+    430.973,
+    343.549,
+    260.223,
+    180.995,
+    119.525,
+    73.081,
+    41.663,
+    21.856,
+    11.611,
+    5.607,
+    2.802,
+    1.428,
+    0.715,
+    0.355,
+    0.17,
+    0.082,
+    0.041,
+    0.02,
+]
+
+
+class DpfRay:
+    """
+    this class defines the ray property
+    """
+
+    def __init__(self, x, y, z, l_dir, m_dir, n_dir, wavelength, e):
+        self.__cardinal_coordinate_x = x
+        self.__cardinal_coordinate_y = y
+        self.__cardinal_coordinate_Z = z
+        self.__vector_radiation_l = l_dir
+        self.__vector_radiation_m = m_dir
+        self.__vector_radiation_n = n_dir
+        self.__ray_wavelength = wavelength
+        self.__ray_energy = e
+
+    @property
+    def coordinate_x(self) -> float:
+        """
+        return ray cardinal_coordinate_x
+        Returns:
+            cardinal_coordinate_x
+        -------
+
+        """
+        return self.__cardinal_coordinate_x
+
+    @property
+    def coordinate_y(self) -> float:
+        """
+        return ray cardinal_coordinate_y
+        Returns:
+            cardinal_coordinate_y
+        -------
+
+        """
+        return self.__cardinal_coordinate_y
+
+    @property
+    def coordinate_z(self) -> float:
+        """
+        return ray cardinal_coordinate_z
+        Returns:
+            cardinal_coordinate_z
+        -------
+
+        """
+        return self.__cardinal_coordinate_Z
+
+    @property
+    def radiation_l(self) -> float:
+        """
+        return ray vector_radiation_l
+        Returns:
+            vector_radiation_l
+        -------
+
+        """
+        return self.__vector_radiation_l
+
+    @property
+    def radiation_m(self) -> float:
+        """
+        return ray vector_radiation_m
+        Returns:
+            vector_radiation_m
+        -------
+
+        """
+        return self.__vector_radiation_m
+
+    @property
+    def radiation_n(self) -> float:
+        """
+        return ray vector_radiation_n
+        Returns:
+            vector_radiation_n
+        -------
+
+        """
+        return self.__vector_radiation_n
+
+    @property
+    def wavelength(self) -> float:
+        """
+        return ray wavelength
+        Returns:
+            wavelength
+        -------
+
+        """
+        return self.__ray_wavelength
+
+    @property
+    def energy(self) -> float:
+        """
+        return ray energy
+        Returns:
+            energy
+        -------
+
+        """
+        return self.__ray_energy
+
+
+ray_fields = ("x", "y", "z", "l", "m", "n", "wavelength", "energy")
+ray_dtype = np.dtype([(name, "<f4") for name in ray_fields])
+# length unit factors to meter
+length_units = {"mm": 0.001, "cm": 0.01, "m": 1.0}
+
+
+def rotation(axis, angle, center=(0, 0, 0)):
+    """
+    compute the linear part and translation of a rotation around an axis with Rodrigues' formula
+
+    Parameters
+    ----------
+    axis : array_like
+        rotation axis direction [x, y, z]
+    angle : float
+        rotation angle in degree
+    center : array_like, optional
+        point on the rotation axis, default value is (0, 0, 0)
+
+    Returns
+    -------
+    tuple
+        (3x3 rotation matrix, translation vector)
+
+    """
+    axis = np.asarray(axis, dtype=np.float64)
+    norm = np.linalg.norm(axis)
+    if norm == 0:
+        msg = "Rotation axis must not be a zero vector"
+        raise ValueError(msg)
+    axis = axis / norm
+    angle = np.radians(angle)
+    cross = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    linear = np.eye(3) + np.sin(angle) * cross + (1 - np.cos(angle)) * (cross @ cross)
+    center = np.asarray(center, dtype=np.float64)
+    return linear, center - linear @ center
+
+
+def transformation_matrix(linear=None, translation=None):
+    """
+    build a 4x4 affine transformation matrix
+
+    Parameters
+    ----------
+    linear : array_like, optional
+        3x3 matrix, default is the identity
+    translation : array_like, optional
+        translation [x, y, z], default is no translation
+
+    Returns
+    -------
+    numpy.ndarray
+        4x4 matrix applied to column vectors
+
+    """
+    matrix = np.eye(4)
+    if linear is not None:
+        matrix[:3, :3] = linear
+    if translation is not None:
+        matrix[:3, 3] = translation
+    return matrix
+
+
+photopic_wavelength = np.array(Photopic_Conversion_wavelength, dtype=np.float64)
+photopic_value = np.array(Photopic_Conversion_value, dtype=np.float64)
+
+
+def photopic_conversion(wavelength):
+    """
+    compute the photopic luminous efficacy V(lambda) * 683 lm/W by linear interpolation of the conversion table
+
+    Parameters
+    ----------
+    wavelength : float or numpy.ndarray
+        wavelength in nm
+
+    Returns
+    -------
+    float or numpy.ndarray
+        conversion factor from watts to lumens, 0 outside the table range
+
+    """
+    return np.interp(wavelength, photopic_wavelength, photopic_value, left=0, right=0)
+
+
+class RayBundle:
+    """
+    this class stores rays column wise in a numpy structured array
+
+    Every ray uses 8 float32 values (x, y, z, l, m, n, wavelength, energy), i.e. 32 bytes per ray.
+    DpfRay objects are only created when the bundle is iterated or indexed with an integer.
+    """
+
+    def __init__(self, records=None, wavelength_scale=1.0, wavelength=None):
+        """
+        Parameters
+        ----------
+        records : numpy.ndarray, optional
+            structured array with the fields x, y, z, l, m, n, energy and optionally wavelength, in any order
+        wavelength_scale : float, optional
+            factor converting the stored wavelength into micrometer, e.g. 0.001 for Speos nanometer values
+        wavelength : float, optional
+            wavelength in micrometer used for all rays when records has no wavelength field
+        """
+        self.__records = records if records is not None else np.empty(0, dtype=ray_dtype)
+        self.__wavelength_scale = wavelength_scale
+        self.__wavelength = wavelength
+        self.__pending = []
+        self.__grid_index = None
+        self.__wavelength_index = None
+
+    @classmethod
+    def from_arrays(cls, x, y, z, l_dir, m_dir, n_dir, wavelength, energy):
+        """
+        create a bundle from one array per ray property
+
+        Parameters
+        ----------
+        x, y, z : array_like
+            ray start position
+        l_dir, m_dir, n_dir : array_like
+            ray direction cosines
+        wavelength : array_like or float
+            ray wavelength in micrometer
+        energy : array_like
+            ray energy
+
+        Returns
+        -------
+        RayBundle
+
+        """
+        columns = np.broadcast_arrays(x, y, z, l_dir, m_dir, n_dir, wavelength, energy)
+        records = np.empty(columns[0].size, dtype=ray_dtype)
+        for name, column in zip(ray_fields, columns):
+            records[name] = np.ravel(column)
+        return cls(records)
+
+    def __flush(self):
+        """
+        move rays appended as DpfRay objects into the structured array
+
+        Returns
+        -------
+        None
+
+        """
+        if not self.__pending:
+            return
+        self.__grid_index = None
+        self.__wavelength_index = None
+        new_records = np.array(
+            [
+                (
+                    ray.coordinate_x,
+                    ray.coordinate_y,
+                    ray.coordinate_z,
+                    ray.radiation_l,
+                    ray.radiation_m,
+                    ray.radiation_n,
+                    ray.wavelength,
+                    ray.energy,
+                )
+                for ray in self.__pending
+            ],
+            dtype=ray_dtype,
+        )
+        self.__pending = []
+        if len(self.__records) == 0:
+            self.__records = new_records
+            self.__wavelength_scale = 1.0
+            self.__wavelength = None
+            return
+        records = np.empty(len(self.__records) + len(new_records), dtype=ray_dtype)
+        for name in ray_fields:
+            records[name][: len(self.__records)] = getattr(self, name)
+            records[name][len(self.__records) :] = new_records[name]
+        self.__records = records
+        self.__wavelength_scale = 1.0
+        self.__wavelength = None
+
+    @property
+    def records(self) -> np.ndarray:
+        """
+        return the underlying structured array
+        Returns:
+            structured array of rays
+        -------
+
+        """
+        self.__flush()
+        return self.__records
+
+    @property
+    def x(self) -> np.ndarray:
+        """
+        return ray cardinal_coordinate_x of all rays
+        Returns:
+            array of cardinal_coordinate_x
+        -------
+
+        """
+        return self.records["x"]
+
+    @property
+    def y(self) -> np.ndarray:
+        """
+        return ray cardinal_coordinate_y of all rays
+        Returns:
+            array of cardinal_coordinate_y
+        -------
+
+        """
+        return self.records["y"]
+
+    @property
+    def z(self) -> np.ndarray:
+        """
+        return ray cardinal_coordinate_z of all rays
+        Returns:
+            array of cardinal_coordinate_z
+        -------
+
+        """
+        return self.records["z"]
+
+    @property
+    def l(self) -> np.ndarray:  # noqa: E743
+        """
+        return ray vector_radiation_l of all rays
+        Returns:
+            array of vector_radiation_l
+        -------
+
+        """
+        return self.records["l"]
+
+    @property
+    def m(self) -> np.ndarray:
+        """
+        return ray vector_radiation_m of all rays
+        Returns:
+            array of vector_radiation_m
+        -------
+
+        """
+        return self.records["m"]
+
+    @property
+    def n(self) -> np.ndarray:
+        """
+        return ray vector_radiation_n of all rays
+        Returns:
+            array of vector_radiation_n
+        -------
+
+        """
+        return self.records["n"]
+
+    @property
+    def wavelength(self) -> np.ndarray:
+        """
+        return ray wavelength of all rays in micrometer rounded to the nanometer
+        Returns:
+            float64 array of wavelength
+        -------
+
+        """
+        records = self.records
+        if "wavelength" not in records.dtype.names:
+            return np.full(len(records), self.__wavelength, dtype=np.float64)
+        return round_like_python(records["wavelength"].astype(np.float64) * self.__wavelength_scale, 3)
+
+    @property
+    def energy(self) -> np.ndarray:
+        """
+        return ray energy of all rays
+        Returns:
+            array of energy
+        -------
+
+        """
+        return self.records["energy"]
+
+    def luminous_flux(self, power_scale=1.0):
+        """
+        compute the luminous flux carried by every ray from its energy and wavelength
+
+        Parameters
+        ----------
+        power_scale : float, optional
+            factor converting ray energy into watts, default value is 1.0
+
+        Returns
+        -------
+        numpy.ndarray
+            float64 luminous flux of all rays in lumens
+
+        """
+        return self.energy.astype(np.float64) * power_scale * photopic_conversion(self.wavelength * 1000)
+
+    def append(self, ray):
+        """
+        add a single ray to the bundle
+
+        Parameters
+        ----------
+        ray : DpfRay
+            ray to add
+
+        Returns
+        -------
+        None
+
+        """
+        self.__pending.append(ray)
+
+    def __len__(self):
+        return len(self.__records) + len(self.__pending)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            index = range(len(self))[item]
+            return next(iter(self[index : index + 1]))
+        return RayBundle(self.records[item], self.__wavelength_scale, self.__wavelength)
+
+    def check(self):
+        """
+        check wavelength, direction and energy of all rays at once
+
+        Returns
+        -------
+        dict
+            boolean mask per check: "wavelength" for wavelength <= 0, "direction" for a direction vector length
+            differing from 1 by more than 1e-3, "negative_energy" and "zero_energy"
+
+        """
+        l_dir = self.l.astype(np.float64)
+        m_dir = self.m.astype(np.float64)
+        n_dir = self.n.astype(np.float64)
+        raylen = np.sqrt(l_dir * l_dir + m_dir * m_dir + n_dir * n_dir)
+        energy = self.energy
+        return {
+            "wavelength": self.wavelength <= 0,
+            "direction": np.abs(raylen - 1) > 1e-3,
+            "negative_energy": energy < 0,
+            "zero_energy": energy == 0,
+        }
+
+    def build_index(self, spatial=True, wavelength=True, cells_per_axis=None):
+        """
+        build indexes to speed up repeated select queries
+
+        Parameters
+        ----------
+        spatial : bool, optional
+            build a uniform grid index on the ray start positions, default value is True
+        wavelength : bool, optional
+            build a sorted wavelength index, default value is True
+        cells_per_axis : int, optional
+            number of grid cells along each axis, default gives about 8 rays per cell
+
+        Returns
+        -------
+        None
+
+        """
+        if spatial:
+            self.__grid_index = RayGridIndex(self.x, self.y, self.z, cells_per_axis)
+        if wavelength:
+            self.__wavelength_index = RayWavelengthIndex(self.wavelength)
+
+    def select(self, box=None, cone=None, wl_range=None, indices=False):
+        """
+        select the rays matching all given criteria with vectorized masks
+
+        Parameters
+        ----------
+        box : tuple, optional
+            ((xmin, ymin, zmin), (xmax, ymax, zmax)) box containing the ray start position
+        cone : tuple, optional
+            (axis, half_angle) with axis a direction [x, y, z] and half_angle in degree
+        wl_range : tuple, optional
+            (minimum, maximum) wavelength in micrometer, both included
+        indices : bool, optional
+            return the ray indices instead of a RayBundle, default value is False
+
+        Returns
+        -------
+        RayBundle or numpy.ndarray
+            selected rays, a view if they are contiguous, or their sorted indices
+
+        """
+        candidates = None
+        if wl_range is not None and self.__wavelength_index is not None:
+            candidates = self.__wavelength_index.query(wl_range)
+            wl_range = None
+        if box is not None and self.__grid_index is not None:
+            box_candidates = self.__grid_index.query(box)
+            candidates = (
+                box_candidates if candidates is None else np.intersect1d(candidates, box_candidates, assume_unique=True)
+            )
+
+        def column(name):
+            values = getattr(self, name)
+            return values if candidates is None else values[candidates]
+
+        mask = np.ones(len(self) if candidates is None else len(candidates), dtype=bool)
+        if box is not None:
+            for name, lower, upper in zip(("x", "y", "z"), box[0], box[1]):
+                values = column(name)
+                mask &= (values >= lower) & (values <= upper)
+        if cone is not None:
+            axis = np.asarray(cone[0], dtype=np.float64)
+            axis = axis / np.linalg.norm(axis)
+            cosine = column("l") * axis[0] + column("m") * axis[1] + column("n") * axis[2]
+            mask &= cosine >= np.cos(np.radians(cone[1]))
+        if wl_range is not None:
+            wavelength = column("wavelength")
+            mask &= (wavelength >= wl_range[0]) & (wavelength <= wl_range[1])
+        selection = np.flatnonzero(mask) if candidates is None else candidates[mask]
+        if indices:
+            return selection
+        if len(selection) and selection[-1] - selection[0] + 1 == len(selection):
+            return self[int(selection[0]) : int(selection[-1]) + 1]
+        return self[selection]
+
+    def resample(self, rays_number, method="uniform", seed=None, position_cells=4, direction_cells=4):
+        """
+        draw a subset of rays whose total energy equals the energy of the bundle
+
+        Parameters
+        ----------
+        rays_number : int
+            number of rays of the subset
+        method : str, optional
+            "uniform" draws rays without replacement and scales their energy,
+            "energy" draws rays proportionally to their energy and gives all of them the same energy,
+            "stratified" distributes the rays over position and direction cells proportionally to the cell energy.
+            Default value is "uniform".
+        seed : int or numpy.random.Generator, optional
+            seed of the random generator
+        position_cells : int, optional
+            number of cells along each position axis for the stratified method, default value is 4
+        direction_cells : int, optional
+            number of cells along each direction axis for the stratified method, default value is 4
+
+        Returns
+        -------
+        RayBundle
+            resampled rays
+
+        """
+        rng = np.random.default_rng(seed)
+        energy = self.energy.astype(np.float64)
+        total_energy = energy.sum()
+        if rays_number <= 0 or len(self) == 0 or total_energy <= 0:
+            msg = "Resampling requires a positive number of rays and a bundle with a positive energy"
+            raise ValueError(msg)
+        if method != "energy" and rays_number > len(self):
+            msg = "Cannot draw " + str(rays_number) + " rays out of " + str(len(self)) + " without replacement"
+            raise ValueError(msg)
+        if method == "uniform":
+            selection = np.sort(rng.choice(len(self), rays_number, replace=False))
+            scale = np.full(rays_number, total_energy / energy[selection].sum())
+        elif method == "energy":
+            # systematic resampling: one random offset, then evenly spaced positions on the energy CDF
+            positions = (rng.random() + np.arange(rays_number)) / rays_number * total_energy
+            selection = np.searchsorted(np.cumsum(energy), positions, side="right")
+            selection = np.minimum(selection, len(self) - 1)
+            scale = total_energy / rays_number / energy[selection]
+        elif method == "stratified":
+            strata = self.__strata(position_cells, direction_cells)
+            strata_energy = np.bincount(strata, weights=energy)
+            strata_count = np.bincount(strata)
+            allocation = self.__allocate(rays_number, strata_energy, strata_count)
+            # random rank of each ray within its stratum
+            order = np.lexsort((rng.random(len(self)), strata))
+            stratum_start = np.concatenate(([0], np.cumsum(strata_count)[:-1]))
+            rank = np.empty(len(self), dtype=np.int64)
+            rank[order] = np.arange(len(self)) - stratum_start[strata[order]]
+            selection = np.flatnonzero(rank < allocation[strata])
+            selected_strata = strata[selection]
+            selected_energy = np.bincount(selected_strata, weights=energy[selection], minlength=len(strata_energy))
+            scale = strata_energy[selected_strata] / selected_energy[selected_strata]
+        else:
+            msg = "Resampling method " + str(method) + " is not supported"
+            raise ValueError(msg)
+        records = self[selection].to_records()
+        records["energy"] = energy[selection] * scale
+        return RayBundle(records)
+
+    def __strata(self, position_cells, direction_cells):
+        """
+        compute the position and direction cell of every ray
+
+        Parameters
+        ----------
+        position_cells : int
+            number of cells along each position axis
+        direction_cells : int
+            number of cells along each direction axis
+
+        Returns
+        -------
+        numpy.ndarray
+            stratum id of every ray
+
+        """
+        strata = np.zeros(len(self), dtype=np.int64)
+        for name in ("x", "y", "z"):
+            values = getattr(self, name).astype(np.float64)
+            extent = values.max() - values.min()
+            cells = np.floor((values - values.min()) / (extent if extent > 0 else 1) * position_cells)
+            strata = strata * position_cells + np.clip(cells, 0, position_cells - 1).astype(np.int64)
+        for name in ("l", "m", "n"):
+            cells = np.floor((getattr(self, name).astype(np.float64) + 1) / 2 * direction_cells)
+            strata = strata * direction_cells + np.clip(cells, 0, direction_cells - 1).astype(np.int64)
+        return np.unique(strata, return_inverse=True)[1].ravel()
+
+    @staticmethod
+    def __allocate(rays_number, strata_energy, strata_count):
+        """
+        distribute rays over strata proportionally to their energy with the largest remainder method
+
+        Parameters
+        ----------
+        rays_number : int
+            number of rays to distribute
+        strata_energy : numpy.ndarray
+            energy of every stratum
+        strata_count : numpy.ndarray
+            number of rays available in every stratum
+
+        Returns
+        -------
+        numpy.ndarray
+            number of rays drawn from every stratum
+
+        """
+        expected = rays_number * strata_energy / strata_energy.sum()
+        allocation = np.minimum(np.floor(expected).astype(np.int64), strata_count)
+        remaining = rays_number - allocation.sum()
+        while remaining > 0:
+            room = strata_count - allocation
+            candidates = np.flatnonzero(room > 0)
+            priority = (expected - allocation)[candidates]
+            chosen = candidates[np.argsort(-priority, kind="stable")[:remaining]]
+            allocation[chosen] += 1
+            remaining = rays_number - allocation.sum()
+        return allocation
+
+    def copy(self):
+        """
+        return a bundle owning a copy of the ray records, e.g. to transform memory mapped rays
+
+        Returns
+        -------
+        RayBundle
+
+        """
+        return RayBundle(np.array(self.records), self.__wavelength_scale, self.__wavelength)
+
+    def transform(self, matrix, chunk_size=1000000):
+        """
+        apply an affine transformation to the ray positions and directions in place
+
+        Directions are multiplied by the linear part of the matrix and renormalized.
+        Read-only records, e.g. memory mapped rays, are copied into memory first.
+
+        Parameters
+        ----------
+        matrix : array_like
+            4x4 matrix applied to column vectors, the last row must be [0, 0, 0, 1]
+        chunk_size : int, optional
+            number of rays transformed at once, default value is 1000000
+
+        Returns
+        -------
+        RayBundle
+            the bundle itself
+
+        """
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if matrix.shape != (4, 4) or not np.allclose(matrix[3], [0, 0, 0, 1]):
+            msg = "Transformation matrix must be a 4x4 affine matrix with last row [0, 0, 0, 1]"
+            raise ValueError(msg)
+        self.__apply(matrix[:3, :3], matrix[:3, 3], True, chunk_size)
+        return self
+
+    def translate(self, vector, chunk_size=1000000):
+        """
+        move the ray start positions in place
+
+        Parameters
+        ----------
+        vector : array_like
+            translation [x, y, z]
+        chunk_size : int, optional
+            number of rays translated at once, default value is 1000000
+
+        Returns
+        -------
+        RayBundle
+            the bundle itself
+
+        """
+        self.__apply(np.eye(3), np.asarray(vector, dtype=np.float64), False, chunk_size)
+        return self
+
+    def rotate(self, axis, angle, center=(0, 0, 0), chunk_size=1000000):
+        """
+        rotate the rays in place around an axis
+
+        Parameters
+        ----------
+        axis : array_like
+            rotation axis direction [x, y, z]
+        angle : float
+            rotation angle in degree, counterclockwise when looking against the axis
+        center : array_like, optional
+            point on the rotation axis, default value is (0, 0, 0)
+        chunk_size : int, optional
+            number of rays rotated at once, default value is 1000000
+
+        Returns
+        -------
+        RayBundle
+            the bundle itself
+
+        """
+        self.__apply(*rotation(axis, angle, center), True, chunk_size)
+        return self
+
+    def scale_units(self, source_unit="mm", target_unit="m", chunk_size=1000000):
+        """
+        convert the ray start positions to another length unit in place, directions are unchanged
+
+        Parameters
+        ----------
+        source_unit : str, optional
+            current unit of the positions, one of length_units, default value is "mm"
+        target_unit : str, optional
+            new unit of the positions, one of length_units, default value is "m"
+        chunk_size : int, optional
+            number of rays converted at once, default value is 1000000
+
+        Returns
+        -------
+        RayBundle
+            the bundle itself
+
+        """
+        for unit in (source_unit, target_unit):
+            if unit not in length_units:
+                msg = "Unit " + str(unit) + " not supported, use one of " + ", ".join(length_units)
+                raise ValueError(msg)
+        factor = length_units[source_unit] / length_units[target_unit]
+        self.__apply(np.eye(3) * factor, np.zeros(3), False, chunk_size)
+        return self
+
+    def __apply(self, linear, translation, directions, chunk_size):
+        """
+        apply positions @ linear.T + translation, and directions @ linear.T renormalized, chunk by chunk
+
+        Parameters
+        ----------
+        linear : numpy.ndarray
+            3x3 matrix
+        translation : numpy.ndarray
+            translation vector
+        directions : bool
+            also transform the directions
+        chunk_size : int
+            number of rays transformed at once
+
+        Returns
+        -------
+        None
+
+        """
+        records = self.records
+        if not records.flags.writeable:
+            records = self.__records = np.array(records)
+        self.__grid_index = None
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start : start + chunk_size]
+            positions = np.column_stack((chunk["x"], chunk["y"], chunk["z"])).astype(np.float64)
+            positions = positions @ linear.T + translation
+            for axis, name in enumerate(("x", "y", "z")):
+                chunk[name] = positions[:, axis]
+            if directions:
+                vectors = np.column_stack((chunk["l"], chunk["m"], chunk["n"])).astype(np.float64) @ linear.T
+                norm = np.linalg.norm(vectors, axis=1)
+                norm[norm == 0] = 1
+                vectors /= norm[:, None]
+                for axis, name in enumerate(("l", "m", "n")):
+                    chunk[name] = vectors[:, axis]
+
+    def to_records(self, dtype=ray_dtype, wavelength_factor=1.0):
+        """
+        return the rays in the record layout of a rayfile format
+
+        Parameters
+        ----------
+        dtype : numpy.dtype, optional
+            record layout of the output, e.g. speos_ray_dtype or zemax_spectral_ray_dtype
+        wavelength_factor : float, optional
+            factor applied to the wavelength in micrometer, e.g. 1000 for Speos nanometer values
+
+        Returns
+        -------
+        numpy.ndarray
+            structured array of the given dtype
+
+        """
+        records = np.empty(len(self), dtype=dtype)
+        for name in dtype.names:
+            if name == "wavelength":
+                records[name] = self.wavelength * wavelength_factor
+            else:
+                records[name] = getattr(self, name)
+        return records
+
+    def tofile(self, file, dtype=ray_dtype, wavelength_factor=1.0, chunk_size=1000000):
+        """
+        write the rays to an open binary file in the record layout of a rayfile format
+
+        Parameters
+        ----------
+        file : file object
+            file opened in binary write mode
+        dtype : numpy.dtype, optional
+            record layout of the output, e.g. speos_ray_dtype or zemax_spectral_ray_dtype
+        wavelength_factor : float, optional
+            factor applied to the wavelength in micrometer, e.g. 1000 for Speos nanometer values
+        chunk_size : int, optional
+            number of rays converted and written at once, default value is 1000000
+
+        Returns
+        -------
+        None
+
+        """
+        for start in range(0, len(self), chunk_size):
+            self[start : start + chunk_size].to_records(dtype, wavelength_factor).tofile(file)
+
+    def iter_chunks(self, chunk_size=1000000):
+        """
+        iterate over the rays in consecutive views of chunk_size rays
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            number of rays per chunk, default value is 1000000
+
+        Returns
+        -------
+        generator of RayBundle
+
+        """
+        if chunk_size <= 0:
+            msg = "chunk_size must be a positive integer"
+            raise ValueError(msg)
+        for start in range(0, len(self), chunk_size):
+            yield self[start : start + chunk_size]
+
+    def __iter__(self):
+        for chunk in self.iter_chunks(65536):
+            columns = [getattr(chunk, name).tolist() for name in ray_fields]
+            for values in zip(*columns):
+                yield DpfRay(*values)
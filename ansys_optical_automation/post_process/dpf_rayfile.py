@@ -1,293 +1,612 @@
-import math
 import os
 import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 from ansys_optical_automation.post_process.dpf_base import DataProcessingFramework
+from ansys_optical_automation.post_process.dpf_cache import cached_load
+from ansys_optical_automation.post_process.dpf_ray_bundle import DpfRay  # noqa: F401
+from ansys_optical_automation.post_process.dpf_ray_bundle import RayBundle
+from ansys_optical_automation.post_process.dpf_ray_bundle import (  # noqa: F401
+    length_units,
+)
+from ansys_optical_automation.post_process.dpf_ray_bundle import photopic_conversion
+from ansys_optical_automation.post_process.dpf_ray_bundle import ray_dtype  # noqa: F401
+from ansys_optical_automation.post_process.dpf_ray_bundle import (  # noqa: F401
+    ray_fields,
+)
+from ansys_optical_automation.post_process.dpf_ray_bundle import rotation  # noqa: F401
+from ansys_optical_automation.post_process.dpf_ray_bundle import (  # noqa: F401
+    transformation_matrix,
+)
+from ansys_optical_automation.post_process.dpf_rayfile_writer import (  # noqa: F401
+    RayfileWriter,
+)
+from ansys_optical_automation.post_process.dpf_rayfile_writer import pack_speos_header
+from ansys_optical_automation.post_process.dpf_rayfile_writer import pack_zemax_header
+from ansys_optical_automation.post_process.dpf_rayfile_writer import (  # noqa: F401
+    speos_header_format,
+)
+from ansys_optical_automation.post_process.dpf_rayfile_writer import speos_ray_dtype
+from ansys_optical_automation.post_process.dpf_rayfile_writer import (
+    zemax_flux_ray_dtype,
+)
+from ansys_optical_automation.post_process.dpf_rayfile_writer import (  # noqa: F401
+    zemax_header_format,
+)
+from ansys_optical_automation.post_process.dpf_rayfile_writer import zemax_identifier
+from ansys_optical_automation.post_process.dpf_rayfile_writer import (
+    zemax_spectral_ray_dtype,
+)
+
+
+def sniff_rayfile_format(file_path):
+    """
+    detect the rayfile format from the header magic and the file extension without reading the ray body
+
+    Parameters
+    ----------
+    file_path : str
+        path to the rayfile
+
+    Returns
+    -------
+    str
+        "zemax" if the file starts with the Zemax identifier or has a .sdf/.dat extension,
+        "speos" for other .ray files, None otherwise
 
-Photopic_Conversion_wavelength = [
-    380,
-    390,
-    400,
-    410,
-    420,
-    430,
-    440,
-    450,
-    460,
-    470,
-    480,
-    490,
-    500,
-    507,
-    510,
-    520,
-    530,
-    540,
-    550,
-    555,
-    560,
-    570,
-    580,
-    590,
-    600,
-    610,
-    620,
-    630,
-    640,
-    650,
-    660,
-    670,
-    680,
-    690,
-    700,
-    710,
-    720,
-    730,
-    740,
-    750,
-    760,
-    770,
-]
-Photopic_Conversion_value = [
-    0.027,
-    0.082,
-    0.27,
-    0.826,
-    2.732,
-    7.923,
-    15.709,
-    25.954,
-    40.98,
-    62.139,
-    94.951,
-    142.078,
-    220.609,
-    303.464,
-    303.464,
-    484.93,
-    588.746,
-    651.582,
-    679.551,
-    683,
-    679.585,
-    650.216,
-    594.21,
-    517.031,
-    430.973,
-    343.549,
-    260.223,
-    180.995,
-    119.525,
-    73.081,
-    41.663,
-    21.856,
-    11.611,
-    5.607,
-    2.802,
-    1.428,
-    0.715,
-    0.355,
-    0.17,
-    0.082,
-    0.041,
-    0.02,
-]
-
-
-class DpfRay:
     """
-    this class defines the ray property
+    with open(file_path, "rb") as rayfile:
+        magic = rayfile.read(4)
+    if len(magic) == 4 and int.from_bytes(magic, byteorder="little") == zemax_identifier:
+        return "zemax"
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".ray":
+        return "speos"
+    if extension in (".dat", ".sdf"):
+        return "zemax"
+    return None
+
+
+class RayValidationReport:
     """
+    this class summarizes the checks of the rays of a rayfile
+    """
+
+    checks = ("wavelength", "direction", "negative_energy", "zero_energy")
+    errors = ("wavelength", "direction", "negative_energy")
+    descriptions = {
+        "wavelength": "wavelength <= 0",
+        "direction": "unusual direction vector length",
+        "negative_energy": "power < 0",
+        "zero_energy": "0 flux",
+    }
+
+    def __init__(self):
+        self.rays_number = 0
+        self.invalid_number = 0
+        self.counts = dict.fromkeys(self.checks, 0)
+        self.first_indices = dict.fromkeys(self.checks)
 
-    def __init__(self, x, y, z, l_dir, m_dir, n_dir, wavelength, e):
-        self.__cardinal_coordinate_x = x
-        self.__cardinal_coordinate_y = y
-        self.__cardinal_coordinate_Z = z
-        self.__vector_radiation_l = l_dir
-        self.__vector_radiation_m = m_dir
-        self.__vector_radiation_n = n_dir
-        self.__ray_wavelength = wavelength
-        self.__ray_energy = e
+    def add(self, masks, first_index=0):
+        """
+        add the result of RayBundle.check to the report
+
+        Parameters
+        ----------
+        masks : dict
+            boolean mask per check
+        first_index : int, optional
+            index of the first checked ray within the file
+
+        Returns
+        -------
+        numpy.ndarray
+            mask of the rays failing one of the error checks
+
+        """
+        invalid = np.zeros(len(masks["zero_energy"]), dtype=bool)
+        for check in self.checks:
+            indices = np.flatnonzero(masks[check])
+            if indices.size:
+                self.counts[check] += int(indices.size)
+                if self.first_indices[check] is None:
+                    self.first_indices[check] = first_index + int(indices[0])
+                if check in self.errors:
+                    invalid |= masks[check]
+        self.rays_number += len(invalid)
+        self.invalid_number += int(np.count_nonzero(invalid))
+        return invalid
 
     @property
-    def coordinate_x(self) -> float:
+    def is_valid(self) -> bool:
         """
-        return ray cardinal_coordinate_x
+        return if no ray failed a wavelength, direction or energy check
         Returns:
-            cardinal_coordinate_x
+            True if all rays are valid
         -------
 
         """
-        return self.__cardinal_coordinate_x
+        return self.invalid_number == 0
 
-    @property
-    def coordinate_y(self) -> float:
+    def __str__(self):
+        lines = [str(self.rays_number) + " rays checked, " + str(self.invalid_number) + " invalid"]
+        for check in self.checks:
+            if self.counts[check]:
+                lines.append(
+                    str(self.counts[check])
+                    + " rays with "
+                    + self.descriptions[check]
+                    + " (first at index "
+                    + str(self.first_indices[check])
+                    + ")"
+                )
+        return "\n".join(lines)
+
+
+class DpfRayfile(DataProcessingFramework):
+    """
+    this class contains method to read extract ray data from given binary rayfile
+    """
+
+    conversion_extension = {".ray": ".sdf", ".dat": ".ray", ".sdf": ".ray"}
+
+    def __init__(self, file_path, mmap=False, strict=True, header_only=False, cache=None, workers=1):
         """
-        return ray cardinal_coordinate_y
-        Returns:
-            cardinal_coordinate_y
-        -------
+        Parameters
+        ----------
+        file_path : str
+            path to the rayfile to load, None to create an empty rayfile
+        mmap : bool, optional
+            memory map the ray body read-only instead of reading it, default value is False.
+            The rays are then neither validated nor filtered on load.
+        strict : bool, optional
+            raise an error if rays with invalid wavelength, direction or energy are found, default value is True.
+            If False, these rays are removed and reported in validation_report.
+        header_only : bool, optional
+            only read the header on load, default value is False.
+            The rays are loaded on first access of the rays property.
+        cache : ArrayCache, optional
+            cache of the validated rays, reloaded memory mapped while the rayfile is unchanged. Default is None.
+        workers : int, optional
+            number of threads reading and validating record aligned ranges of the ray body, default value is 1.
+            See load_timings for the time spent in every step.
+        """
+        DataProcessingFramework.__init__(self, extension=list(self.conversion_extension.keys()))
+        self.__ray_numb = 0
+        self.__watt_value = 0
+        self.__lumen_value = 0
+        self.__rays = RayBundle()
+        self.__mmap = mmap
+        self.__strict = strict
+        self.__header_only = header_only
+        self.__cache = cache
+        self.__workers = workers
+        self.__load_timings = {}
+        self.__validation_report = RayValidationReport()
+        self.__body_offset = 0
+        self.__body_dtype = speos_ray_dtype
+        self.__wavelength_scale = 0.001
+        self.__wavelength = None
+        self.identifier = 0
+        self.description = "description"
+        self.source_flux = 0
+        self.ray_format_type = None
+        self.flux_type = None
+        if file_path is not None:
+            self.open_file(file_path)
+            self.__binary = self.__is_binary()
+            self.load_content()
+
+    def __is_binary(self):
+        """this method checks if a file is binary by looking for a NUL byte in its first block
 
+        Returns
+        -------
+        Boolean
         """
-        return self.__cardinal_coordinate_y
+        with open(self.file_path, "rb") as f:
+            return b"\0" in f.read(4096)
 
-    @property
-    def coordinate_z(self) -> float:
+    def set_ray_count(self, raynumber):
         """
-        return ray cardinal_coordinate_z
-        Returns:
-            cardinal_coordinate_z
+        redfine raynumber
+        Parameters
+        ----------
+        raynumber : int
+
+        Returns
         -------
 
+
         """
-        return self.__cardinal_coordinate_Z
+        self.__ray_numb = raynumber
 
-    @property
-    def radiation_l(self) -> float:
+    def __set_body_layout(self, dtype, wavelength_scale=1.0, wavelength=None):
         """
-        return ray vector_radiation_l
-        Returns:
-            vector_radiation_l
+        store the layout of the ray body starting at the current file position
+
+        Parameters
+        ----------
+        dtype : numpy.dtype
+            record layout of one ray in the file
+        wavelength_scale : float, optional
+            factor converting the stored wavelength into micrometer
+        wavelength : float, optional
+            wavelength in micrometer for formats without per ray wavelength
+
+        Returns
         -------
+        None
 
         """
-        return self.__vector_radiation_l
+        self.__body_offset = self.dpf_instance.tell()
+        self.__body_dtype = dtype
+        self.__wavelength_scale = wavelength_scale
+        self.__wavelength = wavelength
 
-    @property
-    def radiation_m(self) -> float:
+    def __load_rays(self):
         """
-        return ray vector_radiation_m
-        Returns:
-            vector_radiation_m
+        read the ray body with a single numpy call, or memory map it
+
+        Returns
         -------
+        None
 
         """
-        return self.__vector_radiation_m
+        if self.__mmap and self.__ray_numb > 0:
+            records = np.memmap(
+                self.file_path, dtype=self.__body_dtype, mode="r", offset=self.__body_offset, shape=(self.__ray_numb,)
+            )
+            self.__rays = RayBundle(records, self.__wavelength_scale, self.__wavelength)
+        else:
+            content, cached = cached_load(self.__cache, self.file_path, "rayfile", self.__read_rays)
+            self.__validation_report = RayValidationReport()
+            vars(self.__validation_report).update(content["report"])
+            if cached and self.__strict and not self.__validation_report.is_valid:
+                msg = "Error: rayfile contains invalid rays\n" + str(self.__validation_report)
+                raise ValueError(msg)
+            self.__rays = RayBundle(content["records"], self.__wavelength_scale, self.__wavelength)
+            self.__ray_numb = len(self.__rays)
+            self.__print_removed_rays()
+            if self.__lumen_value is None:
+                self.__lumen_value = content["photometric_power"]
 
-    @property
-    def radiation_n(self) -> float:
+    def __read_rays(self):
         """
-        return ray vector_radiation_n
-        Returns:
-            vector_radiation_n
+        read the ray body with a single numpy call and validate it
+
+        Returns
+        -------
+        dict
+            valid ray records, validation report values and photometric power of spectral files
+
+        """
+        if self.__workers > 1:
+            return self.__read_rays_parallel()
+        start_time = time.perf_counter()
+        with open(self.file_path, "rb") as rayfile:
+            rayfile.seek(self.__body_offset)
+            records = np.fromfile(rayfile, dtype=self.__body_dtype, count=self.__ray_numb)
+        self.__validation_report = RayValidationReport()
+        rays = self.__validate_rays(RayBundle(records, self.__wavelength_scale, self.__wavelength))
+        photometric_power = self.__lumen_value
+        if photometric_power is None:
+            photometric_power = self.__spectral_photometric_power(
+                np.sum(rays.energy, dtype=np.float64), np.sum(rays.luminous_flux())
+            )
+        seconds = time.perf_counter() - start_time
+        self.__load_timings = {"workers": 1, "ranges": 1, "decode": seconds, "busy": seconds, "compact": 0.0}
+        self.__load_timings["total"] = seconds
+        return {
+            "records": rays.records,
+            "report": vars(self.__validation_report),
+            "photometric_power": photometric_power,
+        }
+
+    def __read_rays_parallel(self):
+        """
+        read and validate the ray body in record aligned ranges with a thread pool
+
+        Every thread reads its range straight into a preallocated array and checks it with numpy, which releases
+        the GIL during file reads and array operations. Rays without flux or invalid are then removed by copying
+        the kept rays of every range to their offset in the output array.
+
+        Returns
         -------
+        dict
+            valid ray records, validation report values and photometric power of spectral files
+
+        """
+        start_time = time.perf_counter()
+        itemsize = self.__body_dtype.itemsize
+        body_size = os.path.getsize(self.file_path) - self.__body_offset
+        rays_number = max(min(self.__ray_numb, body_size // itemsize), 0)
+        records = np.empty(rays_number, dtype=self.__body_dtype)
+        # several ranges per worker balance the load when some ranges hold many invalid rays
+        range_size = max(-(-rays_number // (self.__workers * 4)), 1)
+        bounds = [(start, min(start + range_size, rays_number)) for start in range(0, rays_number, range_size)]
+        spectral = self.__lumen_value is None
+
+        def decode(start, stop):
+            range_start_time = time.perf_counter()
+            with open(self.file_path, "rb") as rayfile:
+                rayfile.seek(self.__body_offset + start * itemsize)
+                rayfile.readinto(records[start:stop].view(np.uint8))
+            bundle = RayBundle(records[start:stop], self.__wavelength_scale, self.__wavelength)
+            masks = bundle.check()
+            kept = ~(masks["zero_energy"] | masks["wavelength"] | masks["direction"] | masks["negative_energy"])
+            energy = np.sum(bundle.energy[kept], dtype=np.float64) if spectral else 0.0
+            luminous_flux = np.sum(bundle.luminous_flux()[kept]) if spectral else 0.0
+            return masks, kept, energy, luminous_flux, time.perf_counter() - range_start_time
+
+        with ThreadPoolExecutor(max_workers=self.__workers) as pool:
+            results = list(pool.map(lambda bound: decode(*bound), bounds))
+            decode_time = time.perf_counter()
+            self.__validation_report = RayValidationReport()
+            for (start, _), result in zip(bounds, results):
+                self.__validation_report.add(result[0], start)
+            if self.__strict and not self.__validation_report.is_valid:
+                msg = "Error: rayfile contains invalid rays\n" + str(self.__validation_report)
+                raise ValueError(msg)
+            kept_numbers = [int(np.count_nonzero(result[1])) for result in results]
+            if sum(kept_numbers) < rays_number:
+                valid_records = np.empty(sum(kept_numbers), dtype=self.__body_dtype)
+                offsets = np.cumsum([0] + kept_numbers)
+
+                def compact(index):
+                    start, stop = bounds[index]
+                    valid_records[offsets[index] : offsets[index + 1]] = records[start:stop][results[index][1]]
+
+                list(pool.map(compact, range(len(bounds))))
+                records = valid_records
+        photometric_power = self.__lumen_value
+        if spectral:
+            photometric_power = self.__spectral_photometric_power(
+                sum(result[2] for result in results), sum(result[3] for result in results)
+            )
+        end_time = time.perf_counter()
+        self.__load_timings = {
+            "workers": self.__workers,
+            "ranges": len(bounds),
+            "decode": decode_time - start_time,
+            "busy": sum(result[4] for result in results),
+            "compact": end_time - decode_time,
+            "total": end_time - start_time,
+        }
+        return {
+            "records": records,
+            "report": vars(self.__validation_report),
+            "photometric_power": photometric_power,
+        }
+
+    def __spectral_photometric_power(self, energy, luminous_flux):
+        """
+        derive the photometric power of a spectral rayfile from the radiometric power and the ray spectrum
+
+        Parameters
+        ----------
+        energy : float
+            sum of the ray energies
+        luminous_flux : float
+            sum of the ray energies weighted by the luminous efficacy of their wavelength
+
+        Returns
+        -------
+        float
+            photometric power in lumens
 
         """
-        return self.__vector_radiation_n
+        return float(self.__watt_value * luminous_flux / energy) if energy > 0 else 0.0
 
-    @property
-    def wavelength(self) -> float:
+    def __len__(self):
+        return len(self.__rays) if self.__rays is not None else self.__ray_numb
+
+    def __getitem__(self, item):
         """
-        return ray wavelength
-        Returns:
-            wavelength
-        -------
+        return a ray or a range of rays, read from the file without loading the other rays if they are not loaded
 
+        Once the rays are loaded, the loaded rays are indexed. Otherwise the file offsets are computed from the
+        record size and the rays are read as stored, without validation.
         """
-        return self.__ray_wavelength
+        if self.__rays is not None:
+            return self.__rays[item]
+        indices = range(self.__ray_numb)[item]
+        if isinstance(indices, int):
+            return next(iter(self.read_range(indices, indices + 1)))
+        if len(indices) == 0:
+            return self.read_range(0, 0)
+        if indices.step > 0:
+            return self.read_range(indices[0], indices[-1] + 1, indices.step)
+        return self.read_range(indices[-1], indices[0] + 1, -indices.step)[::-1]
 
-    @property
-    def energy(self) -> float:
+    def read_range(self, start, stop, step=1):
         """
-        return ray energy
-        Returns:
-            energy
+        read the rays start to stop of the file, only this byte range of the body is read
+
+        Parameters
+        ----------
+        start : int
+            index of the first ray
+        stop : int
+            index after the last ray
+        step : int, optional
+            read every step-th ray, default value is 1
+
+        Returns
         -------
+        RayBundle
+            rays as stored in the file, without validation
+
+        """
+        start = max(start, 0)
+        stop = min(stop, self.__ray_numb)
+        count = max(stop - start, 0)
+        offset = self.__body_offset + start * self.__body_dtype.itemsize
+        if count == 0:
+            records = np.empty(0, dtype=self.__body_dtype)
+        elif step == 1:
+            with open(self.file_path, "rb") as rayfile:
+                rayfile.seek(offset)
+                records = np.fromfile(rayfile, dtype=self.__body_dtype, count=count)
+        else:
+            # only the pages holding the requested records are read
+            body = np.memmap(self.file_path, dtype=self.__body_dtype, mode="r", offset=offset, shape=(count,))
+            records = np.array(body[::step])
+            del body
+        return RayBundle(records, self.__wavelength_scale, self.__wavelength)
 
+    def iter_chunks(self, chunk_size=1000000):
         """
-        return self.__ray_energy
+        iterate over the rays in chunks of chunk_size rays, read range by range from the file if not loaded
 
+        Unlike read_chunks, the rays are not validated so every chunk matches the same record range of the file.
 
-class DpfRayfile(DataProcessingFramework):
-    """
-    this class contains method to read extract ray data from given binary rayfile
-    """
+        Parameters
+        ----------
+        chunk_size : int, optional
+            number of rays per chunk, default value is 1000000
 
-    conversion_extension = {".ray": ".sdf", ".dat": ".ray", ".sdf": ".ray"}
+        Returns
+        -------
+        generator of RayBundle
 
-    def __init__(self, file_path):
-        DataProcessingFramework.__init__(self, extension=list(self.conversion_extension.keys()))
-        self.__ray_numb = 0
-        self.__watt_value = 0
-        self.__lumen_value = 0
-        self.__rays = []
-        self.identifier = 0
-        self.description = "description"
-        self.source_flux = 0
-        if file_path is not None:
-            self.open_file(file_path)
-            self.__binary = self.__is_binary()
-            self.load_content()
+        """
+        if self.__rays is not None:
+            yield from self.__rays.iter_chunks(chunk_size)
+            return
+        if chunk_size <= 0:
+            msg = "chunk_size must be a positive integer"
+            raise ValueError(msg)
+        for start in range(0, self.__ray_numb, chunk_size):
+            yield self.read_range(start, start + chunk_size)
 
-    def __is_binary(self):
-        """this method checks if a file is binary
+    def read_chunks(self, chunk_size=1000000):
+        """
+        read the rays of the rayfile chunk by chunk directly from disk
+
+        The next chunk is read in a background thread while the current one is processed.
+        Every chunk is validated and rays without flux are removed, the memory used is bounded by the chunk size.
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            number of rays read at once, default value is 1000000
 
         Returns
         -------
-        Boolean
+        generator of RayBundle
+
+        """
+        if chunk_size <= 0:
+            msg = "chunk_size must be a positive integer"
+            raise ValueError(msg)
+        body_size = os.path.getsize(self.file_path) - self.__body_offset
+        remaining = body_size // self.__body_dtype.itemsize
+        first_index = 0
+        energy = 0.0
+        luminous_flux = 0.0
+        self.__validation_report = RayValidationReport()
+        with open(self.file_path, "rb") as rayfile, ThreadPoolExecutor(max_workers=1) as reader:
+            rayfile.seek(self.__body_offset)
+            next_chunk = reader.submit(np.fromfile, rayfile, self.__body_dtype, min(chunk_size, remaining))
+            while remaining > 0:
+                records = next_chunk.result()
+                if len(records) == 0:
+                    break
+                remaining -= len(records)
+                if remaining > 0:
+                    next_chunk = reader.submit(np.fromfile, rayfile, self.__body_dtype, min(chunk_size, remaining))
+                bundle = self.__validate_rays(
+                    RayBundle(records, self.__wavelength_scale, self.__wavelength), first_index
+                )
+                if self.__lumen_value is None:
+                    energy += np.sum(bundle.energy, dtype=np.float64)
+                    luminous_flux += np.sum(bundle.luminous_flux())
+                yield bundle
+                first_index += len(records)
+        self.__print_removed_rays()
+        if self.__lumen_value is None and first_index > 0:
+            self.__lumen_value = self.__spectral_photometric_power(energy, luminous_flux)
+
+    def validate(self, chunk_size=1000000):
         """
-        with open(self.file_path, "rb") as f:
-            for block in f:
-                if b"\0" in block:
-                    f.close()
-                    return True
-            f.close()
-        return False
+        check wavelength, direction and energy of the current rays without removing any
 
-    def __photopic_conversion(self, wavelength):
-        """This method computes photopic to Radiometric conversion factor at the given wavelength
+        This is useful for memory mapped rayfiles which are not validated on load.
 
         Parameters
         ----------
-        wavelength : int
-            wavelength in nm
-        """
-        start = 0
-        end = len(Photopic_Conversion_wavelength)
-        pos = 0
-        while start < end:
-            mid = (start + end) // 2
-            # print(mid, Photopic_Conversion_wavelength[mid])
-            if Photopic_Conversion_wavelength[mid] == wavelength:
-                pos = mid
-                break
-            if Photopic_Conversion_wavelength[mid] > wavelength:
-                end = mid
-            else:
-                start = mid + 1
-        pos = pos if pos != 0 else start
+        chunk_size : int, optional
+            number of rays checked at once, default value is 1000000
 
-        start_wave = Photopic_Conversion_wavelength[pos]
-        end_wave = Photopic_Conversion_wavelength[pos + 1]
-        start_photopic = Photopic_Conversion_value[pos]
-        end_photopic = Photopic_Conversion_value[pos + 1]
-        return ((wavelength - start_wave) / (end_wave - start_wave)) * (end_photopic - start_photopic) + start_photopic
+        Returns
+        -------
+        RayValidationReport
+            summary with counts and first index of the rays failing each check
 
-    def set_ray_count(self, raynumber):
         """
-        redfine raynumber
+        report = RayValidationReport()
+        rays = self.rays
+        for start in range(0, len(rays), chunk_size):
+            report.add(rays[start : start + chunk_size].check(), start)
+        return report
+
+    def __print_removed_rays(self):
+        """
+        print a summary of the rays removed during validation
+
+        Returns
+        -------
+        None
+
+        """
+        report = self.__validation_report
+        if report.counts["zero_energy"] or report.invalid_number:
+            print("Rays were removed from data:\n" + str(report))
+
+    def __validate_rays(self, bundle, first_index=0):
+        """
+        check wavelength, direction and energy of all rays and remove rays without flux
+
+        In strict mode an error summarizing all invalid rays is raised, otherwise invalid rays are removed.
+
         Parameters
         ----------
-        raynumber : int
+        bundle : RayBundle
+            rays read from the file
+        first_index : int, optional
+            index of the first ray of the bundle within the file, used for the report
 
         Returns
         -------
-
+        RayBundle
+            valid rays with a positive energy
 
         """
-        self.__ray_numb = raynumber
+        masks = bundle.check()
+        invalid = self.__validation_report.add(masks, first_index)
+        if self.__strict and invalid.any():
+            msg = "Error: rayfile contains invalid rays\n" + str(self.__validation_report)
+            raise ValueError(msg)
+        removed = masks["zero_energy"] | invalid
+        if removed.any():
+            bundle = bundle[~removed]
+        return bundle
 
     def load_content(self):
         """
-        this method load the information from rayfile provided
+        this method load the information from rayfile provided, only the header in header_only mode
 
         Returns
         -------
 
 
         """
-        rayfile_type = self.file_path.lower().split(".")[-1]
-        if rayfile_type == "ray":
+        rayfile_format = sniff_rayfile_format(self.file_path)
+        if rayfile_format == "speos":
             content_size = os.fstat(self.dpf_instance.fileno()).st_size - 28
             if content_size % 32 != 0:
                 msg = "Provided rayfile is not generated from speos"
@@ -297,32 +616,9 @@ class DpfRayfile(DataProcessingFramework):
             self.__watt_value = struct.unpack("f", self.dpf_instance.read(4))[0]
             self.dpf_instance.read(4 * 5)
             self.__lumen_value = struct.unpack("f", self.dpf_instance.read(4))[0]
-            for ray_idx in range(self.__ray_numb):
-                x = struct.unpack("f", self.dpf_instance.read(4))[0]
-                y = struct.unpack("f", self.dpf_instance.read(4))[0]
-                z = struct.unpack("f", self.dpf_instance.read(4))[0]
-                l_dir = struct.unpack("f", self.dpf_instance.read(4))[0]
-                m_dir = struct.unpack("f", self.dpf_instance.read(4))[0]
-                n_dir = struct.unpack("f", self.dpf_instance.read(4))[0]
-                wav = round(struct.unpack("f", self.dpf_instance.read(4))[0] * 0.001, 3)
-                e = struct.unpack("f", self.dpf_instance.read(4))[0]
-                if wav <= 0:
-                    msg = "Error: ray wavelength of ray of " + str(ray_idx) + "cannot be <= 0"
-                    raise ValueError(msg)
-                raylen = math.sqrt(l_dir * l_dir + m_dir * m_dir + n_dir * n_dir)
-                if abs(raylen - 1) > 1e-3:
-                    msg = "Error: Vector length of " + str(ray_idx) + "the ray is unusual (" + str(raylen) + ")"
-                    raise ValueError(msg)
-                if e < 0:
-                    msg = "Error: ray power of " + str(m_dir) + "th ray is < 0"
-                    raise ValueError(msg)
-                elif e == 0:
-                    print("The " + str(ray_idx) + " th ray has 0 flux! \n This Ray was removed from data")
-                    self.__ray_numb -= 1
-                else:
-                    self.__rays.append(DpfRay(x, y, z, l_dir, m_dir, n_dir, wav, e))
+            self.__set_body_layout(speos_ray_dtype, wavelength_scale=0.001)
             self.dpf_instance.close()
-        elif (rayfile_type == "dat" or rayfile_type == "sdf") and self.__binary:
+        elif rayfile_format == "zemax" and self.__binary:
             self.identifier = int.from_bytes(
                 self.dpf_instance.read(4), byteorder="little"
             )  # Format version ID, current value is 1010
@@ -353,16 +649,16 @@ class DpfRayfile(DataProcessingFramework):
                     msg = "Warning: Zemax file may be wrong format. File size does not match ray numbers said in header"
                     raise ValueError(msg)
                 wavelength = wavelength if wavelength != 0 else 0.550
-                photopic_conversion = self.__photopic_conversion(wavelength * 1000)
+                luminous_efficacy = float(photopic_conversion(wavelength * 1000))
                 # float(input(
                 #     'You can find a luminous efficacy table here: '
                 #     'http://hyperphysics.phy-astr.gsu.edu/hbase/vision/efficacy.html '
                 #     'Please enter the Photopic Conversion value for this wavelength, 683 for wavelength at 550nm: '))
                 if flux_type == 0:
                     self.__watt_value = ray_set_flux
-                    self.__lumen_value = ray_set_flux * photopic_conversion
+                    self.__lumen_value = ray_set_flux * luminous_efficacy
                 elif flux_type == 1:
-                    self.__watt_value = ray_set_flux / photopic_conversion
+                    self.__watt_value = ray_set_flux / luminous_efficacy
                     self.__lumen_value = ray_set_flux
                 else:
                     msg = "flux_type is in wrong format"
@@ -372,37 +668,18 @@ class DpfRayfile(DataProcessingFramework):
                     msg = "Zemax file may be wrong format. File size does not match ray numbers said in header."
                     raise TypeError(msg)
                 self.__watt_value = ray_set_flux
+                # computed from the ray spectrum when the rays are read
+                self.__lumen_value = None
             else:
                 msg = "ray_format_type " + str(ray_format_type) + " is in wrong format"
                 raise TypeError(msg)
 
-            for ray_idx in range(self.__ray_numb):
-                x = struct.unpack("f", self.dpf_instance.read(4))[0]
-                y = struct.unpack("f", self.dpf_instance.read(4))[0]
-                z = struct.unpack("f", self.dpf_instance.read(4))[0]
-                l_dir = struct.unpack("f", self.dpf_instance.read(4))[0]
-                m_dir = struct.unpack("f", self.dpf_instance.read(4))[0]
-                n_dir = struct.unpack("f", self.dpf_instance.read(4))[0]
-                wav = wavelength if wavelength != 0 else 550
-                e = struct.unpack("f", self.dpf_instance.read(4))[0]
-                if ray_format_type == 2:
-                    wav = round(struct.unpack("f", self.dpf_instance.read(4))[0], 3)
-                if wav <= 0:
-                    msg = "Error: ray wavelength cannot be <= 0"
-                    raise ValueError(msg)
-                raylen = math.sqrt(l_dir * l_dir + m_dir * m_dir + n_dir * n_dir)
-                if abs(raylen - 1) > 1e-3:
-                    msg = "Error: Vector length of " + str(m_dir) + "th ray is unusual (" + str(raylen) + ")"
-                    raise ValueError(msg)
-                # Check ray energy:
-                if e < 0:
-                    msg = "Error: ray power of " + str(m_dir) + "th ray is < 0"
-                    raise ValueError(msg)
-                elif e == 0:
-                    print("The " + str(ray_idx) + " the ray has 0 flux! \n This Ray was removed from data")
-                    self.__ray_number -= 1
-                else:
-                    self.__rays.append(DpfRay(x, y, z, l_dir, m_dir, n_dir, wav, e))
+            if ray_format_type == 0:
+                self.__set_body_layout(zemax_flux_ray_dtype, wavelength=wavelength)
+            else:
+                self.__set_body_layout(zemax_spectral_ray_dtype)
+            self.ray_format_type = ray_format_type
+            self.flux_type = flux_type
             self.dpf_instance.close()
         else:
             if not self.__binary:
@@ -416,6 +693,23 @@ class DpfRayfile(DataProcessingFramework):
                     + "For Speos rayfile you can try to open the file with the RayfileEditor and save the file"
                 )
                 raise TypeError(msg)
+        if self.__header_only:
+            self.__rays = None
+        else:
+            self.__load_rays()
+
+    def close(self):
+        """
+        close the rayfile and release a memory mapped ray body
+
+        Returns
+        -------
+        None
+
+        """
+        if self.__mmap:
+            self.__rays = RayBundle()
+        DataProcessingFramework.close(self)
 
     @property
     def radiometric_power(self) -> float:
@@ -431,14 +725,43 @@ class DpfRayfile(DataProcessingFramework):
     @property
     def photometric_power(self) -> float:
         """
-        this method return Photometric Power value
+        this method return Photometric Power value, computed from the ray spectrum for spectral zemax files
         Returns:
             Photometric Power value
         -------
 
         """
+        if self.__lumen_value is None:
+            rays = self.rays
+            if self.__lumen_value is None:
+                self.__lumen_value = self.__spectral_photometric_power(
+                    np.sum(rays.energy, dtype=np.float64), np.sum(rays.luminous_flux())
+                )
         return self.__lumen_value
 
+    @property
+    def load_timings(self) -> dict:
+        """
+        this method returns the time in seconds spent loading the rays, empty if they were not read from the file
+        Returns:
+            dict with the number of "workers" and record "ranges", the wall time to "decode" and validate the
+            ranges, the "busy" time summed over the ranges, the time to "compact" the valid rays and the "total"
+        -------
+
+        """
+        return self.__load_timings
+
+    @property
+    def validation_report(self) -> RayValidationReport:
+        """
+        this method return the summary of the validation done while loading or streaming the rays
+        Returns:
+            validation report
+        -------
+
+        """
+        return self.__validation_report
+
     @property
     def rays_number(self) -> int:
         """
@@ -451,16 +774,71 @@ class DpfRayfile(DataProcessingFramework):
         return self.__ray_numb
 
     @property
-    def rays(self) -> [DpfRay]:
+    def rays(self) -> RayBundle:
         """
-        this method return a list of rays
+        this method return the rays as a RayBundle, iterating over it yields DpfRay objects
         Returns:
-            a list of rays
+            bundle of rays
         -------
 
         """
+        if self.__rays is None:
+            self.__load_rays()
         return self.__rays
 
+    def set_rays(self, rays, scale_power=True):
+        """
+        replace the rays of the rayfile, e.g. by a selection, to export them
+
+        Parameters
+        ----------
+        rays : RayBundle
+            new rays
+        scale_power : bool, optional
+            scale the radiometric and photometric power by the ratio of the ray energies, default value is True
+
+        Returns
+        -------
+        None
+
+        """
+        if scale_power:
+            energy = float(np.sum(self.rays.energy, dtype=np.float64))
+            ratio = float(np.sum(rays.energy, dtype=np.float64)) / energy if energy > 0 else 0
+            self.__watt_value *= ratio
+            if self.__lumen_value is not None:
+                self.__lumen_value *= ratio
+        self.__rays = rays
+        self.__ray_numb = len(rays)
+
+    def resample(self, rays_number, method="uniform", seed=None, position_cells=4, direction_cells=4):
+        """
+        replace the rays by a smaller set of rays preserving the radiometric and photometric power
+
+        Parameters
+        ----------
+        rays_number : int
+            number of rays after resampling
+        method : str, optional
+            "uniform", "energy" or "stratified", see RayBundle.resample. Default value is "uniform".
+        seed : int or numpy.random.Generator, optional
+            seed of the random generator
+        position_cells : int, optional
+            number of cells along each position axis for the stratified method, default value is 4
+        direction_cells : int, optional
+            number of cells along each direction axis for the stratified method, default value is 4
+
+        Returns
+        -------
+        None
+
+        """
+        radiometric_power = self.radiometric_power
+        photometric_power = self.photometric_power
+        self.set_rays(self.rays.resample(rays_number, method, seed, position_cells, direction_cells), scale_power=False)
+        self.__watt_value = radiometric_power
+        self.__lumen_value = photometric_power
+
     def export_to_zemax(self):
         """
         this method convert the rayfile into zemax format
@@ -471,54 +849,11 @@ class DpfRayfile(DataProcessingFramework):
 
         """
         outfile = self.export_file()
-        zemax_spectrum_file = open(outfile, "wb")
-        zemax_spectrum_file.write(struct.pack("<I", 1010))  # Identifier
-        zemax_spectrum_file.write(struct.pack("<I", self.rays_number))  # NbrRays
-
-        description = "Converted from SPEOS .ray file."
-        # if len(description) > 100:
-        #    description = description[:100]
-        # else:
-        #    description = description.ljust(100)
-        description = description.ljust(100)
-        zemax_spectrum_file.write(description.encode("ascii"))  # Description
-        zemax_spectrum_file.write(struct.pack("f", self.radiometric_power))  # SourceFlux = radiometric flux in SPOES
-        zemax_spectrum_file.write(struct.pack("f", self.radiometric_power))  # RaySetFlux = radiometric flux in SPOES
-        zemax_spectrum_file.write(struct.pack("f", 0))  # Wavelength
-        zemax_spectrum_file.write(struct.pack("f", 0))  # InclinationBeg
-        zemax_spectrum_file.write(struct.pack("f", 0))  # InclinationEnd
-        zemax_spectrum_file.write(struct.pack("f", 0))  # AzimuthBeg
-        zemax_spectrum_file.write(struct.pack("f", 0))  # AzimuthEnd
-        zemax_spectrum_file.write(struct.pack("<I", 4))  # DimensionUnits: M=0, IN=1, CM=2, FT=3, MM=4
-        zemax_spectrum_file.write(struct.pack("f", 0))  # LocX
-        zemax_spectrum_file.write(struct.pack("f", 0))  # LocY
-        zemax_spectrum_file.write(struct.pack("f", 0))  # LocZ
-        zemax_spectrum_file.write(struct.pack("f", 0))  # RotX
-        zemax_spectrum_file.write(struct.pack("f", 0))  # RotY
-        zemax_spectrum_file.write(struct.pack("f", 0))  # RotZ
-        zemax_spectrum_file.write(struct.pack("f", 0))  # ScaleX
-        zemax_spectrum_file.write(struct.pack("f", 0))  # ScaleY
-        zemax_spectrum_file.write(struct.pack("f", 0))  # ScaleZ
-        zemax_spectrum_file.write(struct.pack("f", 0))  # unused1 (float)
-        zemax_spectrum_file.write(struct.pack("f", 0))  # unused2 (float)
-        zemax_spectrum_file.write(struct.pack("f", 0))  # unused3 (float)
-        zemax_spectrum_file.write(struct.pack("f", 0))  # unused4 (float)
-        zemax_spectrum_file.write(
-            struct.pack("<I", 2)
-        )  # ray_format_type is color since the SPEOS ray file always contains wavelength
-        zemax_spectrum_file.write(struct.pack("<I", 0))  # flux_type is Watts
-        zemax_spectrum_file.write(struct.pack("<I", 0))  # reversed1 (int)
-        zemax_spectrum_file.write(struct.pack("<I", 0))  # reversed2 (int)
-        for ray in self.rays:
-            zemax_spectrum_file.write(struct.pack("f", ray.coordinate_x))  # x
-            zemax_spectrum_file.write(struct.pack("f", ray.coordinate_y))  # y
-            zemax_spectrum_file.write(struct.pack("f", ray.coordinate_z))  # z
-            zemax_spectrum_file.write(struct.pack("f", ray.radiation_l))  # l
-            zemax_spectrum_file.write(struct.pack("f", ray.radiation_m))  # m
-            zemax_spectrum_file.write(struct.pack("f", ray.radiation_n))  # n
-            zemax_spectrum_file.write(struct.pack("f", ray.energy))  # flux (Watts)
-            zemax_spectrum_file.write(struct.pack("f", ray.wavelength))  # wavelength
-        zemax_spectrum_file.close()
+        with open(outfile, "wb") as zemax_spectrum_file:
+            zemax_spectrum_file.write(
+                pack_zemax_header(self.rays_number, self.radiometric_power, self.radiometric_power)
+            )
+            self.rays.tofile(zemax_spectrum_file, zemax_spectral_ray_dtype)
 
     def export_to_speos(self):
         """
@@ -530,26 +865,11 @@ class DpfRayfile(DataProcessingFramework):
 
         """
         outfile = self.export_file()
-        speos_ray_file = open(outfile, "wb")
-        speos_ray_file.write(struct.pack("f", self.radiometric_power))
-        speos_ray_file.write(struct.pack("f", 2.0))
-        speos_ray_file.write(struct.pack("f", 2.0))
-        speos_ray_file.write(struct.pack("f", 2.0))
-        speos_ray_file.write(struct.pack("f", 2.0))
-        speos_ray_file.write(struct.pack("f", 2.0))
-        speos_ray_file.write(struct.pack("f", self.photometric_power))
-        for ray in self.rays:
-            speos_ray_file.write(struct.pack("f", ray.coordinate_x))
-            speos_ray_file.write(struct.pack("f", ray.coordinate_y))
-            speos_ray_file.write(struct.pack("f", ray.coordinate_z))
-            speos_ray_file.write(struct.pack("f", ray.radiation_l))
-            speos_ray_file.write(struct.pack("f", ray.radiation_m))
-            speos_ray_file.write(struct.pack("f", ray.radiation_n))
-            speos_ray_file.write(struct.pack("f", ray.wavelength * 1000))
-            speos_ray_file.write(struct.pack("f", ray.energy))
-        speos_ray_file.close()
-
-    def export_file(self, export_folder_dir=None, convert=False):
+        with open(outfile, "wb") as speos_ray_file:
+            speos_ray_file.write(pack_speos_header(self.radiometric_power, self.photometric_power))
+            self.rays.tofile(speos_ray_file, speos_ray_dtype, wavelength_factor=1000)
+
+    def export_file(self, export_folder_dir=None, convert=False, overwrite=False):
         """
         this method generates a file to be exported
         Parameters
@@ -559,6 +879,9 @@ class DpfRayfile(DataProcessingFramework):
             defines path where to export the rayfile
         convert : Boolean , optional
             defines if the export is a conversion, default value is False
+        overwrite : Boolean , optional
+            return the same output name for the same input instead of adding a _1, _2 ... suffix when the file
+            exists, default value is False
         Returns
         -------
         outfile: str
@@ -592,7 +915,7 @@ class DpfRayfile(DataProcessingFramework):
                 raise TypeError(msg)
         outfile = output_file_path + exported_file_extension
         outfile_num = 1
-        while os.path.isfile(outfile):
+        while not overwrite and os.path.isfile(outfile):
             outfile = output_file_path + "_" + str(outfile_num) + exported_file_extension
             outfile_num += 1
         return outfile
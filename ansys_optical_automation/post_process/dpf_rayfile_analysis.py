@@ -0,0 +1,263 @@
+import numpy as np
+
+from ansys_optical_automation.post_process.dpf_xmp_viewer import MapStruct
+
+
+def ray_weights(rays, power_scale, photometric):
+    """
+    compute the power carried by every ray
+
+    Parameters
+    ----------
+    rays : RayBundle
+        rays to weight
+    power_scale : float
+        factor converting ray energy into watts
+    photometric : bool
+        weight the rays by the luminous efficacy of their wavelength to get lumens
+
+    Returns
+    -------
+    numpy.ndarray
+        power per ray in watts or lumens
+
+    """
+    if photometric:
+        return rays.luminous_flux(power_scale)
+    return rays.energy.astype(np.float64) * power_scale
+
+
+def accumulate_map(rays, coordinates, size, resolution, total_power, photometric, wl_res, chunk_size):
+    """
+    bin the ray power on a 2D map chunk by chunk with np.bincount
+
+    Parameters
+    ----------
+    rays : RayBundle
+        rays to bin
+    coordinates : function
+        function returning the map coordinates (u, v) and a validity mask of a chunk of rays
+    size : list of floats
+        [XMin, XMax, YMin, YMax] map dimensions
+    resolution : list of int
+        resolution in [x, y]
+    total_power : float
+        power of all rays, None to use the ray energy as power
+    photometric : bool
+        weight the rays by the luminous efficacy of their wavelength
+    wl_res : list
+        [Wstart, Wend, wNb] wavelength range in nanometer and resolution, None for a single wavelength bin
+    chunk_size : int
+        number of rays binned at once
+
+    Returns
+    -------
+    numpy.ndarray
+        binned power of shape (x, y, wavelength), per nanometer for spectral maps
+
+    """
+    x_nb, y_nb = int(resolution[0]), int(resolution[1])
+    w_nb = 1 if wl_res is None else int(wl_res[2])
+    energy = float(np.sum(rays.energy, dtype=np.float64))
+    power_scale = 1.0 if total_power is None or energy == 0 else total_power / energy
+    binned = np.zeros(x_nb * y_nb * w_nb)
+    for start in range(0, len(rays), chunk_size):
+        chunk = rays[start : start + chunk_size]
+        u, v, valid = coordinates(chunk)
+        x_idx = np.floor((u - size[0]) / (size[1] - size[0]) * x_nb)
+        y_idx = np.floor((v - size[2]) / (size[3] - size[2]) * y_nb)
+        valid &= (x_idx >= 0) & (x_idx < x_nb) & (y_idx >= 0) & (y_idx < y_nb)
+        flat_idx = x_idx.astype(np.int64) * y_nb + y_idx.astype(np.int64)
+        if wl_res is not None:
+            w_idx = np.floor((chunk.wavelength * 1000 - wl_res[0]) / (wl_res[1] - wl_res[0]) * w_nb)
+            valid &= (w_idx >= 0) & (w_idx < w_nb)
+            flat_idx = flat_idx * w_nb + w_idx.astype(np.int64)
+        weights = ray_weights(chunk, power_scale, photometric)
+        binned += np.bincount(flat_idx[valid], weights=weights[valid], minlength=binned.size)
+    if wl_res is not None:
+        binned /= (wl_res[1] - wl_res[0]) / w_nb
+    return binned.reshape(x_nb, y_nb, w_nb)
+
+
+def create_map(value_type, unit_type, axis_unit, size, resolution, wl_res, values, power):
+    """
+    create a MapStruct holding the binned values
+
+    Parameters
+    ----------
+    value_type : int
+        0 for Irradiance, 1 for Intensity
+    unit_type : int
+        0 for Radiometric, 1 for Photometric
+    axis_unit : int
+        1 for millimeter, 2 for degree
+    size : list of floats
+        [XMin, XMax, YMin, YMax] map dimensions
+    resolution : list of int
+        resolution in [x, y]
+    wl_res : list
+        [Wstart, Wend, wNb] for a spectral map, None for an extended map
+    values : numpy.ndarray
+        values of shape (x, y, wavelength)
+    power : float
+        power of the rays contributing to the map
+
+    Returns
+    -------
+    MapStruct
+
+    """
+    map_type = 3 if wl_res is None else 2
+    ray_map = MapStruct(map_type, value_type, 0, unit_type, axis_unit, size, resolution, wl_res=wl_res)
+    ray_map.data[0] = values
+    ray_map.layer_powers[0] = power
+    return ray_map
+
+
+def irradiance_map(
+    rays,
+    size,
+    resolution,
+    total_power=None,
+    photometric=False,
+    wl_res=None,
+    origin=(0, 0, 0),
+    x_axis=(1, 0, 0),
+    y_axis=(0, 1, 0),
+    chunk_size=1000000,
+):
+    """
+    compute the irradiance of rays on a plane without running a simulation
+
+    The rays are propagated from their start position along their direction to the plane,
+    rays going away from the plane are ignored. Positions are expected in millimeter.
+
+    Parameters
+    ----------
+    rays : RayBundle
+        rays to bin, e.g. DpfRayfile.rays
+    size : list of floats
+        [XMin, XMax, YMin, YMax] map dimensions in millimeter
+    resolution : list of int
+        resolution in [x, y]
+    total_power : float, optional
+        power of all rays, e.g. DpfRayfile.radiometric_power. Default uses the ray energy as power in watts.
+    photometric : bool, optional
+        weight the rays by the luminous efficacy to compute illuminance in lx, default value is False
+    wl_res : list, optional
+        [Wstart, Wend, wNb] wavelength range in nanometer and resolution to compute a spectral map
+    origin : list, optional
+        origin of the plane, default value is (0, 0, 0)
+    x_axis : list, optional
+        direction of the map x axis, default value is (1, 0, 0)
+    y_axis : list, optional
+        direction of the map y axis, default value is (0, 1, 0)
+    chunk_size : int, optional
+        number of rays binned at once, default value is 1000000
+
+    Returns
+    -------
+    MapStruct
+        irradiance map in W/m2 or lx
+
+    """
+    origin = np.asarray(origin, dtype=np.float64)
+    x_axis = np.asarray(x_axis, dtype=np.float64) / np.linalg.norm(x_axis)
+    y_axis = np.asarray(y_axis, dtype=np.float64) / np.linalg.norm(y_axis)
+    normal = np.cross(x_axis, y_axis)
+
+    def plane_coordinates(chunk):
+        positions = np.column_stack((chunk.x, chunk.y, chunk.z)) - origin
+        directions = np.column_stack((chunk.l, chunk.m, chunk.n))
+        direction_normal = directions @ normal
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distance = -(positions @ normal) / direction_normal
+        valid = (direction_normal != 0) & (distance >= 0)
+        hits = positions + np.where(valid, distance, 0)[:, None] * directions
+        return hits @ x_axis, hits @ y_axis, valid
+
+    binned = accumulate_map(rays, plane_coordinates, size, resolution, total_power, photometric, wl_res, chunk_size)
+    power = binned.sum() * (1 if wl_res is None else (wl_res[1] - wl_res[0]) / wl_res[2])
+    pixel_area = (size[1] - size[0]) / resolution[0] * (size[3] - size[2]) / resolution[1] * 1e-6
+    return create_map(0, int(photometric), 1, size, resolution, wl_res, binned / pixel_area, power)
+
+
+def intensity_map(
+    rays,
+    size,
+    resolution,
+    total_power=None,
+    photometric=False,
+    wl_res=None,
+    angles="hv",
+    chunk_size=1000000,
+):
+    """
+    compute the far field intensity of rays without running a simulation
+
+    Parameters
+    ----------
+    rays : RayBundle
+        rays to bin, e.g. DpfRayfile.rays
+    size : list of floats
+        [XMin, XMax, YMin, YMax] map dimensions in degree
+    resolution : list of int
+        resolution in [x, y]
+    total_power : float, optional
+        power of all rays, e.g. DpfRayfile.radiometric_power. Default uses the ray energy as power in watts.
+    photometric : bool, optional
+        weight the rays by the luminous efficacy to compute luminous intensity in cd, default value is False
+    wl_res : list, optional
+        [Wstart, Wend, wNb] wavelength range in nanometer and resolution to compute a spectral map
+    angles : str, optional
+        "hv" for horizontal angle atan2(l, n) and vertical angle asin(m),
+        "theta_phi" for polar angle acos(n) and azimuth atan2(m, l) in [0, 360]. Default value is "hv".
+    chunk_size : int, optional
+        number of rays binned at once, default value is 1000000
+
+    Returns
+    -------
+    MapStruct
+        intensity map in W/sr or cd
+
+    """
+    if angles == "hv":
+
+        def angular_coordinates(chunk):
+            l_dir = chunk.l.astype(np.float64)
+            m_dir = chunk.m.astype(np.float64)
+            n_dir = chunk.n.astype(np.float64)
+            return (
+                np.degrees(np.arctan2(l_dir, n_dir)),
+                np.degrees(np.arcsin(np.clip(m_dir, -1, 1))),
+                np.ones(len(chunk), dtype=bool),
+            )
+
+    elif angles == "theta_phi":
+
+        def angular_coordinates(chunk):
+            l_dir = chunk.l.astype(np.float64)
+            m_dir = chunk.m.astype(np.float64)
+            n_dir = chunk.n.astype(np.float64)
+            return (
+                np.degrees(np.arccos(np.clip(n_dir, -1, 1))),
+                np.degrees(np.arctan2(m_dir, l_dir)) % 360,
+                np.ones(len(chunk), dtype=bool),
+            )
+
+    else:
+        msg = "Angles " + str(angles) + " not supported, use hv or theta_phi"
+        raise ValueError(msg)
+    binned = accumulate_map(rays, angular_coordinates, size, resolution, total_power, photometric, wl_res, chunk_size)
+    power = binned.sum() * (1 if wl_res is None else (wl_res[1] - wl_res[0]) / wl_res[2])
+    x_edges = np.radians(np.linspace(size[0], size[1], resolution[0] + 1))
+    y_edges = np.radians(np.linspace(size[2], size[3], resolution[1] + 1))
+    if angles == "hv":
+        # solid angle of a cell is dH * (sin(V2) - sin(V1))
+        solid_angle = np.outer(np.diff(x_edges), np.abs(np.diff(np.sin(y_edges))))
+    else:
+        # solid angle of a cell is (cos(theta1) - cos(theta2)) * dphi
+        solid_angle = np.outer(np.abs(np.diff(np.cos(x_edges))), np.diff(y_edges))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        intensity = np.where(solid_angle[:, :, None] > 0, binned / solid_angle[:, :, None], 0)
+    return create_map(1, int(photometric), 2, size, resolution, wl_res, intensity, power)
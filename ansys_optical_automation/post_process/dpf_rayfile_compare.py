@@ -0,0 +1,356 @@
+import itertools
+import os
+
+import numpy as np
+
+from ansys_optical_automation.post_process.dpf_ray_bundle import RayBundle
+from ansys_optical_automation.post_process.dpf_ray_bundle import ray_dtype
+from ansys_optical_automation.post_process.dpf_ray_bundle import ray_fields
+from ansys_optical_automation.post_process.dpf_rayfile import DpfRayfile
+
+default_tolerances = {
+    "power": 1e-6,  # relative difference of the header radiometric and photometric power
+    "rays_number": 0,  # absolute difference of the number of valid rays
+    "energy": 1e-6,  # relative difference of the total ray energy
+    "moments": 1e-4,  # absolute difference of the energy weighted mean and standard deviation
+    "histogram": 1e-6,  # absolute difference of the energy fraction per wavelength bin
+    "ray": 1e-5,  # absolute difference of any value of two rays with the same index
+}
+moment_fields = ("x", "y", "z", "l", "m", "n")
+
+
+class RayStatistics:
+    """
+    this class accumulates the statistics of rays chunk by chunk
+    """
+
+    def __init__(self, wl_range=(200, 2000), wl_resolution=1.0):
+        """
+        Parameters
+        ----------
+        wl_range : tuple, optional
+            (minimum, maximum) wavelength in nanometer of the histogram, default value is (200, 2000)
+        wl_resolution : float, optional
+            width in nanometer of the histogram bins centered on multiples of it, default value is 1.0
+        """
+        self.wl_range = wl_range
+        self.wl_resolution = wl_resolution
+        self.rays_number = 0
+        self.energy = 0.0
+        self.sums = np.zeros(len(moment_fields))
+        self.square_sums = np.zeros(len(moment_fields))
+        self.histogram = np.zeros(int(round((wl_range[1] - wl_range[0]) / wl_resolution)) + 1)
+
+    def add(self, rays):
+        """
+        add a chunk of rays to the statistics
+
+        Parameters
+        ----------
+        rays : RayBundle
+            rays to add
+
+        Returns
+        -------
+        None
+
+        """
+        energy = rays.energy.astype(np.float64)
+        self.rays_number += len(rays)
+        self.energy += energy.sum()
+        for index, name in enumerate(moment_fields):
+            values = getattr(rays, name).astype(np.float64)
+            self.sums[index] += np.dot(energy, values)
+            self.square_sums[index] += np.dot(energy, values * values)
+        bins = np.rint((rays.wavelength * 1000 - self.wl_range[0]) / self.wl_resolution).astype(np.int64)
+        self.histogram += np.bincount(
+            np.clip(bins, 0, self.histogram.size - 1), weights=energy, minlength=self.histogram.size
+        )
+
+    @property
+    def mean(self) -> np.ndarray:
+        """
+        return the energy weighted mean of x, y, z, l, m, n
+        Returns:
+            array of 6 values
+        -------
+
+        """
+        return self.sums / self.energy if self.energy > 0 else np.zeros(len(moment_fields))
+
+    @property
+    def std(self) -> np.ndarray:
+        """
+        return the energy weighted standard deviation of x, y, z, l, m, n
+        Returns:
+            array of 6 values
+        -------
+
+        """
+        if self.energy <= 0:
+            return np.zeros(len(moment_fields))
+        return np.sqrt(np.clip(self.square_sums / self.energy - self.mean**2, 0, None))
+
+    @property
+    def spectrum(self) -> np.ndarray:
+        """
+        return the fraction of the energy per wavelength bin, the first and last bins include the rays outside
+        Returns:
+            array of energy fractions
+        -------
+
+        """
+        return self.histogram / self.energy if self.energy > 0 else self.histogram
+
+
+class RayfileComparison:
+    """
+    this class summarizes the differences between two rayfiles
+    """
+
+    def __init__(self, tolerances):
+        self.tolerances = tolerances
+        self.results = {}
+
+    def add(self, name, reference, test, difference, tolerance_name):
+        """
+        add a compared quantity
+
+        Parameters
+        ----------
+        name : str
+            name of the quantity
+        reference : float
+            value of the reference rayfile
+        test : float
+            value of the tested rayfile
+        difference : float
+            difference between both values
+        tolerance_name : str
+            key of the tolerance in tolerances
+
+        Returns
+        -------
+        None
+
+        """
+        tolerance = self.tolerances[tolerance_name]
+        self.results[name] = {
+            "reference": reference,
+            "test": test,
+            "difference": difference,
+            "tolerance": tolerance,
+            "passed": bool(difference <= tolerance),
+        }
+
+    @property
+    def is_equal(self) -> bool:
+        """
+        return if all compared quantities are within their tolerance
+        Returns:
+            True if the rayfiles match
+        -------
+
+        """
+        return all(result["passed"] for result in self.results.values())
+
+    @property
+    def failures(self) -> list:
+        """
+        return the names of the quantities exceeding their tolerance
+        Returns:
+            list of names
+        -------
+
+        """
+        return [name for name, result in self.results.items() if not result["passed"]]
+
+    def __str__(self):
+        lines = ["Rayfiles match" if self.is_equal else "Rayfiles differ"]
+        for name, result in self.results.items():
+            lines.append(
+                ("  " if result["passed"] else "! ")
+                + name
+                + ": reference "
+                + str(result["reference"])
+                + ", test "
+                + str(result["test"])
+                + ", difference "
+                + "{:.3g}".format(result["difference"])
+                + " (tolerance "
+                + str(result["tolerance"])
+                + ")"
+            )
+        return "\n".join(lines)
+
+
+def relative_difference(reference, test):
+    """
+    compute the relative difference of two values
+
+    Parameters
+    ----------
+    reference : float
+        reference value
+    test : float
+        tested value
+
+    Returns
+    -------
+    float
+        abs(test - reference) relative to the reference, the absolute difference if the reference is 0
+
+    """
+    difference = abs(test - reference)
+    return difference / abs(reference) if reference != 0 else difference
+
+
+def rechunk(chunks, chunk_size):
+    """
+    regroup chunks of rays of any size into chunks of exactly chunk_size rays, the last one may be smaller
+
+    Parameters
+    ----------
+    chunks : iterable of RayBundle
+        rays to regroup
+    chunk_size : int
+        number of rays per chunk
+
+    Returns
+    -------
+    generator of RayBundle
+        rays in the layout ray_dtype with wavelength in micrometer
+
+    """
+    pending = []
+    pending_number = 0
+    for chunk in chunks:
+        pending.append(chunk.to_records(ray_dtype))
+        pending_number += len(chunk)
+        if pending_number >= chunk_size:
+            records = np.concatenate(pending)
+            full_number = len(records) - len(records) % chunk_size
+            for start in range(0, full_number, chunk_size):
+                yield RayBundle(records[start : start + chunk_size])
+            pending = [records[full_number:]]
+            pending_number = len(pending[0])
+    if pending_number:
+        yield RayBundle(np.concatenate(pending))
+
+
+def compare_rayfiles(
+    reference_path,
+    test_path,
+    tolerances=None,
+    per_ray=False,
+    chunk_size=1000000,
+    wl_range=(200, 2000),
+    wl_resolution=1.0,
+):
+    """
+    compare two rayfiles, e.g. a converted rayfile with its source, from statistics computed chunk by chunk
+
+    The header powers, the photometric one only if no file is a .sdf, the number of valid rays, the total energy,
+    the energy weighted mean and standard deviation of the positions and directions and the energy fraction per
+    wavelength bin are compared. Rays without flux are ignored like during a conversion.
+
+    Parameters
+    ----------
+    reference_path : str
+        path to the reference rayfile
+    test_path : str
+        path to the tested rayfile
+    tolerances : dict, optional
+        tolerances replacing the values of default_tolerances, e.g. {"moments": 1e-3}
+    per_ray : bool, optional
+        also compare the rays one by one and report the maximum deviation, default value is False
+    chunk_size : int, optional
+        number of rays read at once, default value is 1000000
+    wl_range : tuple, optional
+        (minimum, maximum) wavelength in nanometer of the histogram, default value is (200, 2000)
+    wl_resolution : float, optional
+        width in nanometer of the histogram bins, default value is 1.0
+
+    Returns
+    -------
+    RayfileComparison
+        compared quantities, use is_equal to check the result
+
+    """
+    comparison = RayfileComparison(dict(default_tolerances, **(tolerances or {})))
+    rayfiles = [DpfRayfile(path, strict=False, header_only=True) for path in (reference_path, test_path)]
+    statistics = [RayStatistics(wl_range, wl_resolution) for _ in rayfiles]
+    if per_ray:
+        streams = [rechunk(rayfile.read_chunks(chunk_size), chunk_size) for rayfile in rayfiles]
+        deviation = 0.0
+        # rays left in the longer file have no counterpart and only count for the statistics
+        for reference_chunk, test_chunk in itertools.zip_longest(*streams):
+            for chunk, statistic in zip((reference_chunk, test_chunk), statistics):
+                if chunk is not None:
+                    statistic.add(chunk)
+            if reference_chunk is None or test_chunk is None:
+                continue
+            common = min(len(reference_chunk), len(test_chunk))
+            for name in ray_fields:
+                reference_values = getattr(reference_chunk, name)[:common].astype(np.float64)
+                test_values = getattr(test_chunk, name)[:common].astype(np.float64)
+                if common:
+                    deviation = max(deviation, float(np.max(np.abs(test_values - reference_values))))
+    else:
+        for rayfile, statistic in zip(rayfiles, statistics):
+            for chunk in rayfile.read_chunks(chunk_size):
+                statistic.add(chunk)
+    reference, test = rayfiles
+    comparison.add(
+        "radiometric_power",
+        reference.radiometric_power,
+        test.radiometric_power,
+        relative_difference(reference.radiometric_power, test.radiometric_power),
+        "power",
+    )
+    # .sdf headers store no photometric power, it is computed from the ray spectrum instead of read
+    if ".sdf" not in [os.path.splitext(path)[1].lower() for path in (reference_path, test_path)]:
+        comparison.add(
+            "photometric_power",
+            reference.photometric_power,
+            test.photometric_power,
+            relative_difference(reference.photometric_power, test.photometric_power),
+            "power",
+        )
+    comparison.add(
+        "rays_number",
+        statistics[0].rays_number,
+        statistics[1].rays_number,
+        abs(statistics[1].rays_number - statistics[0].rays_number),
+        "rays_number",
+    )
+    comparison.add(
+        "energy",
+        statistics[0].energy,
+        statistics[1].energy,
+        relative_difference(statistics[0].energy, statistics[1].energy),
+        "energy",
+    )
+    for moment in ("mean", "std"):
+        reference_moment = getattr(statistics[0], moment)
+        test_moment = getattr(statistics[1], moment)
+        for index, name in enumerate(moment_fields):
+            comparison.add(
+                moment + "_" + name,
+                float(reference_moment[index]),
+                float(test_moment[index]),
+                float(abs(test_moment[index] - reference_moment[index])),
+                "moments",
+            )
+    spectrum_difference = np.abs(statistics[1].spectrum - statistics[0].spectrum)
+    worst_bin = int(np.argmax(spectrum_difference))
+    comparison.add(
+        "spectrum_" + str(wl_range[0] + worst_bin * wl_resolution) + "nm",
+        float(statistics[0].spectrum[worst_bin]),
+        float(statistics[1].spectrum[worst_bin]),
+        float(spectrum_difference[worst_bin]),
+        "histogram",
+    )
+    if per_ray:
+        comparison.add("max_ray_deviation", 0.0, deviation, deviation, "ray")
+    return comparison
@@ -0,0 +1,367 @@
+import numpy as np
+
+from ansys_optical_automation.post_process.dpf_ray_bundle import RayBundle
+from ansys_optical_automation.post_process.dpf_rayfile_writer import RayfileWriter
+
+
+def sample_wavelength(rays_number, wavelength, rng):
+    """
+    draw the wavelength of the rays
+
+    Parameters
+    ----------
+    rays_number : int
+        number of rays
+    wavelength : float or tuple
+        wavelength in micrometer, or (wavelengths, relative powers) of a discrete spectrum
+    rng : numpy.random.Generator
+        random generator
+
+    Returns
+    -------
+    float or numpy.ndarray
+        wavelength of all rays in micrometer
+
+    """
+    if np.isscalar(wavelength):
+        return wavelength
+    wavelengths = np.asarray(wavelength[0], dtype=np.float64)
+    weights = np.asarray(wavelength[1], dtype=np.float64)
+    return wavelengths[rng.choice(len(wavelengths), size=rays_number, p=weights / weights.sum())]
+
+
+def lambertian_directions(rays_number, rng):
+    """
+    draw directions of a lambertian emission in the +z hemisphere
+
+    Parameters
+    ----------
+    rays_number : int
+        number of rays
+    rng : numpy.random.Generator
+        random generator
+
+    Returns
+    -------
+    tuple
+        l, m, n direction cosines
+
+    """
+    sin_theta_square = rng.random(rays_number)
+    phi = rng.random(rays_number) * 2 * np.pi
+    sin_theta = np.sqrt(sin_theta_square)
+    return sin_theta * np.cos(phi), sin_theta * np.sin(phi), np.sqrt(1 - sin_theta_square)
+
+
+def disk_positions(rays_number, radius, rng):
+    """
+    draw positions uniformly distributed on a disk
+
+    Parameters
+    ----------
+    rays_number : int
+        number of rays
+    radius : float
+        disk radius
+    rng : numpy.random.Generator
+        random generator
+
+    Returns
+    -------
+    tuple
+        x, y positions relative to the disk center
+
+    """
+    radii = radius * np.sqrt(rng.random(rays_number))
+    phi = rng.random(rays_number) * 2 * np.pi
+    return radii * np.cos(phi), radii * np.sin(phi)
+
+
+def grid_rays(x_range, y_range, direction=(0, 0, 1), z=0, wavelength=0.555, power=1.0):
+    """
+    create one ray per node of a grid in a plane z = constant, all with the same direction
+
+    Parameters
+    ----------
+    x_range : array_like
+        x coordinates of the grid nodes
+    y_range : array_like
+        y coordinates of the grid nodes
+    direction : array_like, optional
+        ray direction [x, y, z], normalized, default value is (0, 0, 1)
+    z : float, optional
+        z coordinate of the grid, default value is 0
+    wavelength : float, optional
+        wavelength in micrometer, default value is 0.555
+    power : float, optional
+        power shared equally by the rays, default value is 1.0
+
+    Returns
+    -------
+    RayBundle
+        rays ordered by x then y
+
+    """
+    x, y = np.meshgrid(np.asarray(x_range, dtype=np.float64), np.asarray(y_range, dtype=np.float64), indexing="ij")
+    direction = np.asarray(direction, dtype=np.float64) / np.linalg.norm(direction)
+    return RayBundle.from_arrays(x, y, z, *direction, wavelength, power / max(x.size, 1))
+
+
+def lambertian_rectangle_rays(rays_number, width, height, center=(0, 0, 0), wavelength=0.555, power=1.0, seed=None):
+    """
+    create rays of a lambertian rectangle emitting towards +z
+
+    Use RayBundle.rotate or RayBundle.transform to orient the emitter.
+
+    Parameters
+    ----------
+    rays_number : int
+        number of rays
+    width : float
+        size of the rectangle along x
+    height : float
+        size of the rectangle along y
+    center : array_like, optional
+        center of the rectangle, default value is (0, 0, 0)
+    wavelength : float or tuple, optional
+        wavelength in micrometer, or (wavelengths, relative powers) of a discrete spectrum. Default value is 0.555.
+    power : float, optional
+        power shared equally by the rays, default value is 1.0
+    seed : int or numpy.random.Generator, optional
+        seed of the random generator
+
+    Returns
+    -------
+    RayBundle
+
+    """
+    rng = np.random.default_rng(seed)
+    x = center[0] + (rng.random(rays_number) - 0.5) * width
+    y = center[1] + (rng.random(rays_number) - 0.5) * height
+    l_dir, m_dir, n_dir = lambertian_directions(rays_number, rng)
+    wavelength = sample_wavelength(rays_number, wavelength, rng)
+    return RayBundle.from_arrays(x, y, center[2], l_dir, m_dir, n_dir, wavelength, power / max(rays_number, 1))
+
+
+def lambertian_disk_rays(rays_number, radius, center=(0, 0, 0), wavelength=0.555, power=1.0, seed=None):
+    """
+    create rays of a lambertian disk emitting towards +z
+
+    Use RayBundle.rotate or RayBundle.transform to orient the emitter.
+
+    Parameters
+    ----------
+    rays_number : int
+        number of rays
+    radius : float
+        disk radius
+    center : array_like, optional
+        center of the disk, default value is (0, 0, 0)
+    wavelength : float or tuple, optional
+        wavelength in micrometer, or (wavelengths, relative powers) of a discrete spectrum. Default value is 0.555.
+    power : float, optional
+        power shared equally by the rays, default value is 1.0
+    seed : int or numpy.random.Generator, optional
+        seed of the random generator
+
+    Returns
+    -------
+    RayBundle
+
+    """
+    rng = np.random.default_rng(seed)
+    x, y = disk_positions(rays_number, radius, rng)
+    l_dir, m_dir, n_dir = lambertian_directions(rays_number, rng)
+    wavelength = sample_wavelength(rays_number, wavelength, rng)
+    return RayBundle.from_arrays(
+        center[0] + x, center[1] + y, center[2], l_dir, m_dir, n_dir, wavelength, power / max(rays_number, 1)
+    )
+
+
+def collimated_rays(rays_number, radius, center=(0, 0, 0), direction=(0, 0, 1), wavelength=0.555, power=1.0, seed=None):
+    """
+    create rays of a collimated beam with a circular cross section
+
+    Parameters
+    ----------
+    rays_number : int
+        number of rays
+    radius : float
+        beam radius
+    center : array_like, optional
+        center of the beam cross section, default value is (0, 0, 0)
+    direction : array_like, optional
+        beam direction [x, y, z], default value is (0, 0, 1)
+    wavelength : float or tuple, optional
+        wavelength in micrometer, or (wavelengths, relative powers) of a discrete spectrum. Default value is 0.555.
+    power : float, optional
+        power shared equally by the rays, default value is 1.0
+    seed : int or numpy.random.Generator, optional
+        seed of the random generator
+
+    Returns
+    -------
+    RayBundle
+
+    """
+    rng = np.random.default_rng(seed)
+    direction = np.asarray(direction, dtype=np.float64) / np.linalg.norm(direction)
+    # any vector not parallel to the direction gives the two axes of the cross section
+    helper = np.array([1.0, 0, 0]) if abs(direction[0]) < 0.9 else np.array([0, 1.0, 0])
+    u_axis = np.cross(direction, helper)
+    u_axis /= np.linalg.norm(u_axis)
+    v_axis = np.cross(direction, u_axis)
+    u, v = disk_positions(rays_number, radius, rng)
+    positions = np.asarray(center, dtype=np.float64) + u[:, None] * u_axis + v[:, None] * v_axis
+    wavelength = sample_wavelength(rays_number, wavelength, rng)
+    return RayBundle.from_arrays(
+        positions[:, 0], positions[:, 1], positions[:, 2], *direction, wavelength, power / max(rays_number, 1)
+    )
+
+
+def intensity_table_rays(rays_number, theta, phi, intensity, center=(0, 0, 0), wavelength=0.555, power=1.0, seed=None):
+    """
+    create rays of a point source following a measured intensity table by inverse CDF sampling
+
+    Every table value is the intensity of the cell around its node, the cells end halfway between the nodes.
+    A cell is chosen with a probability proportional to its intensity times its solid angle and the direction
+    is drawn uniformly in solid angle within the cell.
+
+    Parameters
+    ----------
+    rays_number : int
+        number of rays
+    theta : array_like
+        increasing polar angles from +z of the table in degree, within [0, 180]
+    phi : array_like
+        increasing azimuth angles of the table in degree, within [0, 360]
+    intensity : array_like
+        intensity of shape (theta, phi)
+    center : array_like, optional
+        position of the source, default value is (0, 0, 0)
+    wavelength : float or tuple, optional
+        wavelength in micrometer, or (wavelengths, relative powers) of a discrete spectrum. Default value is 0.555.
+    power : float, optional
+        power shared equally by the rays, default value is 1.0
+    seed : int or numpy.random.Generator, optional
+        seed of the random generator
+
+    Returns
+    -------
+    RayBundle
+
+    """
+    rng = np.random.default_rng(seed)
+    theta = np.radians(np.asarray(theta, dtype=np.float64))
+    phi = np.radians(np.asarray(phi, dtype=np.float64))
+    intensity = np.asarray(intensity, dtype=np.float64)
+    if intensity.shape != (len(theta), len(phi)):
+        msg = "Intensity table shape " + str(intensity.shape) + " does not match the theta and phi angles"
+        raise ValueError(msg)
+
+    def cell_edges(angles):
+        if len(angles) == 1:
+            return np.array([angles[0], angles[0]])
+        middle = (angles[1:] + angles[:-1]) / 2
+        return np.concatenate(([angles[0]], middle, [angles[-1]]))
+
+    cos_theta_edges = np.cos(cell_edges(theta))
+    phi_edges = cell_edges(phi)
+    solid_angle = np.outer(cos_theta_edges[:-1] - cos_theta_edges[1:], np.diff(phi_edges))
+    cdf = np.cumsum((np.clip(intensity, 0, None) * solid_angle).ravel())
+    if cdf[-1] <= 0:
+        msg = "Intensity table does not emit any power"
+        raise ValueError(msg)
+    cells = np.searchsorted(cdf, rng.random(rays_number) * cdf[-1], side="right")
+    cells = np.minimum(cells, cdf.size - 1)
+    theta_idx, phi_idx = np.divmod(cells, len(phi))
+    cos_theta = cos_theta_edges[theta_idx] + rng.random(rays_number) * (
+        cos_theta_edges[theta_idx + 1] - cos_theta_edges[theta_idx]
+    )
+    ray_phi = phi_edges[phi_idx] + rng.random(rays_number) * (phi_edges[phi_idx + 1] - phi_edges[phi_idx])
+    sin_theta = np.sqrt(np.clip(1 - cos_theta * cos_theta, 0, None))
+    wavelength = sample_wavelength(rays_number, wavelength, rng)
+    return RayBundle.from_arrays(
+        center[0],
+        center[1],
+        center[2],
+        sin_theta * np.cos(ray_phi),
+        sin_theta * np.sin(ray_phi),
+        cos_theta,
+        wavelength,
+        power / max(rays_number, 1),
+    )
+
+
+def write_rayfile(rays, file_path, radiometric_power=None, photometric_power=None, chunk_size=1000000):
+    """
+    write rays to a speos .ray or zemax .sdf/.dat rayfile
+
+    Parameters
+    ----------
+    rays : RayBundle or iterable of RayBundle
+        rays to write, e.g. a generator creating the rays chunk by chunk
+    file_path : str
+        path of the rayfile, the extension .ray, .sdf or .dat defines the format
+    radiometric_power : float, optional
+        power in watts, default is the sum of the ray energies
+    photometric_power : float, optional
+        power in lumens for speos rayfiles, default is derived from the ray spectrum
+    chunk_size : int, optional
+        number of rays converted and written at once, default value is 1000000
+
+    Returns
+    -------
+    str
+        path of the rayfile
+
+    """
+    writer = RayfileWriter(file_path, description="Generated rays.")
+    try:
+        for bundle in [rays] if isinstance(rays, RayBundle) else rays:
+            for start in range(0, len(bundle), chunk_size):
+                writer.write(bundle[start : start + chunk_size])
+    finally:
+        writer.close()
+    writer.write_header(writer.energy if radiometric_power is None else radiometric_power, photometric_power)
+    return file_path
+
+
+def generate_rayfile(file_path, generator, rays_number, power=1.0, seed=None, chunk_size=1000000, **parameters):
+    """
+    write the rays of a random emitter chunk by chunk, so the memory stays bounded for any number of rays
+
+    Parameters
+    ----------
+    file_path : str
+        path of the rayfile, the extension .ray, .sdf or .dat defines the format
+    generator : function
+        emitter function of this module taking rays_number, power and seed, e.g. lambertian_disk_rays
+    rays_number : int
+        total number of rays
+    power : float, optional
+        power in watts of the source, default value is 1.0
+    seed : int or numpy.random.Generator, optional
+        seed of the random generator, the same seed gives the same rayfile for the same chunk size
+    chunk_size : int, optional
+        number of rays generated and written at once, default value is 1000000
+    **parameters
+        emitter parameters, e.g. radius=1.0 for lambertian_disk_rays
+
+    Returns
+    -------
+    str
+        path of the rayfile
+
+    """
+    rng = np.random.default_rng(seed)
+    chunks = (
+        generator(
+            min(chunk_size, rays_number - start),
+            power=power * min(chunk_size, rays_number - start) / rays_number,
+            seed=rng,
+            **parameters,
+        )
+        for start in range(0, rays_number, chunk_size)
+    )
+    return write_rayfile(chunks, file_path, radiometric_power=power, chunk_size=chunk_size)
@@ -0,0 +1,289 @@
+import numpy as np
+
+
+def gather_ranges(order, starts, ends):
+    """
+    concatenate order[start:end] for all pairs of starts and ends without a Python loop
+
+    Parameters
+    ----------
+    order : numpy.ndarray
+        array to gather from
+    starts : numpy.ndarray
+        start index of each range
+    ends : numpy.ndarray
+        end index of each range, excluded
+
+    Returns
+    -------
+    numpy.ndarray
+        concatenated values
+
+    """
+    lengths = ends - starts
+    lengths[lengths < 0] = 0
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=order.dtype)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return order[offsets + np.arange(total)]
+
+
+class RayGridIndex:
+    """
+    this class defines a uniform grid index on the ray start positions
+
+    Rays are sorted by grid cell, so the rays of a box query are gathered from contiguous runs of cells.
+    """
+
+    def __init__(self, x, y, z, cells_per_axis=None):
+        """
+        Parameters
+        ----------
+        x, y, z : numpy.ndarray
+            ray start positions
+        cells_per_axis : int, optional
+            number of cells along each axis, default gives about 8 rays per cell and at most 256 cells per axis
+        """
+        positions = np.column_stack((x, y, z)).astype(np.float64)
+        if cells_per_axis is None:
+            cells_per_axis = int(np.clip(round((len(positions) / 8) ** (1 / 3)), 1, 256))
+        self.cells_per_axis = cells_per_axis
+        if len(positions):
+            self.minimum = positions.min(axis=0)
+            self.maximum = positions.max(axis=0)
+        else:
+            self.minimum = np.zeros(3)
+            self.maximum = np.zeros(3)
+        self.cell_size = (self.maximum - self.minimum) / cells_per_axis
+        self.cell_size[self.cell_size == 0] = 1
+        cell_ids = self.__cell_ids(self.__cell_coordinates(positions))
+        self.order = np.argsort(cell_ids, kind="stable")
+        self.starts = np.searchsorted(cell_ids[self.order], np.arange(cells_per_axis**3 + 1))
+
+    def __cell_coordinates(self, positions):
+        """
+        compute the cell coordinates of positions, clipped to the grid
+
+        Parameters
+        ----------
+        positions : numpy.ndarray
+            array of shape (N, 3)
+
+        Returns
+        -------
+        numpy.ndarray
+            integer array of shape (N, 3)
+
+        """
+        coordinates = np.floor((positions - self.minimum) / self.cell_size).astype(np.int64)
+        return np.clip(coordinates, 0, self.cells_per_axis - 1)
+
+    def __cell_ids(self, coordinates):
+        """
+        compute the flat cell id of cell coordinates
+
+        Parameters
+        ----------
+        coordinates : numpy.ndarray
+            integer array of shape (N, 3)
+
+        Returns
+        -------
+        numpy.ndarray
+            flat cell ids
+
+        """
+        cells = self.cells_per_axis
+        return (coordinates[:, 0] * cells + coordinates[:, 1]) * cells + coordinates[:, 2]
+
+    def query(self, box):
+        """
+        return the rays of all cells overlapping a box, the result needs an exact check
+
+        Parameters
+        ----------
+        box : tuple
+            ((xmin, ymin, zmin), (xmax, ymax, zmax))
+
+        Returns
+        -------
+        numpy.ndarray
+            sorted candidate ray indices
+
+        """
+        lower = np.asarray(box[0], dtype=np.float64)
+        upper = np.asarray(box[1], dtype=np.float64)
+        if np.any(lower > self.maximum) or np.any(upper < self.minimum):
+            return np.empty(0, dtype=np.int64)
+        # infinite or far bounds would overflow the integer cell coordinates
+        lower = np.clip(lower, self.minimum, self.maximum)
+        upper = np.clip(upper, self.minimum, self.maximum)
+        first, last = self.__cell_coordinates(np.vstack((lower, upper)))
+        x_cells, y_cells = np.meshgrid(
+            np.arange(first[0], last[0] + 1), np.arange(first[1], last[1] + 1), indexing="ij"
+        )
+        column_starts = np.column_stack(
+            (x_cells.ravel(), y_cells.ravel(), np.full(x_cells.size, first[2], dtype=np.int64))
+        )
+        column_ends = column_starts.copy()
+        column_ends[:, 2] = last[2]
+        starts = self.starts[self.__cell_ids(column_starts)]
+        ends = self.starts[self.__cell_ids(column_ends) + 1]
+        return np.sort(gather_ranges(self.order, starts, ends))
+
+
+class RayWavelengthIndex:
+    """
+    this class defines a sorted index on the ray wavelengths
+    """
+
+    def __init__(self, wavelength):
+        """
+        Parameters
+        ----------
+        wavelength : numpy.ndarray
+            ray wavelengths
+        """
+        self.order = np.argsort(wavelength, kind="stable")
+        self.sorted_wavelength = wavelength[self.order]
+
+    def query(self, wl_range):
+        """
+        return the rays within a wavelength range
+
+        Parameters
+        ----------
+        wl_range : tuple
+            (minimum, maximum) wavelength, both included
+
+        Returns
+        -------
+        numpy.ndarray
+            sorted ray indices
+
+        """
+        start = np.searchsorted(self.sorted_wavelength, wl_range[0], side="left")
+        end = np.searchsorted(self.sorted_wavelength, wl_range[1], side="right")
+        return np.sort(self.order[start:end])
+
+
+def morton_key(coordinates, bits):
+    """
+    interleave the bits of integer coordinates into Morton (Z-order) keys, the first axis is the most significant
+
+    Parameters
+    ----------
+    coordinates : numpy.ndarray
+        non negative integer array of shape (N, D) with values below 2**bits
+    bits : int
+        number of bits per axis, bits * D must not exceed 64
+
+    Returns
+    -------
+    numpy.ndarray
+        uint64 keys
+
+    """
+    coordinates = np.asarray(coordinates, dtype=np.uint64)
+    dimensions = coordinates.shape[1]
+    if bits * dimensions > 64:
+        msg = "Morton keys of " + str(dimensions) + " axes support at most " + str(64 // dimensions) + " bits"
+        raise ValueError(msg)
+    keys = np.zeros(len(coordinates), dtype=np.uint64)
+    one = np.uint64(1)
+    for bit in range(bits):
+        for axis in range(dimensions):
+            position = np.uint64(bit * dimensions + dimensions - 1 - axis)
+            keys |= ((coordinates[:, axis] >> np.uint64(bit)) & one) << position
+    return keys
+
+
+def hilbert_key(coordinates, bits):
+    """
+    compute Hilbert curve keys of integer coordinates
+
+    The coordinates are transposed into the Hilbert index with the algorithm of J. Skilling, "Programming the Hilbert
+    curve", AIP Conference Proceedings 707, 2004, applied to all points at once. Rays following each other along the
+    curve are always in neighbouring cells, which Morton keys do not guarantee.
+
+    Parameters
+    ----------
+    coordinates : numpy.ndarray
+        non negative integer array of shape (N, D) with values below 2**bits
+    bits : int
+        number of bits per axis, bits * D must not exceed 64
+
+    Returns
+    -------
+    numpy.ndarray
+        uint64 keys
+
+    """
+    # one contiguous row per axis, bits per axis fit in 32 bits since bits * dimensions is at most 64
+    transposed = np.array(np.asarray(coordinates).T, dtype=np.uint32, order="C")
+    dimensions = transposed.shape[0]
+    zero = np.uint32(0)
+    one = np.uint32(1)
+    # inverse undo of the excess work
+    for bit in range(bits - 1, 0, -1):
+        low_bits = np.uint32((1 << bit) - 1)
+        for axis in range(dimensions):
+            # invert the low bits of the first axis if the bit is set, else exchange them with this axis
+            invert = zero - ((transposed[axis] >> np.uint32(bit)) & one)
+            swapped = (transposed[0] ^ transposed[axis]) & low_bits & ~invert
+            transposed[0] ^= (low_bits & invert) | swapped
+            if axis:
+                transposed[axis] ^= swapped
+    # gray encode
+    for axis in range(1, dimensions):
+        transposed[axis] ^= transposed[axis - 1]
+    flips = np.zeros(transposed.shape[1], dtype=np.uint32)
+    for bit in range(bits - 1, 0, -1):
+        flips ^= np.uint32((1 << bit) - 1) & (zero - ((transposed[dimensions - 1] >> np.uint32(bit)) & one))
+    transposed ^= flips
+    return morton_key(transposed.T, bits)
+
+
+def spatial_keys(rays, minimum, maximum, curve="hilbert", directions=False, bits=None):
+    """
+    compute space filling curve keys of rays from their start position and optionally their direction
+
+    Parameters
+    ----------
+    rays : RayBundle
+        rays to order
+    minimum, maximum : array_like
+        lower and upper corner of the box of the start positions quantized on the curve grid
+    curve : str, optional
+        "hilbert" or "morton", default value is "hilbert"
+    directions : bool, optional
+        also order by direction cosines l, m, n, default value is False
+    bits : int, optional
+        number of bits per axis, default uses all 63 bits of the key: 21 for positions, 10 with directions
+
+    Returns
+    -------
+    numpy.ndarray
+        uint64 keys, sort them with a stable sort to order the rays
+
+    """
+    values = [rays.x, rays.y, rays.z]
+    minimum = list(np.asarray(minimum, dtype=np.float64))
+    maximum = list(np.asarray(maximum, dtype=np.float64))
+    if directions:
+        values += [rays.l, rays.m, rays.n]
+        minimum += [-1.0] * 3
+        maximum += [1.0] * 3
+    if bits is None:
+        bits = 63 // len(values)
+    extent = np.asarray(maximum) - np.asarray(minimum)
+    extent[extent == 0] = 1
+    values = (np.column_stack(values).astype(np.float64) - minimum) / extent
+    coordinates = np.clip(np.floor(np.nan_to_num(values) * 2**bits), 0, 2**bits - 1).astype(np.uint64)
+    if curve == "hilbert":
+        return hilbert_key(coordinates, bits)
+    if curve == "morton":
+        return morton_key(coordinates, bits)
+    msg = "Curve " + str(curve) + " not supported, use hilbert or morton"
+    raise ValueError(msg)
@@ -0,0 +1,244 @@
+import os
+import struct
+
+import numpy as np
+
+from ansys_optical_automation.post_process.dpf_ray_bundle import ray_dtype
+
+# record layout of the ray body per file format
+speos_ray_dtype = ray_dtype  # wavelength in nanometer
+zemax_spectral_ray_dtype = np.dtype([(name, "<f4") for name in ("x", "y", "z", "l", "m", "n", "energy", "wavelength")])
+zemax_flux_ray_dtype = np.dtype([(name, "<f4") for name in ("x", "y", "z", "l", "m", "n", "energy")])
+
+zemax_identifier = 1010
+# Identifier, NbrRays, Description, SourceFlux, RaySetFlux, Wavelength, InclinationBeg, InclinationEnd, AzimuthBeg,
+# AzimuthEnd, DimensionUnits, LocX, LocY, LocZ, RotX, RotY, RotZ, ScaleX, ScaleY, ScaleZ, 4 unused floats,
+# ray_format_type, flux_type, 2 reserved ints
+zemax_header_format = struct.Struct("<2I100s7fI13f4I")
+# radiometric flux, 5 reserved floats set to 2.0, photometric flux
+speos_header_format = struct.Struct("<7f")
+
+
+def pack_zemax_header(
+    rays_number,
+    source_flux,
+    ray_set_flux,
+    description="Converted from SPEOS .ray file.",
+    wavelength=0,
+    ray_format_type=2,
+    flux_type=0,
+    dimension_units=4,
+):
+    """
+    pack the 208 bytes header of a zemax rayfile
+
+    Parameters
+    ----------
+    rays_number : int
+        number of rays in the file
+    source_flux : float
+        total flux of the source
+    ray_set_flux : float
+        flux represented by the rays of the file
+    description : str, optional
+        text description of the source, truncated to 100 characters
+    wavelength : float, optional
+        wavelength in micrometer, 0 for spectral files
+    ray_format_type : int, optional
+        0 for flux only (.dat), 2 for spectral (.sdf), default value is 2
+    flux_type : int, optional
+        0 for watts, 1 for lumens, default value is 0
+    dimension_units : int, optional
+        M=0, IN=1, CM=2, FT=3, MM=4, default value is 4
+
+    Returns
+    -------
+    bytes
+
+    """
+    return zemax_header_format.pack(
+        zemax_identifier,
+        rays_number,
+        description[:100].ljust(100).encode("ascii"),
+        source_flux,
+        ray_set_flux,
+        wavelength,
+        0,  # InclinationBeg
+        0,  # InclinationEnd
+        0,  # AzimuthBeg
+        0,  # AzimuthEnd
+        dimension_units,
+        *([0] * 13),  # location, rotation, scale and unused floats
+        ray_format_type,
+        flux_type,
+        0,  # reserved1
+        0,  # reserved2
+    )
+
+
+def pack_speos_header(radiometric_power, photometric_power):
+    """
+    pack the 28 bytes header of a speos rayfile
+
+    Parameters
+    ----------
+    radiometric_power : float
+        radiometric flux in watts
+    photometric_power : float
+        photometric flux in lumens
+
+    Returns
+    -------
+    bytes
+
+    """
+    return speos_header_format.pack(radiometric_power, 2.0, 2.0, 2.0, 2.0, 2.0, photometric_power)
+
+
+class RayfileWriter:
+    """
+    this class writes a speos .ray or zemax .sdf/.dat rayfile chunk by chunk
+
+    The header slot is skipped while the rays are written and filled by write_header once the ray count and
+    flux are known, so the rays never have to be held in memory at once. Used as a context manager, the body is
+    closed on exit and write_header can follow.
+    """
+
+    def __init__(self, file_path, description="Converted from SPEOS .ray file."):
+        """
+        Parameters
+        ----------
+        file_path : str
+            path of the rayfile to write, the extension .ray, .sdf or .dat defines the format
+        description : str, optional
+            text description stored in zemax headers
+        """
+        self.file_path = file_path
+        self.description = description
+        self.extension = os.path.splitext(file_path)[1].lower()
+        if self.extension == ".ray":
+            self.__header_size = speos_header_format.size
+            self.__dtype = speos_ray_dtype
+            self.__wavelength_factor = 1000
+        elif self.extension == ".sdf":
+            self.__header_size = zemax_header_format.size
+            self.__dtype = zemax_spectral_ray_dtype
+            self.__wavelength_factor = 1
+        elif self.extension == ".dat":
+            self.__header_size = zemax_header_format.size
+            self.__dtype = zemax_flux_ray_dtype
+            self.__wavelength_factor = 1
+        else:
+            msg = "Rayfile extension " + self.extension + " not supported, use .ray, .sdf or .dat"
+            raise ValueError(msg)
+        self.rays_number = 0
+        self.energy = 0.0
+        self.luminous_flux = 0.0
+        self.wavelength = None
+        self.__file = open(file_path, "wb")
+        self.__file.write(bytes(self.__header_size))
+
+    def write(self, rays):
+        """
+        append rays to the body of the rayfile
+
+        Parameters
+        ----------
+        rays : RayBundle
+            rays to write
+
+        Returns
+        -------
+        None
+
+        """
+        if self.__file.closed:
+            msg = "Rayfile " + self.file_path + " is closed, rays cannot be written anymore"
+            raise ValueError(msg)
+        if len(rays) == 0:
+            return
+        if self.extension == ".dat":
+            wavelength = rays.wavelength
+            if self.wavelength is None:
+                self.wavelength = float(wavelength[0])
+            if np.any(wavelength != self.wavelength):
+                msg = "Zemax .dat files store a single wavelength, write rays with several wavelengths to .sdf"
+                raise ValueError(msg)
+        rays.to_records(self.__dtype, self.__wavelength_factor).tofile(self.__file)
+        self.rays_number += len(rays)
+        self.energy += float(np.sum(rays.energy, dtype=np.float64))
+        self.luminous_flux += float(np.sum(rays.luminous_flux()))
+
+    def close(self):
+        """
+        close the body of the rayfile, the file is only valid after write_header
+
+        The ray count is taken from the size of the written body. Closing a closed rayfile does nothing.
+
+        Returns
+        -------
+        None
+
+        """
+        if self.__file.closed:
+            return
+        self.rays_number = (self.__file.tell() - self.__header_size) // self.__dtype.itemsize
+        self.__file.close()
+
+    def open(self):
+        """
+        reopen the body of a closed rayfile to append rays, e.g. to write many rayfiles without keeping them all open
+
+        Returns
+        -------
+        None
+
+        """
+        if self.__file.closed:
+            self.__file = open(self.file_path, "r+b")
+            self.__file.seek(0, os.SEEK_END)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_header(self, radiometric_power, photometric_power=None, source_flux=None):
+        """
+        close the body if needed and write the header with the final ray count
+
+        Parameters
+        ----------
+        radiometric_power : float
+            flux in watts represented by the rays of the file
+        photometric_power : float, optional
+            flux in lumens for speos rayfiles, default is derived from the spectrum of the written rays
+        source_flux : float, optional
+            total flux of the source in watts for zemax rayfiles, default is the radiometric power
+
+        Returns
+        -------
+        None
+
+        """
+        self.close()
+        if self.extension == ".ray":
+            if photometric_power is None:
+                photometric_power = radiometric_power * self.luminous_flux / self.energy if self.energy > 0 else 0.0
+            header = pack_speos_header(radiometric_power, photometric_power)
+        else:
+            source_flux = radiometric_power if source_flux is None else source_flux
+            if self.extension == ".sdf":
+                header = pack_zemax_header(self.rays_number, source_flux, radiometric_power, self.description)
+            else:
+                header = pack_zemax_header(
+                    self.rays_number,
+                    source_flux,
+                    radiometric_power,
+                    self.description,
+                    wavelength=self.wavelength or 0,
+                    ray_format_type=0,
+                )
+        with open(self.file_path, "r+b") as rayfile:
+            rayfile.write(header)
@@ -11,6 +11,7 @@ else:
     pass
 
 from ansys_optical_automation.post_process.dpf_base import DataProcessingFramework
+from ansys_optical_automation.post_process.dpf_cache import cached_load
 
 supported_map_types = [2, 3]
 supported_value_types = [0, 1, 2, 20]
@@ -491,7 +492,7 @@ class DpfXmpViewer(DataProcessingFramework):
                 raise ImportError(msg)
         return xmp_map_struct
 
-    def read_txt_export(self, txt_path, inc_data=False):
+    def read_txt_export(self, txt_path, inc_data=False, cache=None):
         """
         Parameters
         ----------
@@ -500,6 +501,8 @@ class DpfXmpViewer(DataProcessingFramework):
         inc_data : bool
             Boolean to determine if to include data matrix as list
             currently not working correctly
+        cache : ArrayCache, optional
+            cache of the data matrix, reloaded memory mapped while the text file is unchanged. Default is None.
 
         Returns
         -------
@@ -539,7 +542,7 @@ class DpfXmpViewer(DataProcessingFramework):
                         self.source_list,
                         xmp_wl_res,
                     )
-                    return self.__read_txt_export(xmp_map_struct, txt_path)
+                    return self.__read_cached_txt_export(xmp_map_struct, txt_path, cache)
                 else:
                     xmp_map_struct = MapStruct(
                         xmp_maptype,
@@ -552,11 +555,35 @@ class DpfXmpViewer(DataProcessingFramework):
                         xmp_layer,
                         layer_name=self.source_list,
                     )
-                    return self.__read_txt_export(xmp_map_struct, txt_path)
+                    return self.__read_cached_txt_export(xmp_map_struct, txt_path, cache)
             else:
                 msg = "type of map are not supported currently"
                 raise ImportError(msg)
 
+    def __read_cached_txt_export(self, xmp_map_struct, txt_path, cache):
+        """
+        function to load txt content into a XmpStruct, or its data matrix from the cache
+
+        Parameters
+        ----------
+        xmp_map_struct : MapStruct
+            class of MapStruct
+        txt_path : str
+            text file directory
+        cache : ArrayCache
+            cache of the data matrix, None to always read the text file
+
+        Returns
+        -------
+        MapStruct:
+            a MapStruct whose values are filled with content from text file provided.
+
+        """
+        xmp_map_struct.data = cached_load(
+            cache, txt_path, "xmp_txt", lambda: self.__read_txt_export(xmp_map_struct, txt_path).data
+        )[0]
+        return xmp_map_struct
+
     def __get_source_list(self):
         """
         Get the source list stored in the simulation result.
@@ -146,3 +146,188 @@ class TestRayfileAPI:
         """
         res = self.results.get("flux_dat_ray_sim", None)
         assert res is True
+
+    def test_11_ray_bundle_columns(self):
+        """
+        Check if the columnar ray bundle is consistent with the DpfRay objects
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("ray_bundle", None)
+        assert res is True
+
+    def test_12_random_access(self):
+        """
+        Check if rays read by index, slice and chunk from a header only rayfile match the loaded rays
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("random_access", None)
+        assert res is True
+
+    def test_13_rayfile_compare(self):
+        """
+        Check if a converted rayfile matches its source statistically and another rayfile does not
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("rayfile_compare", None)
+        assert res is True
+
+    def test_14_batch_conversion(self):
+        """
+        Check if a second batch conversion of a folder skips the rayfiles converted by the first one
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("batch_conversion", None)
+        assert res is True
+
+    def test_15_rayfile_writer(self):
+        """
+        Check if rays written in chunks with the header last are read back unchanged
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("rayfile_writer", None)
+        assert res is True
+
+    def test_16_split_rayfile(self):
+        """
+        Check if the shards of a rayfile split by number of rays or by tiles hold all its rays and power
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("split_rayfile", None)
+        assert res is True
+
+    def test_17_sort_rayfile(self):
+        """
+        Check if the space filling curve keys number every cell once and a sorted rayfile is a permutation of its
+        source in key order
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("space_filling_keys", None)
+        assert res is True
+        res = self.results.get("sort_rayfile", None)
+        assert res is True
+
+    def test_18_ray_queries(self):
+        """
+        Check if box, cone and wavelength selections with and without indexes match brute force masks
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("ray_queries", None)
+        assert res is True
+
+    def test_19_resampling(self):
+        """
+        Check if every resampling method keeps the total energy of the rays and a resampled rayfile its power
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("resampling", None)
+        assert res is True
+
+    def test_20_ray_maps(self):
+        """
+        Check if irradiance and intensity maps computed from rays integrate to the source power
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("ray_maps", None)
+        assert res is True
+
+    def test_21_ray_transforms(self):
+        """
+        Check if rotated, transformed and unit scaled rays match the expected positions and directions
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("ray_transforms", None)
+        assert res is True
+
+    def test_22_array_cache(self):
+        """
+        Check if cached rays are reloaded after a change of modification time, size or content of the rayfile and
+        if the least recently used entries are evicted
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("array_cache", None)
+        assert res is True
+
+    def test_23_ray_generators(self):
+        """
+        Check if generated rays carry the source power and follow the position, direction and spectrum distributions
+        of their emitter
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("ray_generators", None)
+        assert res is True
+
+    def test_24_parallel_decode(self):
+        """
+        Check if rayfiles with invalid rays decoded by several workers match the single threaded decode
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("parallel_decode", None)
+        assert res is True
+
+    def test_25_failed_conversion(self):
+        """
+        Check if a streamed conversion stopped by an invalid ray does not leave a truncated rayfile
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("failed_conversion", None)
+        assert res is True
+
+    def test_26_batch_errors(self):
+        """
+        Check if a batch conversion reports an invalid rayfile and still converts the other rayfiles
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("batch_errors", None)
+        assert res is True
+
+    def test_27_compare_lengths(self):
+        """
+        Check if comparing rayfiles with different numbers of rays counts all rays with and without per ray check
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("compare_lengths", None)
+        assert res is True
+
+    def test_28_merge_rayfiles(self):
+        """
+        Check if merging a speos and a zemax rayfile with weights keeps all rays and their weighted power
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("merge_rayfiles", None)
+        assert res is True
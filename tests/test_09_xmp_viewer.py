@@ -122,3 +122,13 @@ class TestXmpViewerAPI:
         res = self.results.get("xmp_measures", None)
         ref = self.reference_results["xmp_measures"]
         assert res == ref
+
+    def test_07_txt_cache(self):
+        """
+        checks a cached text export gives the map data and is read again after the text file changes
+        Returns
+        -------
+        None
+        """
+        res = self.results.get("xmp_txt_cache", None)
+        assert res is True
@@ -9,12 +9,20 @@ from .workflows.run_test_13_anisotropicbsdf_viewer import (
 from .workflows.run_test_13_anisotropicbsdf_viewer import (
     unittest_brdf_one_wavelength_speos_run,
 )
+from .workflows.run_test_13_anisotropicbsdf_viewer import unittest_bsdf_cache_run
+from .workflows.run_test_13_anisotropicbsdf_viewer import (
+    unittest_coordinate_conversion_run,
+)
+from .workflows.run_test_13_anisotropicbsdf_viewer import unittest_interpolation_run
+from .workflows.run_test_13_anisotropicbsdf_viewer import unittest_plan_cache_run
 from .workflows.run_test_13_anisotropicbsdf_viewer import (
     unittest_planesymmetric_brdf_zemax_run,
 )
 from .workflows.run_test_13_anisotropicbsdf_viewer import (
     unittest_planesymmetric_btdf_zemax_run,
 )
+from .workflows.run_test_13_anisotropicbsdf_viewer import unittest_speos_parser_run
+from .workflows.run_test_13_anisotropicbsdf_viewer import unittest_zemax_parser_run
 
 # from .workflows.run_test_13_anisotropicbsdf_viewer import (
 #     unittest_planesymmetric_brdf_zemax_run,
@@ -219,3 +227,57 @@ class TestAnisotropicbsdfAPI:
         res_file.close()
         ref_file.close()
         assert res == ref
+
+    def test_07_verify_coordinate_conversion(self):
+        """
+        Verify the vectorized coordinate system conversion matches the point by point scalar conversion
+        Returns
+        -------
+        None
+        """
+        assert unittest_coordinate_conversion_run()
+
+    def test_08_verify_interpolation(self):
+        """
+        Verify the vectorized bilinear interpolation matches the scalar interpolation on and off the grid nodes
+        Returns
+        -------
+        None
+        """
+        assert unittest_interpolation_run()
+
+    def test_09_verify_plan_cache(self):
+        """
+        Verify a cached remapping gives the same conversion and a second conversion reuses every plan
+        Returns
+        -------
+        None
+        """
+        assert unittest_plan_cache_run()
+
+    def test_10_verify_zemax_parser(self):
+        """
+        Verify the Zemax BSDF blocks are read as by the line by line parser
+        Returns
+        -------
+        None
+        """
+        assert unittest_zemax_parser_run()
+
+    def test_11_verify_speos_parser(self):
+        """
+        Verify the Speos brdf and anisotropicbsdf blocks are read as by the line by line parser
+        Returns
+        -------
+        None
+        """
+        assert unittest_speos_parser_run()
+
+    def test_12_verify_bsdf_cache(self):
+        """
+        Verify a cached BSDF import gives the imported attributes and is imported again after the file changes
+        Returns
+        -------
+        None
+        """
+        assert unittest_bsdf_cache_run()
@@ -1,17 +1,54 @@
 import glob
 import json
+import math
 import os
 import shutil
 import subprocess
 import sys
 import traceback
 
+import numpy as np
+
 unittest_path = os.path.dirname(os.path.realpath(__file__))
 lib_path = os.path.dirname(unittest_path)
 sys.path.append(lib_path)
 
+from ansys_optical_automation.interop_process.rayfile_batch_converter import (
+    convert_rayfiles,
+)
 from ansys_optical_automation.interop_process.rayfile_converter import RayfileConverter
+from ansys_optical_automation.interop_process.rayfile_merge_split import merge_rayfiles
+from ansys_optical_automation.interop_process.rayfile_merge_split import scan_rayfile
+from ansys_optical_automation.interop_process.rayfile_merge_split import sort_rayfile
+from ansys_optical_automation.interop_process.rayfile_merge_split import split_rayfile
+from ansys_optical_automation.post_process.dpf_cache import ArrayCache
+from ansys_optical_automation.post_process.dpf_cache import cached_load
 from ansys_optical_automation.post_process.dpf_rayfile import DpfRayfile
+from ansys_optical_automation.post_process.dpf_rayfile import RayBundle
+from ansys_optical_automation.post_process.dpf_rayfile import RayfileWriter
+from ansys_optical_automation.post_process.dpf_rayfile import ray_dtype
+from ansys_optical_automation.post_process.dpf_rayfile import rotation
+from ansys_optical_automation.post_process.dpf_rayfile import transformation_matrix
+from ansys_optical_automation.post_process.dpf_rayfile_analysis import intensity_map
+from ansys_optical_automation.post_process.dpf_rayfile_analysis import irradiance_map
+from ansys_optical_automation.post_process.dpf_rayfile_compare import compare_rayfiles
+from ansys_optical_automation.post_process.dpf_rayfile_generator import collimated_rays
+from ansys_optical_automation.post_process.dpf_rayfile_generator import generate_rayfile
+from ansys_optical_automation.post_process.dpf_rayfile_generator import grid_rays
+from ansys_optical_automation.post_process.dpf_rayfile_generator import (
+    intensity_table_rays,
+)
+from ansys_optical_automation.post_process.dpf_rayfile_generator import (
+    lambertian_disk_rays,
+)
+from ansys_optical_automation.post_process.dpf_rayfile_generator import (
+    lambertian_rectangle_rays,
+)
+from ansys_optical_automation.post_process.dpf_rayfile_index import RayGridIndex
+from ansys_optical_automation.post_process.dpf_rayfile_index import RayWavelengthIndex
+from ansys_optical_automation.post_process.dpf_rayfile_index import hilbert_key
+from ansys_optical_automation.post_process.dpf_rayfile_index import morton_key
+from ansys_optical_automation.post_process.dpf_rayfile_index import spatial_keys
 from ansys_optical_automation.scdm_core.utils import get_speos_core
 from ansys_optical_automation.zemax_process.base import BaseZOS
 from tests.config import SCDM_VERSION
@@ -92,6 +129,811 @@ def verify_data_load(rayfile_path):
     return result
 
 
+def verify_ray_bundle(rayfile_path):
+    """
+    Function to check that the columnar ray bundle matches the rays created while iterating
+    Parameters
+    ----------
+    rayfile_path : str
+        path to rayfile
+
+    Returns
+    -------
+    bool True if the columns match the DpfRay objects
+    """
+    loaded_data = DpfRayfile(rayfile_path)
+    bundle = loaded_data.rays
+    rays = list(bundle)
+    if len(bundle) != loaded_data.rays_number or len(rays) != loaded_data.rays_number:
+        return False
+    return (
+        [ray.coordinate_x for ray in rays] == bundle.x.tolist()
+        and [ray.radiation_n for ray in rays] == bundle.n.tolist()
+        and [ray.wavelength for ray in rays] == bundle.wavelength.tolist()
+        and [ray.energy for ray in rays] == bundle.energy.tolist()
+        and bundle[-1].energy == rays[-1].energy
+        and len(bundle[2:5]) == 3
+    )
+
+
+def verify_random_access(rayfile_path):
+    """
+    Function to check that rays read by range from a header only rayfile match the loaded rays
+    Parameters
+    ----------
+    rayfile_path : str
+        path to rayfile
+
+    Returns
+    -------
+    bool True if the ranges match the loaded rays
+    """
+    loaded_rays = DpfRayfile(rayfile_path).rays
+    header_only = DpfRayfile(rayfile_path, header_only=True)
+    chunks = list(header_only.iter_chunks(3))
+    return (
+        len(header_only) == len(loaded_rays)
+        and header_only[2:5].x.tolist() == loaded_rays.x[2:5].tolist()
+        and header_only[::-2].energy.tolist() == loaded_rays.energy[::-2].tolist()
+        and header_only[-1].wavelength == loaded_rays[-1].wavelength
+        and sum(len(chunk) for chunk in chunks) == len(loaded_rays)
+        and chunks[1].y.tolist() == loaded_rays.y[3:6].tolist()
+    )
+
+
+def verify_compare_lengths(folder_path):
+    """
+    Function to compare a rayfile with a rayfile holding its first rays, ray by ray and from statistics only
+    Parameters
+    ----------
+    folder_path : str
+        empty folder of the rayfiles
+
+    Returns
+    -------
+    bool True if both comparisons count all rays of each file and fail
+    """
+    rays = random_rays(1500)
+    file_paths = [os.path.join(folder_path, name) for name in ("all.ray", "first.ray")]
+    for file_path, bundle in zip(file_paths, (rays, rays[:1000])):
+        with RayfileWriter(file_path) as writer:
+            writer.write(bundle)
+        writer.write_header(1.0)
+    result = True
+    for per_ray in [False, True]:
+        for reference_path, test_path in [file_paths, file_paths[::-1]]:
+            comparison = compare_rayfiles(reference_path, test_path, per_ray=per_ray, chunk_size=1000)
+            rays_numbers = comparison.results["rays_number"]
+            result = (
+                result
+                and not comparison.is_equal
+                and [rays_numbers["reference"], rays_numbers["test"]]
+                == [len(DpfRayfile(path).rays) for path in (reference_path, test_path)]
+            )
+    return result
+
+
+def verify_batch_conversion(folder_path):
+    """
+    Function to convert a folder of rayfiles twice and check that the second run skips the converted files
+    Parameters
+    ----------
+    folder_path : str
+        path to a folder containing rayfiles
+
+    Returns
+    -------
+    bool True if every rayfile is converted once, skipped the second time and converted again if its output breaks
+    """
+    first_run = convert_rayfiles(folder_path, workers=1)
+    second_run = convert_rayfiles(folder_path, workers=1)
+    result = (
+        len(first_run) == len(second_run) == 2
+        and not any(run["skipped"] for run in first_run)
+        and all(run["skipped"] for run in second_run)
+        and [run["output"] for run in first_run] == [run["output"] for run in second_run]
+    )
+    # an output newer than its source with a zero header or a truncated body is converted again
+    for output_path in [run["output"] for run in first_run]:
+        with open(output_path, "rb") as output_file:
+            content = output_file.read()
+        for broken_content in [bytes(28) + content[28:], content[:-32]]:
+            with open(output_path, "wb") as output_file:
+                output_file.write(broken_content)
+            repair_run = convert_rayfiles(folder_path, workers=1)
+            with open(output_path, "rb") as output_file:
+                result = (
+                    result
+                    and [run["skipped"] for run in repair_run] == [run["output"] != output_path for run in repair_run]
+                    and output_file.read() == content
+                )
+    return result
+
+
+def verify_batch_errors(folder_path):
+    """
+    Function to convert a folder holding a rayfile with an invalid ray before a valid rayfile
+    Parameters
+    ----------
+    folder_path : str
+        path to a folder containing a valid speos rayfile
+
+    Returns
+    -------
+    bool True if the invalid rayfile is reported with its error and the valid one is converted
+    """
+    records = random_rays(100).records.copy()
+    records["l"][50] = 0.1
+    invalid_path = os.path.join(folder_path, "0_invalid.sdf")
+    with RayfileWriter(invalid_path) as writer:
+        writer.write(RayBundle(records))
+    writer.write_header(1.0)
+    results = convert_rayfiles(folder_path, workers=1)
+    return (
+        len(results) == 2
+        and results[0]["file"] == invalid_path
+        and "invalid rays" in results[0]["error"]
+        and not os.path.isfile(os.path.join(folder_path, "0_invalid.ray"))
+        and results[1]["error"] is None
+        and not results[1]["skipped"]
+        and os.path.isfile(results[1]["output"])
+    )
+
+
+def verify_rayfile_writer(rayfile_path, output_path):
+    """
+    Function to write the rays of a rayfile in two chunks with the header last and to read them back
+    Parameters
+    ----------
+    rayfile_path : str
+        path to rayfile
+    output_path : str
+        path of the rayfile to write, same format as rayfile_path
+
+    Returns
+    -------
+    bool True if the written rayfile matches the source after closing and writing the header twice
+    """
+    source = DpfRayfile(rayfile_path)
+    rays = source.rays
+    with RayfileWriter(output_path) as writer:
+        writer.write(rays[:3])
+        writer.write(rays[3:])
+    writer.close()
+    writer.write_header(source.radiometric_power, source.photometric_power)
+    writer.write_header(source.radiometric_power, source.photometric_power)
+    try:
+        writer.write(rays[:1])
+        closed = False
+    except ValueError:
+        closed = True
+    written = DpfRayfile(output_path)
+    return (
+        closed
+        and writer.rays_number == len(rays)
+        and written.rays_number == len(rays)
+        and written.radiometric_power == source.radiometric_power
+        and written.photometric_power == source.photometric_power
+        and written.rays.x.tolist() == rays.x.tolist()
+        and written.rays.energy.tolist() == rays.energy.tolist()
+        and written.rays.wavelength.tolist() == rays.wavelength.tolist()
+    )
+
+
+def verify_merge_rayfiles(file_paths, folder_path):
+    """
+    Function to merge a speos and a zemax rayfile with weights
+    Parameters
+    ----------
+    file_paths : list of str
+        paths to a .ray and a .sdf rayfile
+    folder_path : str
+        empty folder of the merged rayfile
+
+    Returns
+    -------
+    bool True if the merged rayfile holds all rays with the weighted power of every input and merging into an
+    input raises an error
+    """
+    weights = [2.0, 0.5]
+    sources = [DpfRayfile(file_path, header_only=True) for file_path in file_paths]
+    output_path = os.path.join(folder_path, "merged.ray")
+    merged = DpfRayfile(merge_rayfiles(file_paths, output_path, weights=weights, chunk_size=4))
+    radiometric_power = sum(weight * source.radiometric_power for weight, source in zip(weights, sources))
+    photometric_power = sum(weight * source.photometric_power for weight, source in zip(weights, sources))
+    first_rays = sources[0].rays_number
+    result = (
+        merged.rays_number == sum(source.rays_number for source in sources)
+        and math.isclose(merged.radiometric_power, radiometric_power, rel_tol=1e-6)
+        and math.isclose(merged.photometric_power, photometric_power, rel_tol=1e-6)
+        and math.isclose(float(np.sum(merged.rays.energy, dtype=np.float64)), radiometric_power, rel_tol=1e-6)
+        # ray energies are in watts, so every input keeps its weighted power
+        and math.isclose(
+            float(np.sum(merged.rays.energy[:first_rays], dtype=np.float64)),
+            weights[0] * sources[0].radiometric_power,
+            rel_tol=1e-6,
+        )
+    )
+    try:
+        merge_rayfiles([output_path, file_paths[1]], output_path)
+    except ValueError:
+        return bool(result and DpfRayfile(output_path).rays_number == merged.rays_number)
+    return False
+
+
+def verify_split_rayfile(rayfile_path, folder_path):
+    """
+    Function to split a rayfile by number of rays and by tiles with chunks smaller than the rayfile
+    Parameters
+    ----------
+    rayfile_path : str
+        path to rayfile
+    folder_path : str
+        empty folder of the shards
+
+    Returns
+    -------
+    bool True if the shards of both modes hold all the rays and all the power of the source
+    """
+    source = DpfRayfile(rayfile_path)
+    result = True
+    for split_mode in [{"rays_per_file": 4}, {"tiles": (2, 2)}]:
+        shards = [
+            DpfRayfile(shard)
+            for shard in split_rayfile(rayfile_path, export_folder_dir=folder_path, chunk_size=3, **split_mode)
+        ]
+        result = (
+            result
+            and sum(shard.rays_number for shard in shards) == source.rays_number
+            and sorted(x for shard in shards for x in shard.rays.x.tolist()) == sorted(source.rays.x.tolist())
+            and math.isclose(sum(shard.radiometric_power for shard in shards), source.radiometric_power, rel_tol=1e-6)
+            and math.isclose(sum(shard.photometric_power for shard in shards), source.photometric_power, rel_tol=1e-6)
+        )
+        for shard in glob.glob(os.path.join(folder_path, "*")):
+            os.remove(shard)
+    return result
+
+
+def verify_space_filling_keys(bits):
+    """
+    Function to check the morton and hilbert keys of all the cells of a 2D and a 3D grid
+    Parameters
+    ----------
+    bits : int
+        number of bits per axis of the grid
+
+    Returns
+    -------
+    bool True if both curves number every cell once and hilbert keys follow each other in neighbouring cells
+    """
+    result = morton_key(np.array([[0, 0], [0, 1], [1, 0], [1, 1]]), 1).tolist() == [0, 1, 2, 3]
+    for dimensions in [2, 3]:
+        cells = np.stack(np.meshgrid(*[np.arange(2**bits)] * dimensions, indexing="ij"), axis=-1)
+        cells = cells.reshape(-1, dimensions)
+        for keys in [morton_key(cells, bits), hilbert_key(cells, bits)]:
+            result = result and np.array_equal(np.sort(keys), np.arange(len(cells), dtype=np.uint64))
+        path = cells[np.argsort(hilbert_key(cells, bits))]
+        result = result and np.all(np.abs(np.diff(path, axis=0)).sum(axis=1) == 1)
+    return bool(result)
+
+
+def verify_sort_rayfile(rayfile_path, folder_path):
+    """
+    Function to sort a rayfile along both curves with chunks smaller than the rayfile
+    Parameters
+    ----------
+    rayfile_path : str
+        path to rayfile
+    folder_path : str
+        empty folder of the sorted rayfiles and their temporary runs
+
+    Returns
+    -------
+    bool True if the sorted rayfiles hold the rays of the source in key order and no run is left
+    """
+    source = DpfRayfile(rayfile_path)
+    bounds = scan_rayfile(rayfile_path)
+    source_records = np.sort(source.rays.to_records(ray_dtype), order=list(ray_dtype.names))
+    result = True
+    for curve in ["hilbert", "morton"]:
+        output_path = os.path.join(folder_path, "sorted_" + curve + os.path.splitext(rayfile_path)[1])
+        sort_rayfile(rayfile_path, output_path, curve=curve, chunk_size=3, temporary_dir=folder_path)
+        sorted_rays = DpfRayfile(output_path).rays
+        keys = spatial_keys(sorted_rays, bounds["minimum"], bounds["maximum"], curve)
+        result = (
+            result
+            and os.listdir(folder_path) == [os.path.basename(output_path)]
+            and np.array_equal(np.sort(sorted_rays.to_records(ray_dtype), order=list(ray_dtype.names)), source_records)
+            and bool(np.all(keys[1:] >= keys[:-1]))
+        )
+        os.remove(output_path)
+    return result
+
+
+def random_rays(rays_number, seed=0):
+    """
+    Function to create reproducible random rays in a 10 mm box, with unit directions and visible wavelengths
+    Parameters
+    ----------
+    rays_number : int
+        number of rays
+    seed : int
+        seed of the random generator
+
+    Returns
+    -------
+    RayBundle
+    """
+    generator = np.random.default_rng(seed)
+    positions = generator.uniform(-5, 5, (rays_number, 3))
+    directions = generator.normal(size=(rays_number, 3))
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+    return RayBundle.from_arrays(
+        *positions.T,
+        *directions.T,
+        np.round(generator.uniform(0.38, 0.78, rays_number), 3),
+        generator.uniform(0.5, 1.5, rays_number),
+    )
+
+
+def verify_ray_queries(rayfile_path):
+    """
+    Function to compare ray selections with and without indexes to brute force masks on random rays
+    Parameters
+    ----------
+    rayfile_path : str
+        path to rayfile used to check the power of a selection
+
+    Returns
+    -------
+    bool True if all queries give the rays of the masks and a selected rayfile keeps its share of the power
+    """
+    rays = random_rays(5000)
+    positions = np.column_stack((rays.x, rays.y, rays.z))
+    result = True
+    for indexed in [False, True]:
+        if indexed:
+            rays.build_index(cells_per_axis=7)
+        generator = np.random.default_rng(1)
+        for _ in range(20):
+            corners = np.sort(generator.uniform(-6, 6, (2, 3)), axis=0)
+            # half open boxes
+            corners[generator.random((2, 3)) < 0.2] = np.inf
+            corners[0][corners[0] == np.inf] = -np.inf
+            box = (tuple(corners[0]), tuple(corners[1]))
+            axis = generator.normal(size=3)
+            cone = (axis, generator.uniform(5, 90))
+            wl_range = tuple(np.sort(generator.uniform(0.38, 0.78, 2)))
+            box_mask = np.all((positions >= corners[0]) & (positions <= corners[1]), axis=1)
+            axis = axis / np.linalg.norm(axis)
+            cone_mask = rays.l * axis[0] + rays.m * axis[1] + rays.n * axis[2] >= np.cos(np.radians(cone[1]))
+            wl_mask = (rays.wavelength >= wl_range[0]) & (rays.wavelength <= wl_range[1])
+            result = (
+                result
+                and np.array_equal(
+                    rays.select(box, cone, wl_range, indices=True), np.flatnonzero(box_mask & cone_mask & wl_mask)
+                )
+                and np.array_equal(rays.select(box=box, indices=True), np.flatnonzero(box_mask))
+                and np.array_equal(rays.select(wl_range=wl_range).x, rays.x[wl_mask])
+                # grid index candidates need an exact check but must contain all rays in the box
+                and set(np.flatnonzero(box_mask)) <= set(RayGridIndex(rays.x, rays.y, rays.z, 7).query(box).tolist())
+                and np.array_equal(RayWavelengthIndex(rays.wavelength).query(wl_range), np.flatnonzero(wl_mask))
+            )
+    half_space = np.flatnonzero((rays.x >= 0) & (rays.z >= -1) & (rays.z <= 1))
+    result = result and np.array_equal(
+        rays.select(box=((0, -np.inf, -1), (np.inf, np.inf, 1)), indices=True), half_space
+    )
+    rayfile = DpfRayfile(rayfile_path)
+    radiometric_power = rayfile.radiometric_power
+    energy = float(np.sum(rayfile.rays.energy, dtype=np.float64))
+    selection = rayfile.rays.select(box=((-np.inf, -np.inf, -np.inf), (np.inf, 0, np.inf)))
+    share = float(np.sum(selection.energy, dtype=np.float64)) / energy
+    rayfile.set_rays(selection)
+    return bool(
+        result
+        and 0 < share < 1
+        and rayfile.rays_number == len(selection)
+        and math.isclose(rayfile.radiometric_power, radiometric_power * share)
+    )
+
+
+def verify_resampling(rayfile_path):
+    """
+    Function to resample random rays with every method and a rayfile
+    Parameters
+    ----------
+    rayfile_path : str
+        path to rayfile
+
+    Returns
+    -------
+    bool True if the resampled rays are source rays with the total energy of the source, per position half space
+    for the stratified method, and the resampled rayfile keeps its power
+    """
+    rays = random_rays(5000)
+    energy = float(np.sum(rays.energy, dtype=np.float64))
+    source_x = set(rays.x.tolist())
+    result = True
+    for method in ["uniform", "energy", "stratified"]:
+        resampled = rays.resample(1000, method, seed=2, position_cells=2, direction_cells=2)
+        result = (
+            result
+            and len(resampled) == 1000
+            and set(resampled.x.tolist()) <= source_x
+            and math.isclose(float(np.sum(resampled.energy, dtype=np.float64)), energy, rel_tol=1e-6)
+            and np.array_equal(resampled.x, rays.resample(1000, method, seed=2, position_cells=2, direction_cells=2).x)
+        )
+    result = result and np.allclose(rays.resample(1000, "energy", seed=2).energy, energy / 1000, rtol=1e-6)
+    # stratified cells split every position axis in two halves of the bounding box
+    resampled = rays.resample(1000, "stratified", seed=2, position_cells=2, direction_cells=2)
+    for name in ["x", "y", "z"]:
+        values = getattr(rays, name)
+        middle = (values.min() + values.max()) / 2
+        result = result and math.isclose(
+            float(np.sum(resampled.energy[getattr(resampled, name) < middle], dtype=np.float64)),
+            float(np.sum(rays.energy[values < middle], dtype=np.float64)),
+            rel_tol=1e-6,
+        )
+    rayfile = DpfRayfile(rayfile_path)
+    radiometric_power = rayfile.radiometric_power
+    photometric_power = rayfile.photometric_power
+    rayfile.resample(5, "energy", seed=2)
+    return bool(
+        result
+        and rayfile.rays_number == 5
+        and rayfile.radiometric_power == radiometric_power
+        and rayfile.photometric_power == photometric_power
+    )
+
+
+def verify_ray_maps():
+    """
+    Function to bin a collimated disk source on a plane and an isotropic point source in the far field
+    Returns
+    -------
+    bool True if the integral of every map over its area or solid angle gives the source power
+    """
+    generator = np.random.default_rng(3)
+    rays_number = 100000
+    radius = 2 * np.sqrt(generator.random(rays_number))
+    angle = generator.uniform(0, 2 * np.pi, rays_number)
+    wavelength = generator.uniform(0.41, 0.69, rays_number)
+    disk = RayBundle.from_arrays(
+        radius * np.cos(angle),
+        radius * np.sin(angle),
+        np.zeros(rays_number),
+        np.zeros(rays_number),
+        np.zeros(rays_number),
+        np.ones(rays_number),
+        wavelength,
+        np.ones(rays_number),
+    )
+    # 10 mm x 10 mm plane 5 mm in front of the disk, pixels of 0.2 mm x 0.2 mm
+    pixel_area = 0.2 * 0.2 * 1e-6
+    irradiance = irradiance_map(disk, [-5, 5, -5, 5], [50, 50], total_power=3.0, origin=(0, 0, 5))
+    illuminance = irradiance_map(disk, [-5, 5, -5, 5], [50, 50], total_power=3.0, photometric=True, origin=(0, 0, 5))
+    spectral = irradiance_map(disk, [-5, 5, -5, 5], [50, 50], total_power=3.0, wl_res=[400, 700, 30], origin=(0, 0, 5))
+    lumens = float(np.sum(disk.luminous_flux(3.0 / rays_number)))
+    result = (
+        math.isclose(irradiance.data[0].sum() * pixel_area, 3.0)
+        and math.isclose(irradiance.layer_powers[0], 3.0)
+        and math.isclose(illuminance.data[0].sum() * pixel_area, lumens)
+        and math.isclose(spectral.data[0].sum() * pixel_area * 10, 3.0)
+        # pixels within the disk of 2 mm radius get 3 W / (pi * 4 mm2) on average
+        and abs(np.mean(irradiance.data[0, 18:32, 18:32]) - 3.0 / (np.pi * 4e-6)) < 0.02 * 3.0 / (np.pi * 4e-6)
+    )
+    directions = generator.normal(size=(rays_number, 3))
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+    directions[:, 2] = np.abs(directions[:, 2])
+    point = RayBundle.from_arrays(
+        *np.zeros((3, rays_number)), *directions.T, np.full(rays_number, 0.55), np.ones(rays_number)
+    )
+    intensity = intensity_map(point, [0, 90, 0, 360], [9, 36], total_power=2.0, angles="theta_phi")
+    x_edges = np.radians(np.linspace(0, 90, 10))
+    solid_angle = np.outer(np.diff(-np.cos(x_edges)), np.full(36, np.radians(10)))
+    # an isotropic source of 2 W over a hemisphere has an intensity of 2 / (2 * pi) W/sr everywhere
+    result = (
+        result
+        and math.isclose((intensity.data[0, :, :, 0] * solid_angle).sum(), 2.0)
+        and abs(np.mean(intensity.data[0]) - 1 / np.pi) < 0.02 / np.pi
+    )
+    intensity = intensity_map(point, [-90, 90, -90, 90], [18, 18], total_power=2.0, angles="hv")
+    y_edges = np.radians(np.linspace(-90, 90, 19))
+    solid_angle = np.outer(np.full(18, np.radians(10)), np.diff(np.sin(y_edges)))
+    return bool(result and math.isclose((intensity.data[0, :, :, 0] * solid_angle).sum(), 2.0))
+
+
+def verify_ray_transforms(rayfile_path):
+    """
+    Function to move, rotate and scale random rays and a memory mapped rayfile
+    Parameters
+    ----------
+    rayfile_path : str
+        path to rayfile
+
+    Returns
+    -------
+    bool True if the transformed rays match the expected values, round trips give the original rays and the
+    rayfile is unchanged on disk
+    """
+    rays = random_rays(1000)
+
+    def positions(bundle):
+        return np.column_stack((bundle.x, bundle.y, bundle.z)).astype(np.float64)
+
+    def directions(bundle):
+        return np.column_stack((bundle.l, bundle.m, bundle.n)).astype(np.float64)
+
+    rotated = rays.copy().rotate((0, 0, 1), 90, center=(1, 0, 0))
+    # a quarter turn around the z axis through (1, 0, 0) maps (x, y, z) to (1 - y, x - 1, z)
+    result = (
+        np.allclose(positions(rotated), np.column_stack((1 - rays.y, rays.x - 1, rays.z)), atol=1e-5)
+        and np.allclose(directions(rotated), np.column_stack((-rays.m, rays.l, rays.n)), atol=1e-6)
+        and np.allclose(positions(rotated.rotate((0, 0, 1), -90, center=(1, 0, 0))), positions(rays), atol=1e-5)
+    )
+    linear, translation = rotation((1, 2, 3), 30)
+    matrix = transformation_matrix(linear, translation + (4, 5, 6))
+    transformed = rays.copy().transform(matrix, chunk_size=7)
+    result = (
+        result
+        and np.allclose(
+            positions(transformed), positions(rays.copy().rotate((1, 2, 3), 30).translate((4, 5, 6))), atol=1e-5
+        )
+        and np.allclose(positions(transformed), positions(rays) @ linear.T + (4, 5, 6), atol=1e-5)
+        and np.allclose(positions(transformed.transform(np.linalg.inv(matrix))), positions(rays), atol=1e-5)
+        and np.array_equal(transformed.energy, rays.energy)
+        and np.array_equal(transformed.wavelength, rays.wavelength)
+    )
+    # a stretched bundle keeps unit directions
+    stretched = rays.copy().transform(transformation_matrix(np.diag((2, 1, 1))))
+    result = (
+        result
+        and np.allclose(np.linalg.norm(directions(stretched), axis=1), 1, atol=1e-6)
+        and np.allclose(stretched.x, 2 * rays.x.astype(np.float64), atol=1e-5)
+    )
+    scaled = rays.copy().scale_units("mm", "m")
+    result = (
+        result
+        and np.allclose(positions(scaled), positions(rays) * 0.001, rtol=1e-6)
+        and np.array_equal(directions(scaled), directions(rays))
+        and np.allclose(positions(scaled.scale_units("m", "cm").scale_units("cm", "mm")), positions(rays), rtol=1e-6)
+    )
+    with open(rayfile_path, "rb") as rayfile:
+        content = rayfile.read()
+    mapped = DpfRayfile(rayfile_path, mmap=True)
+    source_y = mapped.rays.y.tolist()
+    mapped.rays.translate((0, 1, 0))
+    result = result and np.allclose(mapped.rays.y, np.array(source_y) + 1)
+    mapped.close()
+    with open(rayfile_path, "rb") as rayfile:
+        return bool(result and rayfile.read() == content)
+
+
+def verify_array_cache(rayfile_path, folder_path):
+    """
+    Function to reload rayfiles through a cache after changing them and filling the cache
+    Parameters
+    ----------
+    rayfile_path : str
+        path to rayfile, modified by the function
+    folder_path : str
+        empty folder of the cache and of copies of the rayfile
+
+    Returns
+    -------
+    bool True if the cache is only used while the file is unchanged and evicts the least recently used entries
+    """
+    cache = ArrayCache(os.path.join(folder_path, "cache"))
+    loads = []
+
+    def loader():
+        loads.append(rayfile_path)
+        return {"rays": DpfRayfile(rayfile_path).rays.records.copy(), "loads": len(loads)}
+
+    def load():
+        content, cached = cached_load(cache, rayfile_path, "test", loader)
+        return content["loads"], cached
+
+    reference = DpfRayfile(rayfile_path).rays.x.tolist()
+    content, cached = cached_load(cache, rayfile_path, "test", loader)
+    result = not cached and load() == (1, True)
+    # arrays are mapped copy-on-write, changing them does not change the cache
+    content = cache.load(rayfile_path, "test")
+    content["rays"]["x"] += 1
+    result = result and cache.load(rayfile_path, "test")["rays"]["x"].tolist() == reference
+    stat = os.stat(rayfile_path)
+    os.utime(rayfile_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    result = result and load() == (2, False) and load() == (2, True)
+    # same size and modification time but another content
+    stat = os.stat(rayfile_path)
+    with open(rayfile_path, "r+b") as rayfile:
+        rayfile.seek(stat.st_size - 4)
+        rayfile.write(np.float32(0.5).tobytes())
+    os.utime(rayfile_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    result = result and os.stat(rayfile_path).st_mtime_ns == stat.st_mtime_ns and load() == (3, False)
+    with open(rayfile_path, "ab") as rayfile:
+        rayfile.write(DpfRayfile(rayfile_path).rays.records[:1].tobytes())
+    result = result and load() == (4, False) and load() == (4, True)
+    rayfile = DpfRayfile(rayfile_path, cache=cache)
+    cached_rayfile = DpfRayfile(rayfile_path, cache=cache)
+    result = (
+        result and cached_rayfile.rays.x.tolist() == rayfile.rays.x.tolist() == DpfRayfile(rayfile_path).rays.x.tolist()
+    )
+    # least recently used entries are evicted once the cache folder exceeds max_bytes
+    cache = ArrayCache(os.path.join(folder_path, "lru"))
+    copies = []
+    for index in range(3):
+        copies.append(os.path.join(folder_path, str(index) + os.path.splitext(rayfile_path)[1]))
+        shutil.copyfile(rayfile_path, copies[-1])
+    for index, copy in enumerate(copies[:2]):
+        cache.store(copy, "rayfile", {"rays": DpfRayfile(copy).rays.records.copy()})
+        os.utime(os.path.join(cache.entry_dir(copy, "rayfile"), "entry.json"), (1000 + index, 1000 + index))
+    entry_size = sum(entry.stat().st_size for entry in os.scandir(cache.entry_dir(copies[0], "rayfile")))
+    # the first copy is used again, the second one becomes the least recently used
+    result = result and cache.load(copies[0], "rayfile") is not None
+    cache.max_bytes = 2 * entry_size
+    cache.store(copies[2], "rayfile", {"rays": DpfRayfile(copies[2]).rays.records.copy()})
+    return bool(
+        result
+        and os.path.isdir(cache.entry_dir(copies[0], "rayfile"))
+        and not os.path.isdir(cache.entry_dir(copies[1], "rayfile"))
+        and os.path.isdir(cache.entry_dir(copies[2], "rayfile"))
+    )
+
+
+def verify_ray_generators(folder_path):
+    """
+    Function to compare the moments of generated rays with the moments of their distributions
+    Parameters
+    ----------
+    folder_path : str
+        empty folder of the generated rayfiles
+
+    Returns
+    -------
+    bool True if all emitters share their power over the rays and follow their position, direction and spectrum
+    distributions
+    """
+    rays_number = 200000
+
+    def moments_match(values, expected_mean, expected_square_mean):
+        values = values.astype(np.float64)
+        return abs(np.mean(values) - expected_mean) < 0.005 and abs(np.mean(values**2) - expected_square_mean) < 0.005
+
+    def power_match(rays, power):
+        return len(rays) == rays_number and math.isclose(
+            float(np.sum(rays.energy, dtype=np.float64)), power, rel_tol=1e-6
+        )
+
+    # a lambertian emitter has a mean cosine of 2 / 3 and a mean square cosine of 1 / 2
+    disk = lambertian_disk_rays(rays_number, 2, center=(1, 0, 3), power=5, seed=4)
+    radius_square = (disk.x.astype(np.float64) - 1) ** 2 + disk.y.astype(np.float64) ** 2
+    result = (
+        power_match(disk, 5)
+        and moments_match(disk.n, 2 / 3, 1 / 2)
+        and moments_match(disk.l, 0, 1 / 4)
+        and abs(np.mean(radius_square) - 2) < 0.02
+        and radius_square.max() <= 4 + 1e-5
+        and np.all(disk.z == 3)
+    )
+    rectangle = lambertian_rectangle_rays(rays_number, 2, 1, wavelength=((0.45, 0.55, 0.65), (1, 2, 1)), seed=4)
+    shares = [np.mean(np.isclose(rectangle.wavelength, wavelength)) for wavelength in (0.45, 0.55, 0.65)]
+    result = (
+        result
+        and power_match(rectangle, 1)
+        and moments_match(rectangle.n, 2 / 3, 1 / 2)
+        and moments_match(rectangle.x, 0, 1 / 3)
+        and moments_match(rectangle.y, 0, 1 / 12)
+        and np.allclose(shares, (0.25, 0.5, 0.25), atol=0.005)
+    )
+    direction = np.array((1, 1, 0)) / np.sqrt(2)
+    beam = collimated_rays(rays_number, 1, center=(0, 0, 1), direction=(1, 1, 0), seed=4)
+    offsets = np.column_stack((beam.x, beam.y, beam.z - 1)).astype(np.float64)
+    result = (
+        result
+        and power_match(beam, 1)
+        and np.allclose(np.column_stack((beam.l, beam.m, beam.n)), direction, atol=1e-6)
+        and np.allclose(offsets @ direction, 0, atol=1e-5)
+        and abs(np.mean(np.sum(offsets**2, axis=1)) - 0.5) < 0.005
+    )
+    grid = grid_rays(np.linspace(-1, 1, 5), np.linspace(-2, 2, 4), direction=(0, 1, 1), power=2)
+    result = (
+        result
+        and len(grid) == 20
+        and math.isclose(float(np.sum(grid.energy, dtype=np.float64)), 2, rel_tol=1e-6)
+        and grid.x.tolist()[:4] == [-1] * 4
+        and np.allclose(grid.m, np.sqrt(0.5))
+    )
+    # an intensity table proportional to cos(theta) describes a lambertian emitter
+    theta = np.linspace(0, 90, 91)
+    phi = np.linspace(0, 360, 37)
+    table = intensity_table_rays(rays_number, theta, phi, np.outer(np.cos(np.radians(theta)), np.ones(37)), seed=4)
+    result = (
+        result and power_match(table, 1) and moments_match(table.n, 2 / 3, 1 / 2) and moments_match(table.m, 0, 1 / 4)
+    )
+    file_paths = [os.path.join(folder_path, "generated_" + str(index) + ".ray") for index in range(2)]
+    for file_path in file_paths:
+        generate_rayfile(file_path, lambertian_disk_rays, 1000, power=3, seed=5, chunk_size=300, radius=1)
+    generated = DpfRayfile(file_paths[0])
+    with open(file_paths[0], "rb") as first_file, open(file_paths[1], "rb") as second_file:
+        result = result and first_file.read() == second_file.read()
+    return bool(
+        result
+        and generated.rays_number == 1000
+        and math.isclose(generated.radiometric_power, 3, rel_tol=1e-6)
+        and math.isclose(float(np.sum(generated.rays.energy, dtype=np.float64)), 3, rel_tol=1e-5)
+    )
+
+
+def verify_parallel_decode(folder_path):
+    """
+    Function to decode rayfiles with invalid rays with one and several workers
+    Parameters
+    ----------
+    folder_path : str
+        empty folder of the rayfiles
+
+    Returns
+    -------
+    bool True if several workers give the rays, validation report, power and strict errors of one worker
+    """
+    rays = random_rays(10007)
+    records = rays.records.copy()
+    records["energy"][10:20] = 0
+    records["l"][5000:5005] = 0.1
+    records["energy"][9000] = -1
+    result = True
+    for extension in [".ray", ".sdf"]:
+        file_path = os.path.join(folder_path, "invalid" + extension)
+        with RayfileWriter(file_path) as writer:
+            writer.write(RayBundle(records))
+        writer.write_header(2.0)
+        serial = DpfRayfile(file_path, strict=False)
+        parallel = DpfRayfile(file_path, strict=False, workers=4)
+        result = (
+            result
+            and parallel.rays_number == serial.rays_number == 10007 - 16
+            and np.array_equal(parallel.rays.records, serial.rays.records)
+            and vars(parallel.validation_report) == vars(serial.validation_report)
+            and math.isclose(parallel.photometric_power, serial.photometric_power, rel_tol=1e-9)
+            and parallel.load_timings["workers"] == 4
+            and parallel.load_timings["ranges"] > 4
+        )
+        errors = []
+        for workers in [1, 4]:
+            try:
+                DpfRayfile(file_path, workers=workers).rays
+            except ValueError as error:
+                errors.append(str(error))
+        result = result and len(errors) == 2 and errors[0] == errors[1]
+    return bool(result)
+
+
+def verify_failed_conversion(folder_path):
+    """
+    Function to stream the conversion of a zemax rayfile with an invalid ray after the first chunks
+    Parameters
+    ----------
+    folder_path : str
+        empty folder of the rayfile
+
+    Returns
+    -------
+    bool True if the conversion raises an error and leaves no converted file
+    """
+    records = random_rays(3000).records.copy()
+    records["l"][2500] = 0.1
+    file_path = os.path.join(folder_path, "invalid.sdf")
+    with RayfileWriter(file_path) as writer:
+        writer.write(RayBundle(records))
+    writer.write_header(1.0)
+    try:
+        RayfileConverter(file_path, header_only=True).zemax_to_speos(chunk_size=1000)
+    except ValueError:
+        return os.listdir(folder_path) == ["invalid.sdf"]
+    return False
+
+
 def check_speos_sim(rayfile_path):
     """
     Function runs a rayfile in a speos sim to test it
@@ -254,6 +1096,96 @@ def main():
     os.remove(test_file)
     os.remove(test_reference)
     os.remove(os.path.splitext(test_file)[0].lower() + ".ray")
+    # test11
+    test_file = os.path.join(work_directory, "test_08_ray.ray")
+    shutil.copyfile(ray_file, test_file)
+    results_dict["ray_bundle"] = verify_ray_bundle(test_file)
+    os.remove(test_file)
+    # test12
+    test_file = os.path.join(work_directory, "test_08_sdf.sdf")
+    shutil.copyfile(sdf_file, test_file)
+    results_dict["random_access"] = verify_random_access(test_file)
+    # test13
+    convert = RayfileConverter(test_file, header_only=True)
+    converted_file = convert.zemax_to_speos(chunk_size=4)
+    comparison = compare_rayfiles(test_file, converted_file, per_ray=True, chunk_size=3)
+    modified = compare_rayfiles(test_file, sdf_file_reference.replace("sdf_reference", "ray"))
+    results_dict["rayfile_compare"] = comparison.is_equal and not modified.is_equal
+    os.remove(test_file)
+    os.remove(converted_file)
+    # test27
+    compare_directory = os.path.join(work_directory, "compare")
+    os.mkdir(compare_directory)
+    results_dict["compare_lengths"] = verify_compare_lengths(compare_directory)
+    shutil.rmtree(compare_directory)
+    # test14
+    batch_directory = os.path.join(work_directory, "batch")
+    os.mkdir(batch_directory)
+    shutil.copyfile(ray_file, os.path.join(batch_directory, "test_08_ray.ray"))
+    shutil.copyfile(dat_file, os.path.join(batch_directory, "test_08_dat.DAT"))
+    results_dict["batch_conversion"] = verify_batch_conversion(batch_directory)
+    shutil.rmtree(batch_directory)
+    # test26
+    os.mkdir(batch_directory)
+    shutil.copyfile(ray_file, os.path.join(batch_directory, "test_08_ray.ray"))
+    results_dict["batch_errors"] = verify_batch_errors(batch_directory)
+    shutil.rmtree(batch_directory)
+    # test15
+    test_file = os.path.join(work_directory, "test_08_ray.ray")
+    shutil.copyfile(ray_file, test_file)
+    output_file = os.path.join(work_directory, "test_08_ray_written.ray")
+    results_dict["rayfile_writer"] = verify_rayfile_writer(test_file, output_file)
+    os.remove(test_file)
+    os.remove(output_file)
+    # test28
+    merge_directory = os.path.join(work_directory, "merge")
+    os.mkdir(merge_directory)
+    results_dict["merge_rayfiles"] = verify_merge_rayfiles([ray_file, sdf_file], merge_directory)
+    shutil.rmtree(merge_directory)
+    # test16
+    split_directory = os.path.join(work_directory, "split")
+    os.mkdir(split_directory)
+    results_dict["split_rayfile"] = verify_split_rayfile(ray_file, split_directory)
+    shutil.rmtree(split_directory)
+    # test17
+    results_dict["space_filling_keys"] = verify_space_filling_keys(3)
+    sort_directory = os.path.join(work_directory, "sort")
+    os.mkdir(sort_directory)
+    results_dict["sort_rayfile"] = verify_sort_rayfile(ray_file, sort_directory)
+    shutil.rmtree(sort_directory)
+    # test18
+    results_dict["ray_queries"] = verify_ray_queries(ray_file)
+    # test19
+    results_dict["resampling"] = verify_resampling(ray_file)
+    # test20
+    results_dict["ray_maps"] = verify_ray_maps()
+    # test21
+    test_file = os.path.join(work_directory, "test_08_ray.ray")
+    shutil.copyfile(ray_file, test_file)
+    results_dict["ray_transforms"] = verify_ray_transforms(test_file)
+    os.remove(test_file)
+    # test22
+    cache_directory = os.path.join(work_directory, "cache")
+    os.mkdir(cache_directory)
+    test_file = os.path.join(cache_directory, "test_08_ray.ray")
+    shutil.copyfile(ray_file, test_file)
+    results_dict["array_cache"] = verify_array_cache(test_file, cache_directory)
+    shutil.rmtree(cache_directory)
+    # test23
+    generator_directory = os.path.join(work_directory, "generator")
+    os.mkdir(generator_directory)
+    results_dict["ray_generators"] = verify_ray_generators(generator_directory)
+    shutil.rmtree(generator_directory)
+    # test24
+    decode_directory = os.path.join(work_directory, "decode")
+    os.mkdir(decode_directory)
+    results_dict["parallel_decode"] = verify_parallel_decode(decode_directory)
+    shutil.rmtree(decode_directory)
+    # test25
+    conversion_directory = os.path.join(work_directory, "conversion")
+    os.mkdir(conversion_directory)
+    results_dict["failed_conversion"] = verify_failed_conversion(conversion_directory)
+    shutil.rmtree(conversion_directory)
     # test07
     test_file = os.path.join(work_directory, "test_08_sdf.sdf")
     shutil.copyfile(sdf_file, test_file)
@@ -6,10 +6,13 @@ import sys
 import traceback
 from math import floor
 
+import numpy as np
+
 unittest_path = os.path.dirname(os.path.realpath(__file__))
 lib_path = os.path.dirname(unittest_path)
 sys.path.append(lib_path)
 
+from ansys_optical_automation.post_process.dpf_cache import ArrayCache
 from ansys_optical_automation.post_process.dpf_xmp_viewer import DpfXmpViewer
 
 xmp_folder = os.path.join(unittest_path, "example_models")
@@ -37,6 +40,49 @@ def check_file_size(file):
     return file_size
 
 
+def verify_txt_cache(xmp, txt_path, cache_dir):
+    """
+    read a text export twice through a cache, then again after its modification time changes
+
+    Parameters
+    ----------
+    xmp : DpfXmpViewer
+        xmp viewer reading the text export
+    txt_path : str
+        path to a text export
+    cache_dir : str
+        folder of the cache
+
+    Returns
+    -------
+    bool
+        True if the second read uses the cache, every read gives the map data read without cache and a changed text
+        export is read again
+    """
+    reference = xmp.read_txt_export(txt_path, inc_data=True).data.copy()
+    cache = ArrayCache(cache_dir)
+
+    def cached_read():
+        return np.array_equal(xmp.read_txt_export(txt_path, inc_data=True, cache=cache).data, reference)
+
+    result = cached_read()
+    # a cache hit only touches entry.json, storing an entry writes all its files again
+    entry_files = [os.path.join(cache.entry_dir(txt_path, "xmp_txt"), name) for name in ("entry.json", "0.npy")]
+    for entry_file in entry_files:
+        os.utime(entry_file, (1000, 1000))
+    result = (
+        result
+        and cached_read()
+        and os.path.getmtime(entry_files[0]) > 1000
+        and os.path.getmtime(entry_files[1]) == 1000
+    )
+    stat = os.stat(txt_path)
+    os.utime(txt_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    result = result and cache.load(txt_path, "xmp_txt") is None
+    result = result and cached_read() and cache.load(txt_path, "xmp_txt") is not None
+    return bool(result)
+
+
 def main():
     results_dict = {}
     os.mkdir(work_directory)
@@ -79,6 +125,7 @@ def main():
         data.export_name = os.path.split(txt_data)[1]
         data.export_to_xmp()
         results_dict["xmp_import_data"].append(data.data.tolist())
+    results_dict["xmp_txt_cache"] = verify_txt_cache(xmp, txt_imports[0], os.path.join(work_directory, "cache"))
     results_dict["xmp_measures"] = []
     for i, comb in enumerate(xml_test_files):
         xmp.open_file(comb[0])
@@ -1,6 +1,34 @@
+import bisect
+import json
+import math
 import os
+import shutil
+import tempfile
+
+import numpy as np
 
 from ansys_optical_automation.interop_process.BSDF_converter import BsdfStructure
+from ansys_optical_automation.interop_process.BSDF_converter import RemapPlanCache
+from ansys_optical_automation.interop_process.BSDF_converter import (
+    compute_new_value_matrix,
+)
+from ansys_optical_automation.interop_process.BSDF_converter import (
+    convert_normal_to_specular_using_cartesian,
+)
+from ansys_optical_automation.interop_process.BSDF_converter import (
+    convert_specular_to_normal_using_cartesian,
+)
+from ansys_optical_automation.interop_process.BSDF_converter import phi_theta_output
+from ansys_optical_automation.post_process.dpf_cache import ArrayCache
+from ansys_optical_automation.post_process.dpf_interpolation import BilinearWeights
+from ansys_optical_automation.post_process.dpf_interpolation import (
+    bilinear_interpolation,
+)
+
+example_models = os.path.join(os.path.dirname(os.path.realpath(__file__)), "example_models")
+blocks_reference_json = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "test_13_bsdf_blocks_reference_results.json"
+)
 
 
 def unittest_planesymmetric_brdf_zemax_run():
@@ -87,3 +115,369 @@ def unittest_asymmetrical4d_brdf_speoss_run():
     bsdf_data.import_data(0)
     bsdf_data.write_zemax_file(0)
     del bsdf_data
+
+
+def read_bsdf_blocks(file_name):
+    """
+    Read an example BSDF file without converting its coordinate system.
+
+    Parameters
+    ----------
+    file_name : str
+        name of the file in example_models
+
+    Returns
+    -------
+    BsdfStructure
+        BSDF data as read from the file
+
+    """
+    bsdf_data = BsdfStructure()
+    bsdf_data.filename_input = os.path.join(example_models, file_name)
+    extension = os.path.splitext(file_name)[1]
+    if extension == ".bsdf":
+        bsdf_data.zemax_or_speos = "zemax"
+        bsdf_data.read_zemax_bsdf(0)
+    elif extension == ".brdf":
+        bsdf_data.zemax_or_speos = "speos"
+        bsdf_data.read_speos_brdf(0)
+    else:
+        bsdf_data.zemax_or_speos = "speos"
+        bsdf_data.read_speos_anisotropicbsdf(0)
+    return bsdf_data
+
+
+def reference_interpolation(matrix_z, line_x, line_y, new_x, new_y):
+    """
+    Scalar bilinear interpolation with bisect of the first BSDF converter, reference of the vectorized interpolation.
+
+    Parameters
+    ----------
+    matrix_z : array
+        values on the grid
+    line_x, line_y : list
+        sorted grid values
+    new_x, new_y : float
+        query point
+
+    Returns
+    -------
+    float
+        interpolated value, 0 beyond the last grid value
+
+    """
+    index_x = bisect.bisect_left(line_x, new_x)
+    if index_x == 0:
+        index_inf_x, index_sup_x, coeff_x = 0, 0, 0
+    elif index_x <= len(line_x) - 1:
+        index_inf_x, index_sup_x = index_x - 1, index_x
+        coeff_x = (new_x - line_x[index_inf_x]) / (line_x[index_sup_x] - line_x[index_inf_x])
+    else:
+        return 0
+    index_y = bisect.bisect_left(line_y, new_y)
+    if index_y == 0:
+        index_inf_y, index_sup_y, coeff_y = 0, 0, 0
+    elif index_y <= len(line_y) - 1:
+        index_inf_y, index_sup_y = index_y - 1, index_y
+        coeff_y = (new_y - line_y[index_inf_y]) / (line_y[index_sup_y] - line_y[index_inf_y])
+    else:
+        return 0
+    value_inf_x = matrix_z[index_inf_x][index_inf_y] * (1 - coeff_y) + matrix_z[index_inf_x][index_sup_y] * coeff_y
+    value_sup_x = matrix_z[index_sup_x][index_inf_y] * (1 - coeff_y) + matrix_z[index_sup_x][index_sup_y] * coeff_y
+    return value_inf_x * (1 - coeff_x) + value_sup_x * coeff_x
+
+
+def reference_conversion(bsdf_data, index_block, bool_normal_1):
+    """
+    Convert the coordinate system of one block point by point with the scalar angle conversions.
+
+    Parameters
+    ----------
+    bsdf_data : BsdfStructure
+        BSDF data as read from the file
+    index_block : int
+        index of the block to convert
+    bool_normal_1 : int
+        1 to convert normal BSDF data to specular, 0 to convert specular BSDF data to normal
+
+    Returns
+    -------
+    numpy.ndarray
+        converted block on the output grid of converter_coordinate_system_bsdf
+
+    """
+    line_theta_output_list, line_phi_output_list = phi_theta_output(
+        bsdf_data.bsdfdata_theta, bsdf_data.bsdfdata_phi, bsdf_data.zemax_or_speos
+    )
+    index_grid = 0 if len(bsdf_data.bsdfdata_theta) == 1 else index_block
+    line_theta_input = list(bsdf_data.bsdfdata_theta[index_grid])
+    line_phi_input = list(bsdf_data.bsdfdata_phi[index_grid])
+    incidence = bsdf_data.bsdfdata_incidence[index_block]
+    block = np.zeros((len(line_theta_output_list[0]), len(line_phi_output_list[0])))
+    for index_theta, theta in enumerate(line_theta_output_list[0]):
+        for index_phi, phi in enumerate(line_phi_output_list[0]):
+            if bool_normal_1 == 1:
+                new_theta, new_phi = convert_normal_to_specular_using_cartesian(theta, phi, incidence)
+                if bsdf_data.symmetry == "PlaneSymmetrical" and new_phi > 180:
+                    new_phi = 360 - new_phi
+            else:
+                new_theta, new_phi = convert_specular_to_normal_using_cartesian(theta, phi, incidence)
+            block[index_theta][index_phi] = reference_interpolation(
+                bsdf_data.bsdfdata[index_block], line_theta_input, line_phi_input, new_theta, new_phi
+            )
+    return block
+
+
+def unittest_coordinate_conversion_run():
+    """
+    Test 6.
+    Compare the coordinate system conversion of the example files with the point by point scalar conversion.
+
+    Returns
+    -------
+    bool
+        True if the first block of every incidence matches the reference
+
+    """
+    result = True
+    for file_name, bool_normal_1 in [
+        ("test_13_planesymmetric_brdf_zemax.bsdf", 1),
+        ("test_13_planesymmetric_btdf_zemax.bsdf", 1),
+        ("test_13_brdf_one_wavelength_speos.brdf", 0),
+    ]:
+        bsdf_data = read_bsdf_blocks(file_name)
+        index_blocks = sorted({bsdf_data.bsdfdata_incidence.index(incidence) for incidence in bsdf_data.incidence})
+        reference = [reference_conversion(bsdf_data, index_block, bool_normal_1) for index_block in index_blocks]
+        bsdf_data.converter_coordinate_system_bsdf(bool_normal_1, 0)
+        for index_block, reference_block in zip(index_blocks, reference):
+            if bool_normal_1 == 1:
+                # numpy and math trigonometric functions differ by a few ulps in the normal to specular angles
+                result = result and np.allclose(bsdf_data.bsdfdata[index_block], reference_block, rtol=1e-9, atol=1e-15)
+            else:
+                result = result and np.array_equal(bsdf_data.bsdfdata[index_block], reference_block)
+    return result
+
+
+def unittest_interpolation_run():
+    """
+    Test 7.
+    Compare the vectorized bilinear interpolation with the scalar interpolation with bisect on and off the grid nodes.
+
+    Returns
+    -------
+    bool
+        True if all the interpolated values are identical
+
+    """
+    generator = np.random.default_rng(13)
+    line_x = np.cumsum(generator.uniform(0.5, 5, 12))
+    line_y = np.cumsum(generator.uniform(0.5, 5, 9))
+    matrix_z = generator.random((2, len(line_x), len(line_y)))
+    node_x, node_y = np.meshgrid(line_x, line_y, indexing="ij")
+    # points between the nodes, before the first and beyond the last grid values
+    off_x = generator.uniform(line_x[0] - 2, line_x[-1] + 2, 500)
+    off_y = generator.uniform(line_y[0] - 2, line_y[-1] + 2, 500)
+    new_x = np.concatenate([node_x.ravel(), off_x])
+    new_y = np.concatenate([node_y.ravel(), off_y])
+    reference = np.array(
+        [
+            [
+                reference_interpolation(matrix, line_x.tolist(), line_y.tolist(), x, y)
+                for x, y in zip(new_x.tolist(), new_y.tolist())
+            ]
+            for matrix in matrix_z
+        ]
+    )
+    scalar = [
+        compute_new_value_matrix(matrix_z[0], line_x, line_y, x, y) for x, y in zip(new_x.tolist(), new_y.tolist())
+    ]
+    return (
+        np.array_equal(bilinear_interpolation(matrix_z[0], line_x, line_y, new_x, new_y), reference[0])
+        and np.array_equal(BilinearWeights(line_x, line_y, new_x, new_y).apply(matrix_z), reference)
+        and np.array_equal(scalar, reference[0])
+    )
+
+
+def unittest_plan_cache_run():
+    """
+    Test 8.
+    Convert an example file with a shared remapping cache, with a cache too small for one plan and without cache.
+
+    Returns
+    -------
+    bool
+        True if the conversions are identical and the second conversion with the shared cache only reuses plans
+
+    """
+    file_name = "test_13_planesymmetric_brdf_zemax.bsdf"
+    without_cache = read_bsdf_blocks(file_name)
+    without_cache.converter_coordinate_system_bsdf(1, 0)
+    plan_cache = RemapPlanCache()
+    result = True
+    for max_bytes in [None, 1]:
+        cache = plan_cache if max_bytes is None else RemapPlanCache(max_bytes)
+        bsdf_data = read_bsdf_blocks(file_name)
+        bsdf_data.converter_coordinate_system_bsdf(1, 0, cache)
+        result = result and all(
+            np.array_equal(block, reference) for block, reference in zip(bsdf_data.bsdfdata, without_cache.bsdfdata)
+        )
+    nb_incidences = len(set(without_cache.bsdfdata_incidence))
+    misses = plan_cache.misses
+    bsdf_data = read_bsdf_blocks(file_name)
+    bsdf_data.converter_coordinate_system_bsdf(1, 0, plan_cache)
+    return (
+        result
+        and misses == nb_incidences
+        and plan_cache.misses == misses
+        and plan_cache.hits == len(bsdf_data.bsdfdata)
+        and all(
+            np.array_equal(block, reference) for block, reference in zip(bsdf_data.bsdfdata, without_cache.bsdfdata)
+        )
+    )
+
+
+def summarize_bsdf_blocks(bsdf_data):
+    """
+    Summarize the blocks read from a BSDF file with their angles and the exact sums of their rows and columns.
+
+    Parameters
+    ----------
+    bsdf_data : BsdfStructure
+        BSDF data as read from the file
+
+    Returns
+    -------
+    dict
+        per block metadata, theta and phi values and math.fsum of every row and column
+
+    """
+    blocks = [np.asarray(block, dtype=float) for block in bsdf_data.bsdfdata]
+    return {
+        "scattertype": list(bsdf_data.bsdfdata_scattertype),
+        "samplerotation": [float(value) for value in bsdf_data.bsdfdata_samplerotation],
+        "incidence": [float(value) for value in bsdf_data.bsdfdata_incidence],
+        "wavelength": [float(value) for value in bsdf_data.bsdfdata_wavelength],
+        "tis": [float(value) for value in bsdf_data.bsdfdata_tisdata],
+        "theta": [np.asarray(theta, dtype=float).tolist() for theta in bsdf_data.bsdfdata_theta],
+        "phi": [np.asarray(phi, dtype=float).tolist() for phi in bsdf_data.bsdfdata_phi],
+        "row_sums": [[math.fsum(row) for row in block.tolist()] for block in blocks],
+        "column_sums": [[math.fsum(column) for column in block.T.tolist()] for block in blocks],
+    }
+
+
+def unittest_zemax_parser_run():
+    """
+    Test 9.
+    Compare the blocks read from the example Zemax files with the blocks read by the line by line parser.
+
+    Returns
+    -------
+    bool
+        True if the summaries of the blocks match the reference
+
+    """
+    with open(blocks_reference_json) as file:
+        reference = json.load(file)
+    return all(
+        summarize_bsdf_blocks(read_bsdf_blocks(file_name)) == reference[file_name]
+        for file_name in ["test_13_planesymmetric_brdf_zemax.bsdf", "test_13_planesymmetric_btdf_zemax.bsdf"]
+    )
+
+
+def unittest_speos_parser_run():
+    """
+    Test 10.
+    Compare the blocks read from the example Speos files with the blocks read by the line by line parser.
+
+    Returns
+    -------
+    bool
+        True if the summaries of the blocks match the reference
+
+    """
+    with open(blocks_reference_json) as file:
+        reference = json.load(file)
+    return all(
+        summarize_bsdf_blocks(read_bsdf_blocks(file_name)) == reference[file_name]
+        for file_name in [
+            "test_13_brdf_one_wavelength_speos.brdf",
+            "test_13_planesymmetric_brdf_speos_reference.anisotropicbsdf",
+            "test_13_planesymmetric_btdf_speos_reference.anisotropicbsdf",
+        ]
+    )
+
+
+def plain_values(value):
+    """
+    convert imported bsdf attributes into nested lists to compare them
+
+    Parameters
+    ----------
+    value : object
+        attribute value made of lists, tuples, dicts and numpy arrays
+
+    Returns
+    -------
+    object
+        same value with lists instead of tuples and arrays
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [plain_values(item) for item in value]
+    if isinstance(value, dict):
+        return {key: plain_values(item) for key, item in value.items()}
+    return value
+
+
+def unittest_bsdf_cache_run():
+    """
+    Import speos BSDF files twice through a cache, then again after their modification time changes
+
+    Returns
+    -------
+    bool
+        True if the second import uses the cache, every import gives the attributes of an import without cache and
+        a changed file is imported again
+    """
+    result = True
+    work_directory = tempfile.mkdtemp()
+    try:
+        cache = ArrayCache(os.path.join(work_directory, "cache"))
+        for file_name in [
+            "test_13_brdf_one_wavelength_speos.brdf",
+            "test_13_planesymmetric_brdf_speos_reference.anisotropicbsdf",
+        ]:
+            file_path = os.path.join(work_directory, file_name)
+            shutil.copyfile(os.path.join(example_models, file_name), file_path)
+            reference = BsdfStructure()
+            reference.filename_input = file_path
+            reference.import_data(0)
+
+            def cached_import():
+                bsdf_data = BsdfStructure()
+                bsdf_data.filename_input = file_path
+                bsdf_data.import_data(0, cache=cache)
+                return plain_values(vars(bsdf_data)) == plain_values(vars(reference))
+
+            result = result and cached_import()
+            # a cache hit only touches entry.json, storing an entry writes all its files again
+            entry_files = [os.path.join(cache.entry_dir(file_path, "bsdf"), name) for name in ("entry.json", "0.npy")]
+            for entry_file in entry_files:
+                os.utime(entry_file, (1000, 1000))
+            result = (
+                result
+                and cached_import()
+                and os.path.getmtime(entry_files[0]) > 1000
+                and os.path.getmtime(entry_files[1]) == 1000
+            )
+            stat = os.stat(file_path)
+            os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+            result = result and cache.load(file_path, "bsdf") is None
+            for entry_file in entry_files:
+                os.utime(entry_file, (1000, 1000))
+            result = result and cached_import() and os.path.getmtime(entry_files[1]) > 1000
+            result = result and cache.load(file_path, "bsdf") is not None
+    finally:
+        shutil.rmtree(work_directory)
+    return bool(result)